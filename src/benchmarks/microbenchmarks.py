@@ -0,0 +1,371 @@
+"""
+Microbenchmarks for the observation, reward and learning hot paths.
+
+The end-to-end training runs in tests/0x_* only report overall throughput.
+This suite times the individual functions a training step is made of, on
+the bundled boards (dataset/base/*.pcb by default):
+
+- observation: draw_board_from_graph_multi_agent, get_los_and_ol_multi_agent,
+  board_mask (cached and cold) for every --resolutions value, and
+  compute_pad_referenced_distance_vectors_v2 (with and without dom table)
+- reward: compute_sum_of_euclidean_distances_between_pads (with and without
+  pad table) and graph.calc_hpwl_of_net over the nets of the agent
+- learning: ReplayMemory.sample and SAC.train / TD3.train
+
+Every result records the board file, layout index, board size, component
+count and pcbDraw resolution. Results are written as JSON sorted by a stable
+key, so two runs (e.g. on two commits) can be diffed directly or compared
+with --compare.
+
+Usage example:
+python microbenchmarks.py -o before.json
+python microbenchmarks.py -o after.json --compare before.json
+"""
+import os
+import sys
+import glob
+import json
+import timeit
+import argparse
+import platform
+import subprocess
+from datetime import datetime
+
+import numpy as np
+import torch
+
+TRAINING_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "training")
+REPO_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..")
+sys.path.append(TRAINING_DIR)
+
+from pcb import pcb
+from graph import graph     # Necessary for graph related methods
+from pcbDraw import (draw_board_from_graph_multi_agent,
+                     get_los_and_ol_multi_agent,
+                     pcbDraw_resolution,
+                     set_pcbDraw_resolution)
+from pcb_board import board_mask, clear_board_mask_cache
+from pcb_vector_utils import (compute_pad_referenced_distance_vectors_v2,
+                              compute_sum_of_euclidean_distances_between_pads,
+                              build_dom_table,
+                              build_pad_table)
+from utils import ReplayMemory
+from hyperparameters import gen_default_hyperparameters, load_hyperparameters_from_file
+
+PADDING = 4
+
+
+def cmdline_args():
+    parser = argparse.ArgumentParser(
+        description="Microbenchmarks of the observation, reward and learning hot paths",
+        usage="<script-name> [--boards <pcb files>] [-o results.json] [--compare baseline.json]")
+    parser.add_argument("--boards", required=False, nargs="+", type=str,
+                        default=sorted(glob.glob(os.path.join(REPO_DIR, "dataset", "base", "*.pcb"))),
+                        help="pcb files to benchmark, defaults to dataset/base/*.pcb")
+    parser.add_argument("--max_layouts", required=False, type=int, default=1,
+                        help="Number of layouts benchmarked per pcb file.")
+    parser.add_argument("--resolutions", required=False, nargs="+", type=float,
+                        default=[0.1, 0.05, 0.02],
+                        help="pcbDraw resolutions (mm per pixel) of the raster benchmarks.")
+    parser.add_argument("--repeat", required=False, type=int, default=5,
+                        help="Number of timed repetitions per benchmark.")
+    parser.add_argument("--batch_sizes", required=False, nargs="+", type=int,
+                        default=[128, 512],
+                        help="Batch sizes of the replay buffer and learning benchmarks.")
+    parser.add_argument("--buffer_fill", required=False, type=int, default=100_000,
+                        help="Number of transitions in the replay buffer.")
+    parser.add_argument("--hyperparameters", required=False, type=str, default=None,
+                        help="Hyperparameters file of the learning benchmarks, defaults to gen_default_hyperparameters().")
+    parser.add_argument("--skip_learning", required=False, action="store_true",
+                        default=False, help="Skip the replay buffer and learning benchmarks.")
+    parser.add_argument("--device", default="cpu", choices=["cuda", "cpu"],
+                        required=False)
+    parser.add_argument("-o", "--output", required=False, type=str,
+                        default="microbenchmarks.json")
+    parser.add_argument("--compare", required=False, type=str, default=None,
+                        help="Previous results file; prints the change of every benchmark.")
+    parser.add_argument("--threshold", required=False, type=float, default=0.1,
+                        help="Relative slowdown reported as a regression by --compare.")
+    return parser.parse_args()
+
+
+def measure(fn, repeat=5):
+    """
+    Time fn() with timeit: the number of calls per repetition is chosen so a
+    repetition takes at least 0.2 s.
+    :return: Dictionary with the number of calls and the minimum / median
+     time per call in microseconds and the calls per second of the median
+    """
+    fn()    # warm-up, fills caches that are shared across calls
+    timer = timeit.Timer(fn)
+    number, _ = timer.autorange()
+    times = np.array(timer.repeat(repeat=repeat, number=number)) / number
+    return {"calls": int(number * repeat),
+            "min_us": float(np.min(times) * 1E6),
+            "median_us": float(np.median(times) * 1E6),
+            "per_sec": float(1.0 / np.median(times))}
+
+
+def result(benchmark, params, timing):
+    """
+    Benchmark result with a stable key used for sorting and comparison.
+    """
+    key = benchmark + "".join(f"|{k}={params[k]}" for k in sorted(params))
+    return dict(key=key, benchmark=benchmark, **params, **timing)
+
+
+def load_layouts(pcb_file, max_layouts):
+    """
+    Layouts of a pcb file prepared like environment.initialize_environment_state_from_pcb.
+    The benchmarked agent is the unplaced component with the most edges.
+    :return: List of dictionaries (board, graph, node, neighbors, eoi, nets, ...)
+    """
+    pv = pcb.vptr_pcbs()
+    pcb.read_pcb_file(pcb_file, pv)
+
+    layouts = []
+    for idx in range(min(len(pv), max_layouts)):
+        p = pv[idx]
+        g = p.get_graph()
+        g.reset()
+        b = p.get_board()
+        g.set_component_origin_to_zero(b)
+
+        best = None
+        for n in g.get_nodes():
+            if n.get_isPlaced() != 0:
+                continue
+            eoi = [e for e in g.get_edges()
+                   if e.get_instance_id(0) == n.get_id() or e.get_instance_id(1) == n.get_id()]
+            if best is None or len(eoi) > len(best[1]):
+                best = (n, eoi)
+        if best is None:
+            continue
+
+        node, eoi = best
+        layouts.append({"pcb": p,   # keeps the graph and board alive
+                        "board": b,
+                        "graph": g,
+                        "node": node,
+                        "neighbors": [g.get_node_by_id(i) for i in g.get_neighbor_node_ids(node.get_id())],
+                        "eoi": eoi,
+                        "nets": set(e.get_net_id() for e in eoi),
+                        "params": {"board": os.path.basename(pcb_file),
+                                   "pcb_idx": idx,
+                                   "board_size": f"{np.round(b.get_width(),2)}x{np.round(b.get_height(),2)}",
+                                   "components": len(g.get_nodes())}})
+    return layouts
+
+
+def observation_and_reward_benchmarks(layout, resolutions, repeat):
+    results = []
+    b, g, node = layout["board"], layout["graph"], layout["node"]
+    neighbors, eoi = layout["neighbors"], layout["eoi"]
+    radius = np.max(node.get_size())*1.5
+    bx, by = b.get_width(), b.get_height()
+
+    original_resolution = pcbDraw_resolution()
+    try:
+        for res in resolutions:
+            set_pcbDraw_resolution(res)
+            params = dict(layout["params"], resolution=res)
+
+            results.append(result("draw_board_from_graph_multi_agent", params, measure(
+                lambda: draw_board_from_graph_multi_agent(g=g, node_id=node.get_id(),
+                                                          bx=bx, by=by, padding=PADDING),
+                repeat)))
+
+            comp_grids = draw_board_from_graph_multi_agent(g=g, node_id=node.get_id(),
+                                                           bx=bx, by=by, padding=PADDING)
+            results.append(result("get_los_and_ol_multi_agent", params, measure(
+                lambda: get_los_and_ol_multi_agent(node=node, board=b, radius=radius,
+                                                   grid_comps=comp_grids, padding=PADDING),
+                repeat)))
+
+            results.append(result("board_mask", params, measure(
+                lambda: board_mask(bx+2*PADDING, by+2*PADDING, res),
+                repeat)))
+
+            def board_mask_cold():
+                clear_board_mask_cache()
+                return board_mask(bx+2*PADDING, by+2*PADDING, res)
+            results.append(result("board_mask_cold", params, measure(board_mask_cold, repeat)))
+    finally:
+        set_pcbDraw_resolution(original_resolution)
+
+    params = layout["params"]
+    results.append(result("compute_pad_referenced_distance_vectors_v2", params, measure(
+        lambda: compute_pad_referenced_distance_vectors_v2(node, neighbors, eoi,
+                                                           ignore_power=True,
+                                                           return_vectors=False),
+        repeat)))
+
+    dom_table = build_dom_table(node, neighbors, eoi, ignore_power=True)
+    results.append(result("compute_pad_referenced_distance_vectors_v2_dom_table", params, measure(
+        lambda: compute_pad_referenced_distance_vectors_v2(node, neighbors, eoi,
+                                                           ignore_power=True,
+                                                           dom_table=dom_table,
+                                                           return_vectors=False),
+        repeat)))
+
+    results.append(result("compute_sum_of_euclidean_distances_between_pads", params, measure(
+        lambda: compute_sum_of_euclidean_distances_between_pads(node, neighbors, eoi,
+                                                                ignore_power=True),
+        repeat)))
+
+    pad_table = build_pad_table(node, neighbors, eoi)
+    results.append(result("compute_sum_of_euclidean_distances_between_pads_pad_table", params, measure(
+        lambda: compute_sum_of_euclidean_distances_between_pads(node, neighbors, eoi,
+                                                                ignore_power=True,
+                                                                pad_table=pad_table),
+        repeat)))
+
+    nets = layout["nets"]
+    results.append(result("calc_hpwl_of_net", dict(params, nets=len(nets)), measure(
+        lambda: [g.calc_hpwl_of_net(net_id, True) for net_id in nets],
+        repeat)))
+
+    return results
+
+
+def learning_benchmarks(pcb_file, batch_sizes, buffer_fill, hp, device, repeat):
+    # The models take their state and action dimensions from an environment.
+    from core.environment.environment import environment
+    from core.environment.parameters import parameters
+    from model_setup import setup_model
+
+    env = environment(parameters({
+        "pcb_file": pcb_file,
+        "training_pcb": None,
+        "evaluation_pcb": None,
+        "net": "",
+        "use_dataAugmenter": True,
+        "augment_position": True,
+        "augment_orientation": True,
+        "agent_max_action": 1,
+        "agent_expl_noise": hp.get("expl_noise", 0.1),
+        "debug": False,
+        "max_steps": 200,
+        "w": 2.0,
+        "o": 2.0,
+        "hpwl": 2.0,
+        "seed": 0,
+        "ignore_power": True,
+        "log_dir": None,
+        "idx": 0,
+        "shuffle_idxs": False,
+        }))
+    state_dim = env.agents[0].get_observation_space_shape()
+    action_dim = env.agents[0].action_space.shape[0]
+
+    rng = np.random.default_rng(seed=0)
+    memory = ReplayMemory(capacity=buffer_fill, device=device)
+    memory.add_batch(rng.random((buffer_fill, state_dim), dtype=np.float32),
+                     rng.random((buffer_fill, action_dim), dtype=np.float32),
+                     rng.random((buffer_fill, state_dim), dtype=np.float32),
+                     rng.random((buffer_fill, 1), dtype=np.float32),
+                     np.ones((buffer_fill, 1), dtype=np.float32))
+
+    results = []
+    for batch_size in batch_sizes:
+        params = {"batch_size": batch_size, "buffer": buffer_fill,
+                  "state_dim": state_dim, "device": device}
+        results.append(result("ReplayMemory.sample", params, measure(
+            lambda: memory.sample(batch_size=batch_size), repeat)))
+
+        for model_type in ["SAC", "TD3"]:
+            model_hp = dict(hp, batch_size=batch_size, buffer_size=buffer_fill)
+            model = setup_model(model_type=model_type,
+                                train_env=env,
+                                hyperparameters=model_hp,
+                                device=device)
+            if model_type == "SAC":
+                updates = [0]
+                def train():
+                    model.train(memory, batch_size, updates[0])
+                    updates[0] += 1
+            else:
+                def train():
+                    model.train(memory)
+            arch = "-".join(str(n) for n in model_hp["net_arch"]["pi"])
+            results.append(result(f"{model_type}.train", dict(params, net_arch=arch),
+                                  measure(train, repeat)))
+    return results
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], cwd=REPO_DIR,
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline_file, threshold):
+    """
+    Print the change of every benchmark relative to a previous results file.
+    :return: Number of benchmarks that are more than threshold slower
+    """
+    with open(baseline_file, "r", encoding="utf-8") as f:
+        baseline = {r["key"]: r for r in json.load(f)["results"]}
+
+    regressions = 0
+    for r in results:
+        b = baseline.get(r["key"])
+        if b is None:
+            print(f"   new   {r['key']}: {r['median_us']:.1f} us")
+            continue
+        change = r["median_us"] / b["median_us"] - 1
+        flag = "   "
+        if change > threshold:
+            flag = "(!)"
+            regressions += 1
+        print(f"{flag} {change*100:+6.1f}% {r['key']}: {b['median_us']:.1f} -> {r['median_us']:.1f} us")
+    return regressions
+
+
+def main():
+    args = cmdline_args()
+    torch.set_num_threads(1)
+
+    results = []
+    for pcb_file in args.boards:
+        try:
+            layouts = load_layouts(pcb_file, args.max_layouts)
+        except Exception as e:
+            print(f"Skipping {pcb_file}: {e}")
+            continue
+        for layout in layouts:
+            print(f"{layout['params']['board']}#{layout['params']['pcb_idx']} ({layout['params']['board_size']} mm, {layout['params']['components']} components)")
+            results += observation_and_reward_benchmarks(layout, args.resolutions, args.repeat)
+
+    if args.skip_learning is False and len(args.boards) > 0:
+        if args.hyperparameters is not None:
+            hp = load_hyperparameters_from_file(args.hyperparameters)
+        else:
+            hp = gen_default_hyperparameters()
+        results += learning_benchmarks(args.boards[0], args.batch_sizes,
+                                       args.buffer_fill, hp, args.device,
+                                       args.repeat)
+
+    results.sort(key=lambda r: r["key"])
+    output = {"meta": {"timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                       "commit": git_commit(),
+                       "python": platform.python_version(),
+                       "numpy": np.__version__,
+                       "torch": torch.__version__,
+                       "machine": platform.machine(),
+                       "processor": platform.processor(),
+                       "repeat": args.repeat},
+              "results": results}
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(output, f, indent=1)
+    print(f"Wrote {len(results)} results to {args.output}")
+
+    if args.compare is not None:
+        regressions = compare(results, args.compare, args.threshold)
+        print(f"{regressions} benchmark(s) more than {args.threshold*100:.0f}% slower")
+
+
+if __name__ == "__main__":
+    main()
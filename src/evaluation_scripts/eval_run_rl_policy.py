@@ -10,7 +10,10 @@ based on the provided arguments.
 evaluation.
 - set_seed_everywhere(seed): Set the seed for random number generation in
 various libraries.
-- evaluation_run(settings): Perform the evaluation run using the given settings.
+- evaluation_episode(job, settings, hp, policy): Evaluate the policy on one
+(pcb_idx, run, seed) job.
+- evaluation_run(settings): Perform the evaluation run using the given settings,
+distributing the jobs across --workers processes.
 
 Note: This module requires the following dependencies: os, sys, pathlib,
 argparse, datetime, torch, numpy, and random.
@@ -35,6 +38,7 @@ from core.environment.utils import get_pcb_num
 from core.environment.parameters import parameters
 from model_setup import setup_model
 from hyperparameters import load_hyperparameters_from_file
+from evaluator import policy_snapshot, run_evaluation_jobs
 
 def configure_seed(args):
     """
@@ -131,6 +135,8 @@ def cmdline_args():
                         help="Colon seperated weights for euclidean wirelength, hpwl and overlap")
     parser.add_argument("--shuffle_idxs", required=False, action="store_true",
                         help="shuffle agent idx prior to stepping in the environment")
+    parser.add_argument("--workers", required=False, type=int, default=1,
+                        help="Number of processes running evaluation episodes in parallel.")
 
     args = parser.parse_args()  # ⭐ 核心代码：解析命令行输入参数
     settings = {}
@@ -165,6 +171,7 @@ def cmdline_args():
     settings["o"] = float(rp[2])       # overlap
 
     settings["shuffle_idxs"] = args.shuffle_idxs
+    settings["workers"] = args.workers
     return args, settings
 
 def set_seed_everywhere(seed):
@@ -180,10 +187,217 @@ def set_seed_everywhere(seed):
     np.random.seed(seed)
     random.seed(seed)
 
+def evaluation_episode(job, settings, hp, policy):
+    """
+    在一个 PCB 上执行一次评估回合（一个 (pcb_idx, run, seed) 任务）。
+
+    Args:
+        job (tuple): (pcb_idx, run, seed)
+        settings (dict): 评估配置，见 evaluation_run
+        hp (dict): 超参数
+        policy: 策略网络 (TD3.actor 或 SAC.policy)
+
+    Returns:
+        dict: 回合奖励、步数以及 0%/10%/20% 重叠下的最优 HPWL
+    """
+    pcb_idx, run, seed = job
+
+    total_reward=0
+    total_steps = 0
+
+    file_best_hpwl_00_overlap = "best_hpwl_00_overlap"
+    file_best_hpwl_10_overlap = "best_hpwl_10_overlap"
+    file_best_hpwl_20_overlap = "best_hpwl_20_overlap"
+
+    best_hpwl = 1E6
+    best_hpwl_at_10_overlap = 1E6
+    best_hpwl_at_20_overlap = 1E6
+
+    set_seed_everywhere(seed)
+
+    env_params=parameters({
+        "pcb_file": settings["pcb_file"],
+        "training_pcb": None,
+        "evaluation_pcb": None,
+        "net": "",
+        "use_dataAugmenter": True,
+        "augment_position": True,
+        "augment_orientation": True,
+        "agent_max_action": 1,
+        "agent_expl_noise": hp["expl_noise"],
+        "debug": True,
+        "max_steps": settings["max_steps"],
+        "w": settings["w"],
+        "o": settings["o"],
+        "hpwl": settings["hpwl"],
+        "seed": seed,
+        "ignore_power": True,
+        "log_dir": None,
+        "idx": pcb_idx,
+        "shuffle_idxs": settings["shuffle_idxs"],
+        })  # ⭐ 配置评估环境参数
+
+    eval_env = environment(env_params)
+
+    # create directories
+    current_pcb_filename = eval_env.get_current_pcb_name()
+    pcb_dir = os.path.join(settings["output"], current_pcb_filename)
+    Path(pcb_dir).mkdir(parents=True, exist_ok=True)
+
+    sa_dir = os.path.join(pcb_dir, "sa_pcb")
+    Path(sa_dir).mkdir(parents=True, exist_ok=True)
+
+    run_output_dir = os.path.join(pcb_dir,f"trial_{run}")
+    Path(run_output_dir).mkdir(parents=True, exist_ok=True)
+
+    # start the evaluation log
+    evaluation_log = open(os.path.join(run_output_dir,"evaluation.log"),
+                          "w",
+                          encoding="utf-8")
+    evaluation_log.write(
+        f"timestamp={datetime.now().strftime('%Y-%m-%d %H:%M:%S:%f')}\r\n")
+    evaluation_log.write("parameters begin\r\n")
+    evaluation_log.write(eval_env.parameters.to_text_string(prefix="\t"))
+    evaluation_log.write("parameters end\r\n")
+
+    eval_env.reset()
+    eval_env.write_current_pcb_file(path=sa_dir,
+                                    filename=current_pcb_filename+f"_{run}.pcb")
+    done = False
+    episode_steps=0
+    while not done:
+        episode_steps += 1
+        obs_vec = eval_env.step(model=policy,
+                                random=False,
+                                deterministic=True,
+                                rl_model_type=settings["policy"])  # ⭐ 执行策略的评估步骤
+        step_reward=0
+
+        for indiv_obs in obs_vec:
+            step_reward += indiv_obs[2]
+            if indiv_obs[4] is True:
+                done = True
+
+        step_reward /= len(obs_vec)
+        total_reward += step_reward
+        total_steps += 1
+
+        hpwl = eval_env.calc_hpwl()
+
+        all_ol = []
+        for indiv_obs in obs_vec:
+            next_state_ol = indiv_obs[1][8:16]
+            ol_ratios = indiv_obs[-1]["ol_ratios"]
+            all_ol.append(
+                np.sum(np.array(next_state_ol)*np.array(ol_ratios))*100)
+
+        if (hpwl < best_hpwl) and (np.max(all_ol) < 1):
+            best_hpwl = hpwl
+            filename = file_best_hpwl_00_overlap + f"{run}.{settings['runs']-1}.{episode_steps}.pcb"
+            eval_env.write_current_pcb_file(path=run_output_dir, filename=filename)
+            evaluation_log.write(f"run={run}/{settings['runs']-1} @ episode_step={episode_steps} : Zero overlap best hpwl : hpwl={np.round(hpwl,4)}, overlap={np.round(np.sum(all_ol)/8,4)}\r\n")
+            evaluation_log.write(f"all_ol={all_ol}\r\n")
+
+            # Capture snapshot
+            snapshot_filename=f'{run}.{settings["runs"]-1}.{episode_steps}'
+            eval_env.tracker.capture_snapshot(fileName=os.path.join(run_output_dir, snapshot_filename+".png"))
+            # Yes this is exactly like the previous one.
+            eval_env.write_current_pcb_file(
+                path=run_output_dir,
+                filename= snapshot_filename+".pcb")
+            # overwrite best; unique filename for easier processing with
+            # automated tools
+            eval_env.write_current_pcb_file(
+                path=run_output_dir,
+                filename=file_best_hpwl_00_overlap+".pcb")
+
+            if settings["verbose"] == 1:
+                print(f"run={run}/{settings['runs']-1} @ episode_step={episode_steps} : Zero overlap best hpwl : hpwl={np.round(hpwl,4)}, overlap={np.round(np.sum(all_ol)/8,4)}")
+
+        if (hpwl < best_hpwl_at_10_overlap ) and (np.max(all_ol) <= 10.0):
+            best_hpwl_at_10_overlap = hpwl
+            filename = file_best_hpwl_10_overlap + f"{run}.{settings['runs']-1}.{episode_steps}.pcb"
+            eval_env.write_current_pcb_file(path=run_output_dir,
+                                            filename=filename)
+            evaluation_log.write(f"run={run}/{settings['runs']-1} @ episode_step={episode_steps} : 10% overlap best hpwl : hpwl={np.round(best_hpwl_at_10_overlap,4)}, overlap={np.round(np.sum(all_ol)/8,4)}\r\n")
+            evaluation_log.write(f"all_ol={all_ol}\r\n")
+
+            # Capture snapshot
+            snapshot_filename=f'{run}.{settings["runs"]-1}.{episode_steps}'
+            eval_env.tracker.capture_snapshot(fileName=os.path.join(run_output_dir, snapshot_filename+".png"))
+            # Yes this is exactly like the previous one.
+            eval_env.write_current_pcb_file(
+                path=run_output_dir,
+                filename= snapshot_filename+".pcb")
+            # overwrite best; unique filename for easier processing with
+            # automated tools
+            eval_env.write_current_pcb_file(
+                path=run_output_dir,
+                filename=file_best_hpwl_10_overlap+".pcb")
+
+            if settings["verbose"] == 1:
+                print(f'run={run}/{settings["runs"]-1} @ episode_step={episode_steps} : 10% overlap best hpwl : hpwl={np.round(best_hpwl_at_10_overlap,4)}, overlap={np.round(np.sum(all_ol)/8,4)}')
+
+        if (hpwl < best_hpwl_at_20_overlap ) and (np.max(all_ol) <= 20.0):
+            best_hpwl_at_20_overlap = hpwl
+            filename = file_best_hpwl_20_overlap + f'{run}.{settings["runs"]-1}.{episode_steps}.pcb'
+            eval_env.write_current_pcb_file(path=run_output_dir,
+                                            filename=filename)
+            evaluation_log.write(f"run={run}/{settings['runs']-1} @ episode_step={episode_steps} : 20% overlap best hpwl : hpwl={np.round(best_hpwl_at_20_overlap,4)}, overlap={np.round(np.sum(all_ol)/8,4)}\r\n")
+            evaluation_log.write(f"all_ol={all_ol}\r\n")
+
+            # Capture snapshot
+            snapshot_filename=f"{run}.{settings['runs']-1}.{episode_steps}"
+            eval_env.tracker.capture_snapshot(fileName=os.path.join(run_output_dir, snapshot_filename+".png"))
+            # Yes this is exactly like the previous one.
+            eval_env.write_current_pcb_file(
+                path=run_output_dir,
+                filename=snapshot_filename+".pcb")
+            # overwrite best; unique filename for easier processing with
+            # automated tools
+            eval_env.write_current_pcb_file(
+                path=run_output_dir,
+                filename=file_best_hpwl_20_overlap+".pcb")
+
+            if settings["verbose"] == 1:
+                print(f"run={run}/{settings['runs']-1} @ episode_step={episode_steps} : 20% overlap best hpwl : hpwl={np.round(best_hpwl_at_20_overlap,4)}, overlap={np.round(np.sum(all_ol)/8,4)}")
+
+    if settings["verbose"] == 1:
+        print(f"eval_env episode {run} performed {episode_steps} in environment.")
+
+    evaluation_log.write(f"eval_env episode {run} performed {episode_steps} steps in environment.\r\n")
+    evaluation_log.close()
+
+    if settings["quick_eval"] is False:
+        eval_env.tracker.create_video(
+            fileName=os.path.join(run_output_dir,
+                                  f"{run}.mp4")
+                                  )
+        eval_env.tracker.log_run_to_file(
+            path=run_output_dir,
+            filename=f"{run}.log",
+            kicad_pcb=eval_env.g.get_kicad_pcb_file())
+
+    eval_env.tracker.reset()
+
+    return {"pcb_idx": pcb_idx,
+            "run": run,
+            "seed": seed,
+            "reward": total_reward,
+            "steps": total_steps,
+            "best_hpwl_00_overlap": best_hpwl,
+            "best_hpwl_10_overlap": best_hpwl_at_10_overlap,
+            "best_hpwl_20_overlap": best_hpwl_at_20_overlap}
+
+
 def evaluation_run(settings):
     """
     执行强化学习策略的评估运行，包括模型加载、环境设置和评估过程。
 
+    每个 (pcb 索引, run) 组合是一个独立的任务，使用该 run 的种子；
+    settings["workers"] 大于 1 时任务分布到进程池中并行执行，结果按任务
+    顺序收集，与进程数无关。
+
     Args:
         settings (dict): 包含评估配置的字典，包括：
             - hyperparameters: 超参数文件路径
@@ -195,11 +409,13 @@ def evaluation_run(settings):
             - seed: 随机种子
             - max_steps: 最大步数
             - w/o/hpwl: 奖励权重参数
-            - run: 运行编号
+            - runs: 运行次数
             - shuffle_idxs: 是否打乱索引
+            - workers: 并行评估的进程数量
 
     Returns:
-        无显式返回，但会生成评估日志和结果文件
+        list: 每个任务的评估结果（见 evaluation_episode），同时生成评估日志
+        和结果文件
     """
     hp = load_hyperparameters_from_file(settings["hyperparameters"])
 
@@ -216,198 +432,33 @@ def evaluation_run(settings):
 
     Path(settings["output"]).mkdir(parents=True, exist_ok=True)
 
-    for j in range(get_pcb_num(settings["pcb_file"])):
-        total_reward=0
-        total_steps = 0
-
-        file_best_hpwl_00_overlap = "best_hpwl_00_overlap"
-        file_best_hpwl_10_overlap = "best_hpwl_10_overlap"
-        file_best_hpwl_20_overlap = "best_hpwl_20_overlap"
-
-        best_hpwl = 1E6
-        best_hpwl_at_10_overlap = 1E6
-        best_hpwl_at_20_overlap = 1E6
-
-        set_seed_everywhere(settings["seed"][settings["run"]])
-
-        env_params=parameters({
-            "pcb_file": settings["pcb_file"],
-            "training_pcb": None,
-            "evaluation_pcb": None,
-            "net": "",
-            "use_dataAugmenter": True,
-            "augment_position": True,
-            "augment_orientation": True,
-            "agent_max_action": 1,
-            "agent_expl_noise": hp["expl_noise"],
-            "debug": True,
-            "max_steps": settings["max_steps"],
-            "w": settings["w"],
-            "o": settings["o"],
-            "hpwl": settings["hpwl"],
-            "seed": settings["seed"][settings["run"]],
-            "ignore_power": True,
-            "log_dir": None,
-            "idx": j,
-            "shuffle_idxs": settings["shuffle_idxs"],
-            })  # ⭐ 配置评估环境参数
-
-        eval_env = environment(env_params)
-
-        # create directories
-        current_pcb_filename = eval_env.get_current_pcb_name()
-        pcb_dir = os.path.join(settings["output"], current_pcb_filename)
-        Path(pcb_dir).mkdir(parents=True, exist_ok=True)
-
-        sa_dir = os.path.join(pcb_dir, "sa_pcb")
-        Path(sa_dir).mkdir(parents=True, exist_ok=True)
-
-        run_output_dir = os.path.join(pcb_dir,f"trial_{settings['run']}")
-        Path(run_output_dir).mkdir(parents=True, exist_ok=True)
-
-        # start the evaluation log
-        evaluation_log = open(os.path.join(run_output_dir,"evaluation.log"),
-                              "w",
-                              encoding="utf-8")
-        evaluation_log.write(
-            f"timestamp={datetime.now().strftime('%Y-%m-%d %H:%M:%S:%f')}\r\n")
-        evaluation_log.write("parameters begin\r\n")
-        evaluation_log.write(eval_env.parameters.to_text_string(prefix="\t"))
-        evaluation_log.write("parameters end\r\n")
-
-        eval_env.reset()
-        eval_env.write_current_pcb_file(path=sa_dir,
-                                        filename=current_pcb_filename+f"_{settings['run']}.pcb")
-        done = False
-        episode_steps=0
-        while not done:
-            episode_steps += 1
-            if settings["policy"] == "TD3":
-                obs_vec = eval_env.step(model=model.actor,
-                                        random=False,
-                                        deterministic=True,
-                                        rl_model_type="TD3")  # ⭐ 执行TD3策略的评估步骤
-                step_reward=0
-            else:   # SAC
-                obs_vec = eval_env.step(model=model.policy,
-                                        random=False,
-                                        deterministic=True,
-                                        rl_model_type="SAC")  # ⭐ 执行SAC策略的评估步骤
-                step_reward=0
-
-            for indiv_obs in obs_vec:
-                step_reward += indiv_obs[2]
-                if indiv_obs[4] is True:
-                    done = True
-
-            step_reward /= len(obs_vec)
-            total_reward += step_reward
-            total_steps += 1
-
-            hpwl = eval_env.calc_hpwl()
-
-            all_ol = []
-            for indiv_obs in obs_vec:
-                next_state_ol = indiv_obs[1][8:16]
-                ol_ratios = indiv_obs[-1]["ol_ratios"]
-                all_ol.append(
-                    np.sum(np.array(next_state_ol)*np.array(ol_ratios))*100)
-
-            if (hpwl < best_hpwl) and (np.max(all_ol) < 1):
-                best_hpwl = hpwl
-                filename = file_best_hpwl_00_overlap + f"{settings['run']}.{settings['runs']-1}.{episode_steps}.pcb"
-                eval_env.write_current_pcb_file(path=run_output_dir, filename=filename)
-                evaluation_log.write(f"run={settings['run']}/{settings['runs']-1} @ episode_step={episode_steps} : Zero overlap best hpwl : hpwl={np.round(hpwl,4)}, overlap={np.round(np.sum(all_ol)/8,4)}\r\n")
-                evaluation_log.write(f"all_ol={all_ol}\r\n")
-
-                # Capture snapshot
-                snapshot_filename=f'{settings["run"]}.{settings["runs"]-1}.{episode_steps}'
-                eval_env.tracker.capture_snapshot(fileName=os.path.join(run_output_dir, snapshot_filename+".png"))
-                # Yes this is exactly like the previous one.
-                eval_env.write_current_pcb_file(
-                    path=run_output_dir,
-                    filename= snapshot_filename+".pcb")
-                # overwrite best; unique filename for easier processing with
-                # automated tools
-                eval_env.write_current_pcb_file(
-                    path=run_output_dir,
-                    filename=file_best_hpwl_00_overlap+".pcb")
-
-                if settings["verbose"] == 1:
-                    print(f"run={settings['run']}/{settings['runs']-1} @ episode_step={episode_steps} : Zero overlap best hpwl : hpwl={np.round(hpwl,4)}, overlap={np.round(np.sum(all_ol)/8,4)}")
-
-            if (hpwl < best_hpwl_at_10_overlap ) and (np.max(all_ol) <= 10.0):
-                best_hpwl_at_10_overlap = hpwl
-                filename = file_best_hpwl_10_overlap + f"{settings['run']}.{settings['runs']-1}.{episode_steps}.pcb"
-                eval_env.write_current_pcb_file(path=run_output_dir,
-                                                filename=filename)
-                evaluation_log.write(f"run={settings['run']}/{settings['runs']-1} @ episode_step={episode_steps} : 10% overlap best hpwl : hpwl={np.round(best_hpwl_at_10_overlap,4)}, overlap={np.round(np.sum(all_ol)/8,4)}\r\n")
-                evaluation_log.write(f"all_ol={all_ol}\r\n")
-
-                # Capture snapshot
-                snapshot_filename=f'{settings["run"]}.{settings["runs"]-1}.{episode_steps}'
-                eval_env.tracker.capture_snapshot(fileName=os.path.join(run_output_dir, snapshot_filename+".png"))
-                # Yes this is exactly like the previous one.
-                eval_env.write_current_pcb_file(
-                    path=run_output_dir,
-                    filename= snapshot_filename+".pcb")
-                # overwrite best; unique filename for easier processing with
-                # automated tools
-                eval_env.write_current_pcb_file(
-                    path=run_output_dir,
-                    filename=file_best_hpwl_10_overlap+".pcb")
-
-                if settings["verbose"] == 1:
-                    print(f'run={settings["run"]}/{settings["runs"]-1} @ episode_step={episode_steps} : 10% overlap best hpwl : hpwl={np.round(best_hpwl_at_10_overlap,4)}, overlap={np.round(np.sum(all_ol)/8,4)}')
-
-            if (hpwl < best_hpwl_at_20_overlap ) and (np.max(all_ol) <= 20.0):
-                best_hpwl_at_20_overlap = hpwl
-                filename = file_best_hpwl_20_overlap + f'{settings["run"]}.{settings["runs"]-1}.{episode_steps}.pcb'
-                eval_env.write_current_pcb_file(path=run_output_dir,
-                                                filename=filename)
-                evaluation_log.write(f"run={settings['run']}/{settings['runs']-1} @ episode_step={episode_steps} : 20% overlap best hpwl : hpwl={np.round(best_hpwl_at_20_overlap,4)}, overlap={np.round(np.sum(all_ol)/8,4)}\r\n")
-                evaluation_log.write(f"all_ol={all_ol}\r\n")
-
-                # Capture snapshot
-                snapshot_filename=f"{settings['run']}.{settings['runs']-1}.{episode_steps}"
-                eval_env.tracker.capture_snapshot(fileName=os.path.join(run_output_dir, snapshot_filename+".png"))
-                # Yes this is exactly like the previous one.
-                eval_env.write_current_pcb_file(
-                    path=run_output_dir,
-                    filename=snapshot_filename+".pcb")
-                # overwrite best; unique filename for easier processing with
-                # automated tools
-                eval_env.write_current_pcb_file(
-                    path=run_output_dir,
-                    filename=file_best_hpwl_20_overlap+".pcb")
-
-                if settings["verbose"] == 1:
-                    print(f"run={settings['run']}/{settings['runs']-1} @ episode_step={episode_steps} : 20% overlap best hpwl : hpwl={np.round(best_hpwl_at_20_overlap,4)}, overlap={np.round(np.sum(all_ol)/8,4)}")
-
-        if settings["verbose"] == 1:
-            print(f"eval_env episode {settings['run']} performed {episode_steps} in environment.")
-
-        evaluation_log.write(f"eval_env episode {settings['run']} performed {episode_steps} steps in environment.\r\n")
-        evaluation_log.close()
-
-        if settings["quick_eval"] is False:
-            eval_env.tracker.create_video(
-                fileName=os.path.join(run_output_dir,
-                                      f"{settings['run']}.mp4")
-                                      )
-            eval_env.tracker.log_run_to_file(
-                path=run_output_dir,
-                filename=f"{settings['run']}.log",
-                kicad_pcb=eval_env.g.get_kicad_pcb_file())
+    policy = model.actor if settings["policy"] == "TD3" else model.policy
+    if settings["workers"] > 1:
+        # 工作进程使用策略网络的 CPU 副本
+        policy = policy_snapshot(policy)
+
+    jobs = []
+    for run in range(settings["runs"]):
+        for j in range(get_pcb_num(settings["pcb_file"])):
+            jobs.append((j, run, settings["seed"][run]))
 
-        eval_env.tracker.reset()
+    results = run_evaluation_jobs(evaluation_episode,
+                                  jobs,
+                                  workers=settings["workers"],
+                                  settings=settings,
+                                  hp=hp,
+                                  policy=policy)
+
+    if settings["verbose"] == 1:
+        for r in results:
+            print(f"pcb={r['pcb_idx']} run={r['run']} seed={r['seed']} : reward={np.round(r['reward'],4)}, steps={r['steps']}, best hpwl (0%/10%/20% overlap)={np.round(r['best_hpwl_00_overlap'],4)}/{np.round(r['best_hpwl_10_overlap'],4)}/{np.round(r['best_hpwl_20_overlap'],4)}")
+
+    return results
 
 def main():
     _ , settings = cmdline_args()
 
-    for run in range(settings["runs"]):
-        settings["run"] = run
-        evaluation_run(settings)
+    evaluation_run(settings)
 
 if __name__ == "__main__":
     try:
@@ -1,12 +1,13 @@
 import torch
 import torch.nn.functional as F
 from torch.optim import Adam
-from utils import soft_update, hard_update, ReplayMemory
+from utils import soft_update, hard_update, ReplayMemory, MemmapReplayMemory
 import time
 import numpy as np
 
 import tracker
 import gym
+from core.profiler import profiler
 LOG_SIG_MAX = 2
 LOG_SIG_MIN = -20
 epsilon = 1e-6
@@ -140,6 +141,17 @@ class GaussianPolicy(torch.nn.Module):
             _, _, action = self.sample(state)
         return action.detach().cpu().numpy()[0]
 
+    def select_actions(self, states, evaluate=False):
+        """
+        Batched select_action: one forward pass for an (n, state_dim) array.
+        """
+        states = torch.FloatTensor(np.asarray(states)).to(self.device)
+        if evaluate is False:
+            actions, _, _ = self.sample(states)
+        else:
+            _, _, actions = self.sample(states)
+        return actions.detach().cpu().numpy()
+
 class SAC(object):
     def __init__(
             self,
@@ -232,6 +244,13 @@ class SAC(object):
             device=self.device)
         self.trackr = tracker.tracker(avg_size=100,rl_policy_type="SAC")
 
+        # Per-phase timings (core.profiler), shared with the training
+        # environment
+        if self.train_env is not None:
+            self.profiler = self.train_env.profiler
+        else:
+            self.profiler = profiler(enabled=False)
+
         # Early stopping
         self.early_stopping = early_stopping
         self.exit = False
@@ -246,7 +265,8 @@ class SAC(object):
 
     def train(self, memory, batch_size, updates):
         # Sample a batch from memory
-        state_batch, action_batch, next_state_batch, reward_batch, mask_batch = memory.sample(batch_size=batch_size)
+        with self.profiler.timer("replay/sample"):
+            state_batch, action_batch, next_state_batch, reward_batch, mask_batch = memory.sample(batch_size=batch_size)
 
         with torch.no_grad():
             next_state_action, next_state_log_pi, _ = self.policy.sample(next_state_batch)
@@ -297,7 +317,8 @@ class SAC(object):
 
     def explore_for_expert_targets(self,
                                    reward_target_exploration_steps=25_000,
-                                   output_dir=None):
+                                   output_dir=None,
+                                   num_workers=1):
         """
         专家目标探索函数 - 在训练前进行随机探索以收集专家目标数据
         
@@ -311,6 +332,8 @@ class SAC(object):
             reward_target_exploration_steps (int): 总探索步数，默认25000步
             output_dir (str, optional): PCB文件输出目录路径，None表示不保存文件
             save_pcb_every_n_steps (int): 每隔多少步保存一次PCB文件，默认1000步
+            num_workers (int): 探索进程数量，大于1时使用多进程探索器
+                (multithread_explorer.ParallelExplorer) 并合并各进程的专家目标
             
         Returns:
             None
@@ -328,6 +351,15 @@ class SAC(object):
             print("Model cannot explore because training envrionment is missing. Please reload model and supply a training envrionment.")
             return
 
+        # 多进程探索：各进程运行独立的环境副本，结束后按节点合并最优值
+        if num_workers > 1:
+            from multithread_explorer import ParallelExplorer
+            ParallelExplorer(self, num_workers=num_workers, verbose=self.verbose).explore(
+                total_steps=reward_target_exploration_steps,
+                output_dir=output_dir)
+            self.done = False
+            return
+
         # 创建PCB输出目录（如果指定了输出目录）
         pcb_output_dir = None
         if output_dir is not None:
@@ -342,9 +374,14 @@ class SAC(object):
 
         # 初始化探索状态
         self.done = False          # 环境终止标志
+        # 探索结束时写出 explore_video.mp4，其中只有最后一个回合的帧（每个回合
+        # 结束都会清空跟踪器）。回合最多 max_steps 步，因此最后一个回合在剩余
+        # 步数不超过 max_steps 时才开始，此前不录制 (render="video" 时不绘制调试帧)
+        max_steps = self.train_env.parameters.max_steps
         
         # 主探索循环
-        for _ in range(reward_target_exploration_steps):
+        for step in range(reward_target_exploration_steps):
+            self.train_env.record_video = (reward_target_exploration_steps - step) <= max_steps
             # 调用环境步进函数，使用随机动作进行探索
             # 调用文件: src/training/core/environment/environment.py
             # 调用函数: self.train_env.step()
@@ -386,6 +423,7 @@ class SAC(object):
         # 调用文件: src/training/core/environment/environment.py
         # 调用函数: self.train_env.reset()
         self.train_env.tracker.create_video(fileName=os.path.join(self.train_env.parameters.log_dir,"explore_video.mp4"))
+        self.train_env.record_video = False
         self.train_env.reset()
         
         # 重置终止标志
@@ -395,7 +433,16 @@ class SAC(object):
               timesteps,
               callback,
               start_timesteps=25_000,
-              incremental_replay_buffer = None):
+              incremental_replay_buffer = None,
+              vec_env = None):
+        """
+        vec_env: optional core.environment.vec_environment. All worker
+        environments are stepped together and their transitions stored at
+        once. Timesteps are counted in environment steps summed over the
+        workers (one vec step advances t by num_envs), so timesteps,
+        start_timesteps and the callback frequencies keep their meaning;
+        episode statistics are tracked per worker.
+        """
 
         if self.train_env is None:
             print("Model cannot learn because training envrionment is missing. Please reload model and supply a training envrionment.")
@@ -403,8 +450,9 @@ class SAC(object):
 
         next_update_at = self.buffer_size*2
 
-        episode_reward = 0
-        episode_timesteps = 0
+        num_envs = 1 if vec_env is None else vec_env.num_envs
+        episode_reward = [0] * num_envs
+        episode_timesteps = [0] * num_envs
         self.episode_num = 0
 
         callback.on_training_start()
@@ -413,7 +461,9 @@ class SAC(object):
         self.done = False
         start_time = time.clock_gettime(time.CLOCK_REALTIME)
 
-        episode_start_time = start_time
+        episode_start_time = [start_time] * num_envs
+        # per worker (rewards, done) of the last vec step not yet counted
+        pending = []
 
         # Training Loop
         updates = 0
@@ -426,39 +476,59 @@ class SAC(object):
         alpha =0
         for t in range(1,int(timesteps)+1):
             self.num_timesteps = t
-            episode_timesteps += 1
 
-            if t < start_timesteps:
-                obs_vec = self.train_env.step(model=self.policy,
-                                              random=True,
-                                              rl_model_type="SAC")
+            if vec_env is not None:
+                # one vec step yields one environment step per worker,
+                # consumed by the next num_envs iterations
+                if len(pending) == 0:
+                    if t >= start_timesteps:
+                        vec_env.sync_policy(self.policy)
+                    with self.profiler.timer("environment/step"):
+                        transitions, rewards, dones = vec_env.step(random=t < start_timesteps)
+                    with self.profiler.timer("replay/add"):
+                        self.replay_buffer.add_batch(*transitions)
+                    self.profiler.step()
+                    pending = list(zip(range(num_envs), rewards, dones))
+                k, worker_rewards, self.done = pending.pop(0)
+                all_rewards = list(worker_rewards)
             else:
-                obs_vec = self.train_env.step(model=self.policy,
-                                              random=False,
-                                              rl_model_type="SAC")
-
-            all_rewards = []
-            for indiv_obs in obs_vec:
-                if indiv_obs[4] is True:
-                    self.done = True
-                all_rewards.append(indiv_obs[2])
-                transition = (indiv_obs[0],
-                              indiv_obs[3],
-                              indiv_obs[1],
-                              indiv_obs[2],
-                              1. -indiv_obs[4])
-                self.replay_buffer.add(*transition)
-
-            episode_reward += float(np.mean(np.array(all_rewards)))
+                k = 0
+                with self.profiler.timer("environment/step"):
+                    if t < start_timesteps:
+                        obs_vec = self.train_env.step(model=self.policy,
+                                                      random=True,
+                                                      rl_model_type="SAC")
+                    else:
+                        obs_vec = self.train_env.step(model=self.policy,
+                                                      random=False,
+                                                      rl_model_type="SAC")
+
+                all_rewards = []
+                for indiv_obs in obs_vec:
+                    if indiv_obs[4] is True:
+                        self.done = True
+                    all_rewards.append(indiv_obs[2])
+                    transition = (indiv_obs[0],
+                                  indiv_obs[3],
+                                  indiv_obs[1],
+                                  indiv_obs[2],
+                                  1. -indiv_obs[4])
+                    with self.profiler.timer("replay/add"):
+                        self.replay_buffer.add(*transition)
+
+            episode_timesteps[k] += 1
+            episode_reward[k] += float(np.mean(np.array(all_rewards)))
 
             if t >= start_timesteps:
                 if len(self.replay_buffer) > self.batch_size:
                     # Number of updates per step in environment
                     for _ in range(self.gradient_steps):
                         # Update parameters of all the networks
-                        critic_1_loss, critic_2_loss, policy_loss, ent_loss, alpha = self.train(self.replay_buffer,
-                                                                                                self.batch_size,
-                                                                                                updates)
+                        # learning/train includes replay/sample
+                        with self.profiler.timer("learning/train"):
+                            critic_1_loss, critic_2_loss, policy_loss, ent_loss, alpha = self.train(self.replay_buffer,
+                                                                                                    self.batch_size,
+                                                                                                    updates)
                         updates += 1
 
                         all_actor_losses.append(policy_loss)
@@ -471,9 +541,9 @@ class SAC(object):
                 if t < start_timesteps or len(self.replay_buffer) <= self.batch_size:
                     self.trackr.append(actor_loss=0,
                            critic_loss=0,
-                           episode_reward=episode_reward,
-                           episode_length = episode_timesteps,
-                           episode_fps = episode_timesteps / (episode_finish_time - episode_start_time),
+                           episode_reward=episode_reward[k],
+                           episode_length = episode_timesteps[k],
+                           episode_fps = episode_timesteps[k] / (episode_finish_time - episode_start_time[k]),
                            critic_1_loss=0,
                            critic_2_loss=0,
                            entropy_loss=0,
@@ -481,9 +551,9 @@ class SAC(object):
                 else:
                     self.trackr.append(actor_loss=np.mean(all_actor_losses),
                            critic_loss=np.mean(all_critic_1_losses+all_critic_2_losses),
-                           episode_reward=episode_reward,
-                           episode_length = episode_timesteps,
-                           episode_fps = episode_timesteps / (episode_finish_time - episode_start_time),
+                           episode_reward=episode_reward[k],
+                           episode_length = episode_timesteps[k],
+                           episode_fps = episode_timesteps[k] / (episode_finish_time - episode_start_time[k]),
                            critic_1_loss=np.mean(all_critic_1_losses),
                            critic_2_loss=np.mean(all_critic_2_losses),
                            entropy_loss=np.mean(all_entropy_losses),
@@ -491,13 +561,15 @@ class SAC(object):
 
             callback.on_step()
             if self.done:
-                self.train_env.reset()
+                # worker environments reset themselves
+                if vec_env is None:
+                    self.train_env.reset()
                 self.done = False
-                episode_reward = 0
-                episode_timesteps = 0
+                episode_reward[k] = 0
+                episode_timesteps[k] = 0
                 self.episode_num += 1
                 self.train_env.tracker.reset()
-                episode_start_time = time.clock_gettime(time.CLOCK_REALTIME)
+                episode_start_time[k] = time.clock_gettime(time.CLOCK_REALTIME)
 
                 all_actor_losses = []
                 all_critic_1_losses = []
@@ -521,13 +593,15 @@ class SAC(object):
                         self.buffer_size *= 4
                         next_update_at += self.buffer_size
 
-                    old_replay_buffer = self.replay_buffer
-                    self.replay_buffer = ReplayMemory(self.buffer_size,
-                                                      device=self.device)
-                    self.replay_buffer.add_content_of(old_replay_buffer)
+                    # grow in place: bulk copy of the stored transitions
+                    self.replay_buffer.resize(self.buffer_size)
 
                     print(f"Updated replay buffer at timestep {t}; replay_buffer_size={self.buffer_size}, len={self.replay_buffer.__len__()} next_update_at={next_update_at}")
 
+        if isinstance(self.replay_buffer, MemmapReplayMemory):
+            self.replay_buffer.save(flush=True)
+        if vec_env is not None:
+            vec_env.merge_targets()
         callback.on_training_end()
 
     # Save model parameters
@@ -538,6 +612,12 @@ class SAC(object):
                     "critic_optimizer_state_dict": self.critic_optim.state_dict(),
                     "policy_optimizer_state_dict": self.policy_optim.state_dict()}, filename)
 
+        # Memory mapped replay buffers are checkpointed with the networks:
+        # meta.json is always written, the arrays are flushed every
+        # flush_every transitions (see MemmapReplayMemory.save).
+        if isinstance(self.replay_buffer, MemmapReplayMemory):
+            self.replay_buffer.save()
+
     # Load model parameters
     def load(self, filename):
         checkpoint = torch.load(filename)
@@ -7,6 +7,7 @@ import torch.nn.functional as F
 import utils
 import tracker
 import time
+from core.profiler import profiler
 
 # Implementation of Twin Delayed Deep Deterministic Policy Gradients (TD3)
 # Paper: https://arxiv.org/abs/1802.09477
@@ -47,6 +48,13 @@ class Actor(nn.Module):
         state = torch.FloatTensor(state.reshape(1, -1)).to(self.device)
         return self.forward(state).cpu().data.numpy().flatten()
 
+    def select_actions(self, states):
+        """
+        Batched select_action: one forward pass for an (n, state_dim) array.
+        """
+        states = torch.FloatTensor(np.asarray(states)).to(self.device)
+        return self.forward(states).cpu().data.numpy()
+
 class Critic(nn.Module):
     def __init__(self,
                  state_dim,
@@ -160,6 +168,13 @@ class TD3(object):
                                                 device=self.device)
         self.trackr = tracker.tracker(100)
 
+        # Per-phase timings (core.profiler), shared with the training
+        # environment
+        if self.train_env is not None:
+            self.profiler = self.train_env.profiler
+        else:
+            self.profiler = profiler(enabled=False)
+
         # Early stopping
         self.early_stopping = early_stopping
         self.exit = False
@@ -174,7 +189,8 @@ class TD3(object):
         self.total_it += 1
 
         # Sample replay buffer
-        state, action, next_state, reward, not_done = replay_buffer.sample(self.batch_size)
+        with self.profiler.timer("replay/sample"):
+            state, action, next_state, reward, not_done = replay_buffer.sample(self.batch_size)
 
         with torch.no_grad():
             # Select action according to policy and add clipped noise
@@ -237,6 +253,12 @@ class TD3(object):
         torch.save(self.actor_optimizer.state_dict(),
                    filename + "_actor_optimizer")
 
+        # Memory mapped replay buffers are checkpointed with the networks:
+        # meta.json is always written, the arrays are flushed every
+        # flush_every transitions (see MemmapReplayMemory.save).
+        if isinstance(self.replay_buffer, utils.MemmapReplayMemory):
+            self.replay_buffer.save()
+
     def load(self, filename):
         self.critic.load_state_dict(torch.load(filename + "_critic"))
         self.critic_optimizer.load_state_dict(torch.load(filename + "_critic_optimizer"))
@@ -249,7 +271,8 @@ class TD3(object):
     def explore_for_expert_targets(self,
                                    reward_target_exploration_steps=25_000,
                                    output_dir=None,
-                                   save_pcb_every_n_steps=1000):
+                                   save_pcb_every_n_steps=1000,
+                                   num_workers=1):
         """
         在专家目标探索过程中，每隔一定步数保存当前PCB布局到work目录。
         
@@ -257,11 +280,22 @@ class TD3(object):
             reward_target_exploration_steps: 探索步数
             output_dir: PCB文件输出目录，如果为None则不保存
             save_pcb_every_n_steps: 每隔多少步保存一次PCB文件
+            num_workers: 探索进程数量，大于1时使用多进程探索器
         """
         if self.train_env is None:
             print("Model cannot explore because training envrionment is missing. Please reload model and supply a training envrionment.")
             return
 
+        # 多进程探索：各进程运行独立的环境副本，结束后按节点合并最优值
+        if num_workers > 1:
+            from multithread_explorer import ParallelExplorer
+            ParallelExplorer(self, num_workers=num_workers, verbose=self.verbose).explore(
+                total_steps=reward_target_exploration_steps,
+                output_dir=output_dir,
+                save_pcb_every_n_steps=save_pcb_every_n_steps)
+            self.done = False
+            return
+
         # 创建PCB输出目录
         pcb_output_dir = None
         if output_dir is not None:
@@ -325,7 +359,16 @@ class TD3(object):
               timesteps,
               callback,
               start_timesteps=25_000,
-              incremental_replay_buffer = None):
+              incremental_replay_buffer = None,
+              vec_env = None):
+        """
+        vec_env: optional core.environment.vec_environment. All worker
+        environments are stepped together and their transitions stored at
+        once. Timesteps are counted in environment steps summed over the
+        workers (one vec step advances t by num_envs), so timesteps,
+        start_timesteps and the callback frequencies keep their meaning;
+        episode statistics are tracked per worker.
+        """
 
         if self.train_env is None:
             print("Model cannot explore because training envrionment is\
@@ -334,8 +377,9 @@ class TD3(object):
 
         next_update_at = self.buffer_size*2
 
-        episode_reward = 0
-        episode_timesteps = 0
+        num_envs = 1 if vec_env is None else vec_env.num_envs
+        episode_reward = [0] * num_envs
+        episode_timesteps = [0] * num_envs
         self.episode_num = 0
 
         callback.on_training_start()
@@ -344,54 +388,78 @@ class TD3(object):
         self.done = False
         start_time = time.clock_gettime(time.CLOCK_REALTIME)
 
-        episode_start_time = start_time
+        episode_start_time = [start_time] * num_envs
+        # per worker (rewards, done) of the last vec step not yet counted
+        pending = []
 
         for t in range(1,int(timesteps)+1):
             self.num_timesteps = t
 
-            episode_timesteps += 1
-            if t < start_timesteps:
-                obs_vec = self.train_env.step(model=self.actor, random=True)
+            if vec_env is not None:
+                # one vec step yields one environment step per worker,
+                # consumed by the next num_envs iterations
+                if len(pending) == 0:
+                    if t >= start_timesteps:
+                        vec_env.sync_policy(self.actor)
+                    with self.profiler.timer("environment/step"):
+                        transitions, rewards, dones = vec_env.step(random=t < start_timesteps)
+                    with self.profiler.timer("replay/add"):
+                        self.replay_buffer.add_batch(*transitions)
+                    self.profiler.step()
+                    pending = list(zip(range(num_envs), rewards, dones))
+                k, worker_rewards, self.done = pending.pop(0)
+                all_rewards = list(worker_rewards)
             else:
-                obs_vec = self.train_env.step(model=self.actor, random=False)
-
-            all_rewards = []
-            for indiv_obs in obs_vec:
-                if indiv_obs[4] is True:
-                    self.done = True
-                all_rewards.append(indiv_obs[2])
-                transition = (indiv_obs[0], indiv_obs[3], indiv_obs[1], indiv_obs[2], 1. -indiv_obs[4])
-                self.replay_buffer.add(*transition)
-
-            episode_reward += float(np.mean(np.array(all_rewards)))
+                k = 0
+                with self.profiler.timer("environment/step"):
+                    if t < start_timesteps:
+                        obs_vec = self.train_env.step(model=self.actor, random=True)
+                    else:
+                        obs_vec = self.train_env.step(model=self.actor, random=False)
+
+                all_rewards = []
+                for indiv_obs in obs_vec:
+                    if indiv_obs[4] is True:
+                        self.done = True
+                    all_rewards.append(indiv_obs[2])
+                    transition = (indiv_obs[0], indiv_obs[3], indiv_obs[1], indiv_obs[2], 1. -indiv_obs[4])
+                    with self.profiler.timer("replay/add"):
+                        self.replay_buffer.add(*transition)
+
+            episode_timesteps[k] += 1
+            episode_reward[k] += float(np.mean(np.array(all_rewards)))
 
             if t >= start_timesteps:
-                critic_loss, actor_loss = self.train(self.replay_buffer)
+                # learning/train includes replay/sample
+                with self.profiler.timer("learning/train"):
+                    critic_loss, actor_loss = self.train(self.replay_buffer)
 
             if self.done:
                 episode_finish_time = time.clock_gettime(time.CLOCK_REALTIME)
                 if t < start_timesteps:
                     self.trackr.append(actor_loss=0,
                                        critic_loss=0,
-                                       episode_reward=episode_reward,
-                                       episode_length = episode_timesteps,
-                                       episode_fps = episode_timesteps / (episode_finish_time - episode_start_time))
+                                       episode_reward=episode_reward[k],
+                                       episode_length = episode_timesteps[k],
+                                       episode_fps = episode_timesteps[k] / (episode_finish_time - episode_start_time[k]))
                 else:
                     self.trackr.append(actor_loss=actor_loss,
                            critic_loss=critic_loss,
-                           episode_reward=episode_reward,
-                           episode_length = episode_timesteps,
-                           episode_fps = episode_timesteps / (episode_finish_time - episode_start_time))
+                           episode_reward=episode_reward[k],
+                           episode_length = episode_timesteps[k],
+                           episode_fps = episode_timesteps[k] / (episode_finish_time - episode_start_time[k]))
 
             callback.on_step()
             if self.done:
-                self.train_env.reset()
+                # worker environments reset themselves
+                if vec_env is None:
+                    self.train_env.reset()
                 self.done = False
-                episode_reward = 0
-                episode_timesteps = 0
+                episode_reward[k] = 0
+                episode_timesteps[k] = 0
                 self.episode_num += 1
                 self.train_env.tracker.reset()
-                episode_start_time = time.clock_gettime(time.CLOCK_REALTIME)
+                episode_start_time[k] = time.clock_gettime(time.CLOCK_REALTIME)
 
             # Early stopping
             if self.exit is True:
@@ -412,14 +480,16 @@ class TD3(object):
                         self.buffer_size *= 4
                         next_update_at += self.buffer_size# * 3
 
-                    old_replay_buffer = self.replay_buffer
-                    self.replay_buffer = utils.ReplayMemory(self.buffer_size,
-                                                            device=self.device)
-                    self.replay_buffer.add_content_of(old_replay_buffer)
+                    # grow in place: bulk copy of the stored transitions
+                    self.replay_buffer.resize(self.buffer_size)
 
                     print(f"Updated replay buffer at timestep {t};\
                            replay_buffer_size={self.buffer_size},\
                            len={self.replay_buffer.__len__()}\
                            next_update_at={next_update_at}")
 
+        if isinstance(self.replay_buffer, utils.MemmapReplayMemory):
+            self.replay_buffer.save(flush=True)
+        if vec_env is not None:
+            vec_env.merge_targets()
         callback.on_training_end()
@@ -0,0 +1,89 @@
+"""
+Asynchronous persistence of evaluation artifacts.
+
+log_and_eval_callback.evaluate used to encode videos, build tensorboard
+video tensors, write run logs, snapshots and duplicate .pcb files on the
+training thread, stalling training for seconds at every evaluation. The
+artifact writer runs these jobs on a small thread pool instead. Video
+encoding (cv2), frame decompression (zlib) and file I/O release the GIL, so
+the jobs overlap with training.
+
+The number of pending jobs is bounded: submit() blocks when the queue is
+full, which keeps memory bounded when evaluations produce artifacts faster
+than they can be written.
+
+Jobs must only use data that no longer changes on the training thread,
+e.g. a tracker snapshot (core.environment.tracker.tracker.snapshot) or a
+.pcb file that has already been written.
+"""
+import shutil
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+class artifact_writer():
+    def __init__(self, max_workers: int = 2, max_pending: int = 16):
+        """
+        :param max_workers: Number of writer threads.
+        :param max_pending: Maximum number of queued or running jobs; submit
+         blocks while this many jobs are pending.
+        """
+        self.executor = ThreadPoolExecutor(max_workers=max_workers,
+                                           thread_name_prefix="artifact_writer")
+        self.slots = threading.BoundedSemaphore(max_pending)
+        self.lock = threading.Lock()
+        self.pending = set()
+        self.errors = []
+
+    def _done(self, future):
+        self.slots.release()
+        with self.lock:
+            self.pending.discard(future)
+            if future.exception() is not None:
+                self.errors.append(future.exception())
+
+    def submit(self, fn, *args, **kwargs):
+        """
+        Queue fn(*args, **kwargs) for execution on a writer thread.
+        """
+        self.slots.acquire()
+        future = self.executor.submit(fn, *args, **kwargs)
+        with self.lock:
+            self.pending.add(future)
+        future.add_done_callback(self._done)
+        return future
+
+    def copy_file(self, src, dst):
+        """
+        Queue a file copy, e.g. to duplicate a .pcb snapshot under another
+        name without serializing the board again.
+        """
+        return self.submit(shutil.copyfile, src, dst)
+
+    def wait(self):
+        """
+        Block until every queued job finished. Raises the first error raised
+        by a job since the last call.
+        """
+        while True:
+            with self.lock:
+                pending = list(self.pending)
+            if len(pending) == 0:
+                break
+            for future in pending:
+                future.exception()
+
+        with self.lock:
+            errors = self.errors
+            self.errors = []
+        if len(errors) > 0:
+            raise errors[0]
+
+    def close(self):
+        """
+        Wait for all jobs and stop the writer threads.
+        """
+        try:
+            self.wait()
+        finally:
+            self.executor.shutdown(wait=True)
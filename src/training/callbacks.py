@@ -5,6 +5,8 @@ from datetime import datetime
 
 from torch.utils.tensorboard import SummaryWriter
 from core.environment.environment import environment
+from artifact_writer import artifact_writer
+from evaluator import evaluate_policy, policy_snapshot, async_evaluator
 
 from pcb import pcb
 from graph import graph     # Necessary for graph related methods
@@ -92,6 +94,10 @@ class log_and_eval_callback():
 
         self.eval_env = None
         self.writer = SummaryWriter(log_dir=self.save_path)
+        # Videos, run logs, snapshots and .pcb copies of evaluations are
+        # written off the training thread. A single writer thread keeps
+        # submission order, so the latest "best" .pcb always wins.
+        self.artifact_writer = artifact_writer(max_workers=1)
 
         self.settings = settings
         self.hyperparameters = hyperparameters
@@ -99,6 +105,21 @@ class log_and_eval_callback():
         self.shuffle_evaluation_idxs = settings["shuffle_evaluation_idxs"]
         self.model = model
 
+        # Per-phase timings of the training step (core.profiler) are
+        # exported every profile_every steps; None disables profiling.
+        self.profile_every = settings.get("profile_every", None)
+        self.profile_csv = os.path.join(self.save_path, "profile.csv")
+
+        # Number of processes running evaluation episodes in parallel
+        self.evaluation_workers = settings.get("evaluation_workers", 1)
+
+        # Periodic evaluations on a separate evaluator process (policy and
+        # expert target snapshots); None evaluates inline.
+        if settings.get("async_evaluation", False) is True:
+            self.evaluator = async_evaluator(log_dir=self.save_path)
+        else:
+            self.evaluator = None
+
     def on_step(self):
         if self.model.done:
             episode_length = self.model.trackr.episode_length[-1]
@@ -176,45 +197,29 @@ class log_and_eval_callback():
                 print(f'{datetime.now().strftime("%Y-%m-%d %H:%M:%S")} | {self.model.num_timesteps} | {episode_length}/{mean_episode_length} | {episode_reward}/{mean_episode_reward} | {fps}/{mean_fps}')
 
         if self.model.num_timesteps % self.eval_freq == 0:
-            info = self.evaluate(
-                model=None,
-                tag=f"periodic_evals/training_dataset/{int(self.model.num_timesteps/1000)}k",
-                training_dataset=True,
-                quick_eval=True)
-            self.writer.add_scalar(
-                tag="periodic_evals/training_dataset/episode_reward",
-                scalar_value=info[0],
-                global_step=self.model.num_timesteps)
-            self.writer.add_scalar(
-                tag="periodic_evals/training_dataset/episode_length",
-                scalar_value=info[1],
-                global_step=self.model.num_timesteps)
-            if self.verbose:
-                mean_episode_length = np.int32(
-                    np.round(np.mean(self.model.trackr.episode_length),0))
-                mean_episode_reward = np.round(
-                    np.mean(self.model.trackr.episode_reward),2)
-                print(f" EVALUATION - TRAINING | {datetime.now().strftime('%Y-%m-%d %H:%M:%S')} | {self.model.num_timesteps} | {np.round(info[1],2)}/{mean_episode_length} | {np.round(info[0],2)}/{np.round(mean_episode_reward,2)}/{np.round(self.best_mean_episode_reward,2)}")
-
-            info = self.evaluate(
-                model=None,
-                tag=f"periodic_evals/evaluation_dataset/{int(self.model.num_timesteps/1000)}k",
-                training_dataset=False,
-                quick_eval=True)
-            self.writer.add_scalar(
-                tag="periodic_evals/testing_dataset/episode_reward",
-                scalar_value=info[0],
-                global_step=self.model.num_timesteps)
-            self.writer.add_scalar(
-                tag="periodic_evals/testing_dataset/episode_length",
-                scalar_value=info[1],
-                global_step=self.model.num_timesteps)
-            if self.verbose:
-                mean_episode_length = np.int32(
-                    np.round(np.mean(self.model.trackr.episode_length),0))
-                mean_episode_reward = np.round(
-                    np.mean(self.model.trackr.episode_reward),2)
-                print(f" EVALUATION - TEST     | {datetime.now().strftime('%Y-%m-%d %H:%M:%S')} | {self.model.num_timesteps} | {np.round(info[1],2)}/{mean_episode_length} | {np.round(info[0],2)}/{np.round(mean_episode_reward,2)}/{np.round(self.best_mean_episode_reward,2)}")
+            for training_dataset in (True, False):
+                if self.evaluator is not None:
+                    self.submit_periodic_evaluation(training_dataset)
+                else:
+                    dataset = "training_dataset" if training_dataset is True else "evaluation_dataset"
+                    info = self.evaluate(
+                        model=None,
+                        tag=f"periodic_evals/{dataset}/{int(self.model.num_timesteps/1000)}k",
+                        training_dataset=training_dataset,
+                        quick_eval=True)
+                    self.log_periodic_evaluation(info,
+                                                 training_dataset,
+                                                 self.model.num_timesteps)
+
+        if self.evaluator is not None:
+            for (global_step, training_dataset), info in self.evaluator.poll():
+                self.log_periodic_evaluation(info, training_dataset, global_step)
+
+        if (self.profile_every is not None and
+            self.model.num_timesteps % self.profile_every == 0):
+            self.model.profiler.export(global_step=self.model.num_timesteps,
+                                       writer=self.writer,
+                                       csv_file=self.profile_csv)
 
         # 新增：实时PCB文件保存逻辑
         if (self.pcb_save_freq is not None and 
@@ -256,6 +261,69 @@ class log_and_eval_callback():
             except Exception as e:
                 print(f"⚠️  保存实时PCB文件失败: {e}")
 
+    def submit_periodic_evaluation(self, training_dataset: bool = True):
+        """
+        Queue a periodic quick evaluation on the evaluator process. The
+        policy weights and expert targets are snapshotted now, training
+        continues while the evaluation runs.
+        :param training_dataset: Evaluate on the training dataset when True,
+         otherwise on the evaluation dataset, defaults to True
+        :type training_dataset: bool, optional
+        """
+        params, output_dir, video_tag = self.evaluation_setup(
+            training_dataset=training_dataset,
+            periodic=True)
+
+        target_params = None
+        if training_dataset is True:
+            target_params = self.model.train_env.get_target_params()
+
+        self.evaluator.submit(
+            key=(self.model.num_timesteps, training_dataset),
+            params=params,
+            policy=policy_snapshot(self.model.actor if self.rl_model_type == "TD3" else self.model.policy),
+            rl_model_type=self.rl_model_type,
+            output_dir=output_dir,
+            num_evaluations=self.num_evaluations,
+            t=int(self.model.num_timesteps/1000),
+            target_params=copy.deepcopy(target_params),
+            quick_eval=True,
+            video_tag=video_tag,
+            parameters_text=self.model.train_env.parameters.to_text_string(prefix="\t"))
+
+    def log_periodic_evaluation(self,
+                                info,
+                                training_dataset: bool,
+                                global_step: int):
+        """
+        Log the result of a periodic evaluation to tensorboard
+        :param info: [mean episode reward, mean episode length] (evaluate)
+        :param training_dataset: Whether the evaluation used the training
+         dataset
+        :type training_dataset: bool
+        :param global_step: Training timesteps at which the evaluation was
+         started
+        :type global_step: int
+        """
+        if training_dataset is True:
+            dataset, label = "training_dataset", "TRAINING"
+        else:
+            dataset, label = "testing_dataset", "TEST    "
+        self.writer.add_scalar(
+            tag=f"periodic_evals/{dataset}/episode_reward",
+            scalar_value=info[0],
+            global_step=global_step)
+        self.writer.add_scalar(
+            tag=f"periodic_evals/{dataset}/episode_length",
+            scalar_value=info[1],
+            global_step=global_step)
+        if self.verbose:
+            mean_episode_length = np.int32(
+                np.round(np.mean(self.model.trackr.episode_length),0))
+            mean_episode_reward = np.round(
+                np.mean(self.model.trackr.episode_reward),2)
+            print(f" EVALUATION - {label} | {datetime.now().strftime('%Y-%m-%d %H:%M:%S')} | {global_step} | {np.round(info[1],2)}/{mean_episode_length} | {np.round(info[0],2)}/{np.round(mean_episode_reward,2)}/{np.round(self.best_mean_episode_reward,2)}")
+
     def on_training_start(self):
         print("Training started.")
 
@@ -285,6 +353,12 @@ class log_and_eval_callback():
         if self.training_log is not None:
             self.training_log.close()
 
+        # log the periodic evaluations that are still running
+        if self.evaluator is not None:
+            for (global_step, training_dataset), info in self.evaluator.close():
+                self.log_periodic_evaluation(info, training_dataset, global_step)
+            self.evaluator = None
+
         self.final_We = self.model.train_env.get_all_target_params()
 
         # log optimals
@@ -317,6 +391,9 @@ class log_and_eval_callback():
                           model=self.model,
                           global_step=0)
 
+        # persist the remaining evaluation artifacts before training returns
+        self.artifact_writer.close()
+
     def evaluate( self,
                   model: str,
                   tag: str,
@@ -356,21 +433,47 @@ class log_and_eval_callback():
 
         """
 
-        global best_reward
-
         if model is not None:
             self.model.load(model)
 
-        file_best_hpwl_zero_overlap = "best_hpwl_zero_overlap"
-        file_best_hpwl_10_overlap = "best_hpwl_10_overlap"
-        file_best_hpwl_20_overlap = "best_hpwl_20_overlap"
+        params, output_dir, video_tag = self.evaluation_setup(
+            training_dataset=training_dataset,
+            periodic=periodic,
+            long=long)
 
-        best_hpwl = 1E6
-        best_hpwl_at_10_overlap = 1E6
-        best_hpwl_at_20_overlap = 1E6
+        target_params = None
+        if training_dataset is True:
+            target_params = self.model.train_env.get_target_params()
 
+        return evaluate_policy(
+            params=params,
+            policy=self.model.actor if self.rl_model_type == "TD3" else self.model.policy,
+            rl_model_type=self.rl_model_type,
+            output_dir=output_dir,
+            num_evaluations=self.num_evaluations,
+            t=int(self.model.num_timesteps/1000),
+            target_params=target_params,
+            quick_eval=quick_eval,
+            video_tag=video_tag,
+            parameters_text=self.model.train_env.parameters.to_text_string(prefix="\t"),
+            artifacts=self.artifact_writer,
+            log_video=self.log_tracker_video,
+            workers=self.evaluation_workers,
+            verbose=verbose)
+
+    def evaluation_setup(self,
+                         training_dataset: bool = True,
+                         periodic: bool = True,
+                         long: bool = False):
+        """
+        Environment parameters, output directory and tensorboard video tag of
+        an evaluation. See evaluate for the arguments.
+        :return: (params, output_dir, video_tag)
+        :rtype: tuple
+        """
         params = copy.deepcopy(self.model.train_env.get_parameters())
         params.debug = True
+        params.evaluation = True
         params.shuffle_idxs = self.shuffle_evaluation_idxs
         params.seed = 3142
         # Suppress logging of better expert paramater encounters
@@ -383,191 +486,43 @@ class log_and_eval_callback():
 
         if training_dataset is True:
             params.pcb_file = params.training_pcb
+            output_dir = self.video_train_path
             if periodic is True:
                 video_tag = f"periodic_training_evaluations/{self.model.num_timesteps/1000}k"
             else:
                 video_tag = "final_training_evaluation"
         else:
             params.pcb_file = params.evaluation_pcb
+            output_dir = self.video_eval_path
             if periodic is True:
                 video_tag = f"periodic_testing_evaluations/{self.model.num_timesteps/1000}k"
             else:
                 video_tag = "final_testing_evaluation"
 
-        eval_env = environment(params)
-        if training_dataset is True:
-            target_params = self.model.train_env.get_target_params()
-            for item in target_params:
-                for i in range(len(eval_env.agents)):
-                    if item["id"] == eval_env.agents[i].parameters.node.get_id():
-                        eval_env.agents[i].We = item["We"]
-                        eval_env.agents[i].HPWLe = item["HPWLe"]
-
-        total_reward=0
-        total_steps = 0
-        for i in range(self.num_evaluations):
-            if self.verbose > 1:
-                print(f"Starting evaluation {i}/self.num_evaluations with pcb {eval_env.idx}.")
-
-            if training_dataset is True:
-                run_output_dir = self.video_train_path
-            else:
-                run_output_dir = self.video_eval_path
-
-            if periodic is True:
-                run_output_dir = os.path.join(
-                    run_output_dir,
-                    f"{int(self.model.num_timesteps/1000)}k/run_{i}")
-            else:
-                run_output_dir = os.path.join(run_output_dir, f"final/run_{i}")
-
-            if os.path.isdir(run_output_dir) is False:
-                os.makedirs(run_output_dir)
-
-            evaluation_log = open(os.path.join(run_output_dir,"evaluation.log"), "w", encoding="utf-8")
-            evaluation_log.write(f"timestamp={datetime.now().strftime('%Y-%m-%d %H:%M:%S:%f')}\r\n")
-            evaluation_log.write("parameters begin\r\n")
-            evaluation_log.write(self.model.train_env.parameters.to_text_string(prefix="\t"))
-            evaluation_log.write("parameters end\r\n")
-
-            best_hpwl = 1E6
-            best_hpwl_at_10_overlap = 1E6
-            best_hpwl_at_20_overlap = 1E6
-
-            eval_env.reset()
-            done = False
-            episode_steps=0
-            while not done:
-                episode_steps += 1
-                if self.rl_model_type == "TD3":
-                    obs_vec = eval_env.step(model=self.model.actor,
-                                            random=False,
-                                            deterministic=True,
-                                            rl_model_type=self.rl_model_type)
-                else:
-                    obs_vec = eval_env.step(model=self.model.policy,
-                                            random=False,
-                                            deterministic=True,
-                                            rl_model_type=self.rl_model_type)
-                step_reward=0
-
-                if quick_eval is False: # save best layouts, log video
-                    t = int(self.model.num_timesteps/1000)
-                    hpwl = eval_env.calc_hpwl()
-
-                    all_ol = []
-                    for indiv_obs in obs_vec:
-                        next_state_ol = indiv_obs[1][8:16]
-                        ol_ratios = indiv_obs[-1]["ol_ratios"]
-                        all_ol.append(np.sum(np.array(next_state_ol)*np.array(ol_ratios))*100)
-
-                    if (hpwl < best_hpwl) and (np.max(all_ol) < 1):
-                        best_hpwl = hpwl
-                        filename = file_best_hpwl_zero_overlap + f"_{t}k_{i}.{self.num_evaluations-1}.{episode_steps}.pcb"
-                        eval_env.write_current_pcb_file(path=run_output_dir, filename=filename)
-                        evaluation_log.write(f"run={i}/{self.num_evaluations-1} @ episode_step={episode_steps} : Zero overlap best hpwl : hpwl={np.round(hpwl,4)}, overlap={np.round(np.sum(all_ol)/8,4)}\r\n")
-                        evaluation_log.write(f"all_ol={all_ol}\r\n")
-
-                        # Capture snapshot
-                        snapshot_filename=f"{i}.{self.num_evaluations-1}.{episode_steps}"
-                        eval_env.tracker.capture_snapshot(
-                            fileName=os.path.join(run_output_dir,
-                                                  snapshot_filename+".png")
-                                                  )
-                        eval_env.write_current_pcb_file(
-                            path=run_output_dir,
-                            filename= snapshot_filename+".pcb")
-                        # overwrite best; unique filename for easier processing
-                        # with automated tools
-                        eval_env.write_current_pcb_file(
-                            path=run_output_dir,
-                            filename=file_best_hpwl_zero_overlap+".pcb")
-                        if verbose == 1:
-                            print(f"run={i}/{self.num_evaluations-1} @ episode_step={episode_steps} : Zero overlap best hpwl : hpwl={np.round(hpwl,4)}, overlap={np.round(np.sum(all_ol)/8,4)}")
-
-                    if (hpwl < best_hpwl_at_10_overlap ) and (np.max(all_ol) <= 10):
-                        best_hpwl_at_10_overlap = hpwl
-                        filename = file_best_hpwl_10_overlap + f"_{int(t)}k_{i}.{self.num_evaluations-1}.{episode_steps}.pcb"
-                        eval_env.write_current_pcb_file(
-                            path=run_output_dir,
-                            filename=filename)
-                        evaluation_log.write(f"run={i}/{self.num_evaluations-1} @ episode_step={episode_steps} : 10% overlap best hpwl : hpwl={np.round(best_hpwl_at_10_overlap,4)}, overlap={np.round(np.sum(all_ol)/8,4)}\r\n")
-                        evaluation_log.write(f"all_ol={all_ol}\r\n")
-
-                        # Capture snapshot
-                        snapshot_filename=f"{i}.{self.num_evaluations-1}.{episode_steps}"
-                        eval_env.tracker.capture_snapshot(
-                            fileName=os.path.join(run_output_dir,
-                                                  snapshot_filename+".png")
-                                                  )
-                        eval_env.write_current_pcb_file(
-                            path=run_output_dir,
-                            filename= snapshot_filename+".pcb")
-                        # overwrite best; unique filename for easier
-                        # processing with automated tools
-                        eval_env.write_current_pcb_file(
-                            path=run_output_dir,
-                            filename=file_best_hpwl_10_overlap+".pcb")
-                        if verbose == 1:
-                            print(f"run={i}/{self.num_evaluations-1} @ episode_step={episode_steps} : 10% overlap best hpwl : hpwl={np.round(best_hpwl_at_10_overlap,4)}, overlap={np.round(np.sum(all_ol)/8,4)}")
-
-                    if (hpwl < best_hpwl_at_20_overlap) and (np.max(all_ol) <= 20):
-                        best_hpwl_at_20_overlap = hpwl
-                        filename = file_best_hpwl_20_overlap + f"_{int(t)}k_{i}.{self.num_evaluations-1}.{episode_steps}.pcb"
-                        eval_env.write_current_pcb_file(
-                            path=run_output_dir,
-                            filename=filename)
-                        evaluation_log.write(f"run={i}/{self.num_evaluations-1} @ episode_step={episode_steps} : 20% overlap best hpwl : hpwl={np.round(best_hpwl_at_20_overlap,4)}, overlap={np.round(np.sum(all_ol)/8,4)}\r\n")
-                        evaluation_log.write(f"all_ol={all_ol}\r\n")
-
-                        # Capture snapshot
-                        snapshot_filename=f"{i}.{self.num_evaluations-1}.{episode_steps}"
-                        eval_env.tracker.capture_snapshot(
-                            fileName=os.path.join(run_output_dir,
-                                                  snapshot_filename+".png")
-                                                  )
-                        eval_env.write_current_pcb_file(
-                            path=run_output_dir,
-                            filename=snapshot_filename+".pcb")
-                        # overwrite best; unique filename for easier
-                        # processing with automated tools
-                        eval_env.write_current_pcb_file(
-                            path=run_output_dir,
-                            filename=file_best_hpwl_20_overlap+".pcb")
-                        if verbose == 1:
-                            print(f"run={i}/{self.num_evaluations-1} @ episode_step={episode_steps} : 20% overlap best hpwl : hpwl={np.round(best_hpwl_at_20_overlap,4)}, overlap={np.round(np.sum(all_ol)/8,4)}")
-
-                for indiv_obs in obs_vec:
-                    step_reward += indiv_obs[2]
-                    if indiv_obs[4] is True:
-                        done = True
-
-                step_reward /= len(obs_vec)
-                total_reward += step_reward
-                total_steps += 1
-
-            evaluation_log.write(f"eval_env episode {i} performed {episode_steps} in environment.\r\n")
-            if verbose == 1:
-                print(f"eval_env episode {i} performed {episode_steps} in environment.")
-            eval_env.tracker.create_video(
-                fileName=os.path.join(run_output_dir, f"{i}.mp4"),
-                display_metrics=False)
-            vids = eval_env.tracker.video_tensor()
-            self.log_video(vids=vids, tag=video_tag, global_step=i)
-
-            # eval_env.tracker.create_plot(fileName=os.path.join(video_path,
-            #                                                    f'{i}.png'))
-            eval_env.tracker.log_run_to_file(
-                path=run_output_dir, filename=f"{i}.log",
-                kicad_pcb=eval_env.g.get_kicad_pcb_file()
-                )
-
-            eval_env.tracker.reset()
+        if periodic is True:
+            output_dir = os.path.join(
+                output_dir, f"{int(self.model.num_timesteps/1000)}k")
+        else:
+            output_dir = os.path.join(output_dir, "final")
 
-        evaluation_log.close()
+        return params, output_dir, video_tag
 
-        return [total_reward / self.num_evaluations,
-                total_steps / self.num_evaluations]
+    def log_tracker_video(self,
+                          snapshot,
+                          tag:str="evaluation_run",
+                          global_step:int=0):
+        """
+        Builds the video tensor of a tracker snapshot and logs it to
+        tensorboard. Runs on the artifact writer thread.
+        :param snapshot: Tracker snapshot (tracker.snapshot())
+        :param tag: Tensorboard tag, defaults to "evaluation_run"
+        :type tag: str, optional
+        :param global_step: Tensorboard global step number, defaults to 0
+        :type global_step: int, optional
+        """
+        vids = snapshot.video_tensor()
+        if vids is not None:
+            self.log_video(vids=vids, tag=tag, global_step=global_step)
 
     def log_video(self,
                   vids,
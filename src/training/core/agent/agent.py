@@ -1,9 +1,10 @@
-from pcb_vector_utils import compute_sum_of_euclidean_distances_between_pads
+from pcb_vector_utils import compute_sum_of_euclidean_distances_between_pads, build_pad_table, build_dom_table
 import numpy as np
 import gym
 from gym import spaces
 
 from core.agent.observation import get_agent_observation
+from core.agent.observation_cache import observation_cache
 from core.agent.tracker import tracker
 
 from pcbDraw import draw_board_from_board_and_graph_multi_agent
@@ -60,12 +61,90 @@ class agent(gym.Env):
 
         self.penalty_per_remaining_step = 15  # 每剩余步数的惩罚值
 
+        # 预编译的焊盘连接表与距离向量表，邻居或相关边变化时重建
+        self.pad_table = None
+        self.pad_table_key = None
+        self.dom_table = None
+        self.dom_table_key = None
+
+        # 观测缓存，只在当前节点、邻居或视线圆内的节点移动后失效
+        self.obs_cache = None
+        if self.parameters.observation_cache is True:
+            self.obs_cache = observation_cache(self.parameters)
+
+    def get_pad_table(self):
+        """
+        返回当前节点的焊盘连接表（见 pcb_vector_utils.build_pad_table）
+        """
+        key = (id(self.parameters.node), id(self.parameters.neighbors), id(self.parameters.eoi))
+        if self.pad_table is None or self.pad_table_key != key:
+            self.pad_table = build_pad_table(self.parameters.node,
+                                             self.parameters.neighbors,
+                                             self.parameters.eoi)
+            self.pad_table_key = key
+        return self.pad_table
+
+    def get_dom_table(self):
+        """
+        返回当前节点的距离向量表（见 pcb_vector_utils.build_dom_table）
+        """
+        key = (id(self.parameters.node), id(self.parameters.neighbors), id(self.parameters.eoi))
+        if self.dom_table is None or self.dom_table_key != key:
+            self.dom_table = build_dom_table(self.parameters.node,
+                                             self.parameters.neighbors,
+                                             self.parameters.eoi,
+                                             ignore_power=self.parameters.ignore_power_nets)
+            self.dom_table_key = key
+        return self.dom_table
+
+    def calc_hpwl(self):
+        """
+        当前节点所有相关网络的 HPWL 之和
+        """
+        if self.parameters.hpwl_cache is not None:
+            return self.parameters.hpwl_cache.nets_hpwl(self.parameters.nets)
+
+        hpwl = 0
+        for net_id in self.parameters.nets:
+            hpwl += self.parameters.graph.calc_hpwl_of_net(net_id, True)
+        return hpwl
+
+    def placement_is_legal(self):
+        """
+        当前布局是否合法（组件之间没有重叠且都在板内）
+
+        legality_engine="geometric" 时查询环境共享的外形索引
+        (core.environment.footprints)，索引随节点移动增量维护；否则绘制整板
+        平面，要求叠加后每个像素最多被两个平面（边框或组件）覆盖。
+        """
+        if self.parameters.legality_engine == "geometric":
+            if self.parameters.footprints is None:
+                raise ValueError("legality_engine=\"geometric\" requires a footprint index.")
+            return self.parameters.footprints.is_legal()
+
+        stack = draw_board_from_board_and_graph_multi_agent(
+            self.parameters.board,
+            self.parameters.graph,
+            node_id=self.parameters.node.get_id(),
+            padding=4,
+            resolution=self.parameters.resolution)
+
+        # 计算重叠堆叠
+        stack_sum = np.zeros((stack[0].shape[0],stack[0].shape[1]), dtype=np.int64)
+        for i in range(len(stack)):
+            stack_sum += stack[i]
+
+        # 检查重叠是否合法（最大堆叠值不超过128）
+        return np.max(stack_sum) <= 128
+
     def reset(self):
         """
         重置智能体状态，开始新的训练回合
         """
         self.tracker.reset()
         self.steps_done = 0
+        if self.obs_cache is not None:
+            self.obs_cache.invalidate()
 
         # 重置历史记录列表
         self.W = []          # 线长历史
@@ -79,10 +158,9 @@ class agent(gym.Env):
             self.parameters.node,
             self.parameters.neighbors,
             self.parameters.eoi,
-            ignore_power=self.parameters.ignore_power)
-        self.HPWLi = 0
-        for net_id in self.parameters.nets:
-            self.HPWLi += self.parameters.graph.calc_hpwl_of_net(net_id, True)
+            ignore_power=self.parameters.ignore_power,
+            pad_table=self.get_pad_table())
+        self.HPWLi = self.calc_hpwl()
         self.current_HPWL = self.HPWLe
 
         # 重置归一化指标列表
@@ -90,30 +168,56 @@ class agent(gym.Env):
         self.all_hpwl = []
         self.all_weighted_cost = []
 
-    def step(self, model, random:bool=False, deterministic:bool=False, rl_model_type:str="TD3"):
+    def get_observation(self, use_cache=True):
         """
-        执行一步动作，更新智能体状态
-        
+        计算当前观测并写入观测缓存
+
+        Args:
+            use_cache: 缓存仍然有效时是否直接返回缓存的观测
+        """
+        if use_cache is True and self.obs_cache is not None:
+            state = self.obs_cache.get()
+            if state is not None:
+                self.parameters.profiler.count("observation/cache_hit")
+                return state
+
+        with self.parameters.profiler.timer("observation/total"):
+            state = get_agent_observation(parameters=self.parameters, dom_table=self.get_dom_table())
+        if self.obs_cache is not None:
+            self.obs_cache.store(state)
+        return state
+
+    def observe(self):
+        """
+        获取当前状态观察
+
+        Returns:
+            state: 状态字典
+            _state: 状态向量
+        """
+        state = self.get_observation()
+        # 将状态字典转换为向量形式
+        _state = list(state["los"]) + list(state["ol"]) + state["dom"] + state["euc_dist"] + state["position"] + state["ortientation"] + list(state["boardmask"])
+        return state, _state
+
+    def choose_action(self, model, _state, random:bool=False, deterministic:bool=False, rl_model_type:str="TD3", policy_action=None):
+        """
+        选择动作
+
         Args:
             model: 强化学习模型
+            _state: 状态向量
             random: 是否随机选择动作
             deterministic: 是否确定性选择动作
             rl_model_type: 强化学习算法类型（TD3或SAC）
-            
+            policy_action: 批量推理得到的策略输出（见 environment.step），
+                None 表示由 model 对单个状态进行推理
+
         Returns:
-            state: 当前状态
-            next_state: 下一状态
-            reward: 奖励值
             action: 执行的动作
-            done: 是否结束
+            model_action: 策略空间中的动作（TD3），其他情况为 None
         """
-        self.steps_done += 1
-        
-        # 获取当前状态观察
-        state = get_agent_observation(parameters=self.parameters)
-        # 将状态字典转换为向量形式
-        _state = list(state["los"]) + list(state["ol"]) + state["dom"] + state["euc_dist"] + state["position"] + state["ortientation"] + list(state["boardmask"])
-
+        model_action = None
         if random is True:
             # 随机动作选择
             action = self.action_space.sample()
@@ -125,11 +229,14 @@ class agent(gym.Env):
         else:
             if rl_model_type == "TD3":
                 # TD3算法动作选择
+                if policy_action is None:
+                    with self.parameters.profiler.timer("policy/inference"):
+                        policy_action = model.select_action(np.array(_state))
                 if deterministic is True:
-                    model_action = model.select_action(np.array(_state))
+                    model_action = policy_action
                 else:
                     # 添加探索噪声
-                    model_action = (model.select_action(np.array(_state)) + 
+                    model_action = (policy_action + 
                                   np.random.normal(0, self.parameters.max_action * self.parameters.expl_noise, size=3)).clip(-self.parameters.max_action, self.parameters.max_action)
                 
                 # 动作转换和归一化
@@ -138,9 +245,22 @@ class agent(gym.Env):
                 action[1] *= (2 * np.pi)   # 角度范围调整
 
             else:  # SAC算法
-                action = model.select_action(np.array(_state), evaluate=deterministic)
+                if policy_action is None:
+                    with self.parameters.profiler.timer("policy/inference"):
+                        policy_action = model.select_action(np.array(_state), evaluate=deterministic)
+                action = policy_action
+
+        return action, model_action
+
+    def apply_action(self, state, action, model_action=None, rl_model_type:str="TD3"):
+        """
+        执行动作：更新组件位置和方向，获取下一状态并计算奖励
+
+        Returns:
+            与 step 相同
+        """
+        self.steps_done += 1
 
-        # 执行动作：更新组件位置和方向
         pos = self.parameters.node.get_pos()
         step_scale = (self.parameters.step_size * action[0])  # 计算步长
         x_offset = step_scale * np.cos(-action[1])           # X方向偏移
@@ -150,10 +270,12 @@ class agent(gym.Env):
         # 设置新的位置和方向
         self.parameters.node.set_pos(tuple([pos[0] + x_offset, pos[1] + y_offset]))
         self.parameters.node.set_orientation(angle)
+        self.node_moved()
 
         # 获取下一状态并计算奖励
-        next_state = get_agent_observation(parameters=self.parameters)
-        reward, done = self.get_reward(next_state)
+        next_state = self.get_observation(use_cache=False)
+        with self.parameters.profiler.timer("reward/total"):
+            reward, done = self.get_reward(next_state)
 
         # 根据算法类型返回不同的动作信息
         if rl_model_type == "TD3":
@@ -161,6 +283,32 @@ class agent(gym.Env):
         else:
             return state, next_state, reward, action, done
 
+    def step(self, model, random:bool=False, deterministic:bool=False, rl_model_type:str="TD3"):
+        """
+        执行一步动作，更新智能体状态
+        
+        Args:
+            model: 强化学习模型
+            random: 是否随机选择动作
+            deterministic: 是否确定性选择动作
+            rl_model_type: 强化学习算法类型（TD3或SAC）
+            
+        Returns:
+            state: 当前状态
+            next_state: 下一状态
+            reward: 奖励值
+            action: 执行的动作
+            done: 是否结束
+        """
+        # 获取当前状态观察
+        state, _state = self.observe()
+        action, model_action = self.choose_action(model,
+                                                  _state,
+                                                  random=random,
+                                                  deterministic=deterministic,
+                                                  rl_model_type=rl_model_type)
+        return self.apply_action(state, action, model_action, rl_model_type=rl_model_type)
+
     def get_reward(self, observation):
         """
         计算奖励值和终止条件
@@ -174,17 +322,20 @@ class agent(gym.Env):
         """
         done = False
         
+        prof = self.parameters.profiler
+
         # 计算当前线长
-        self.W.append(compute_sum_of_euclidean_distances_between_pads(
-            self.parameters.node,
-            self.parameters.neighbors,
-            self.parameters.eoi,
-            ignore_power=self.parameters.ignore_power))
+        with prof.timer("reward/W"):
+            self.W.append(compute_sum_of_euclidean_distances_between_pads(
+                self.parameters.node,
+                self.parameters.neighbors,
+                self.parameters.eoi,
+                ignore_power=self.parameters.ignore_power,
+                pad_table=self.get_pad_table()))
 
         # 计算当前HPWL
-        hpwl = 0
-        for net_id in self.parameters.nets:
-            hpwl += self.parameters.graph.calc_hpwl_of_net(net_id, True)
+        with prof.timer("reward/HPWL"):
+            hpwl = self.calc_hpwl()
         self.HPWL.append(hpwl)
 
         # 计算重叠度惩罚项
@@ -210,20 +361,12 @@ class agent(gym.Env):
 
         # 更新最优HPWL记录
         if self.HPWL[-1] < self.HPWLe:
-            # 绘制板布局并检查重叠
-            stack = draw_board_from_board_and_graph_multi_agent(
-                self.parameters.board,
-                self.parameters.graph,
-                node_id=self.parameters.node.get_id(),
-                padding=4)
-
-            # 计算重叠堆叠
-            stack_sum = np.zeros((stack[0].shape[0],stack[0].shape[1]), dtype=np.int)
-            for i in range(len(stack)):
-                stack_sum += stack[i]
-
-            # 检查重叠是否合法（最大堆叠值不超过128）
-            if np.max(stack_sum) <= 128:
+            # 检查布局是否合法，计时器按检查引擎区分：
+            # reward/legality_raster 或 reward/legality_geometric
+            with prof.timer("reward/legality_" + self.parameters.legality_engine):
+                legal = self.placement_is_legal()
+
+            if legal:
                 if self.parameters.log_file is not None:
                     f = open(self.parameters.log_file, "a", encoding="utf-8")
                     f.write(f"{datetime.datetime.now().strftime('%Y%m%dT%H%M%S.%f')[:-3]} Agent {self.parameters.node.get_name()} ({self.parameters.node.get_id()}) found a better, legal, HPWL target of {np.round(self.HPWL[-1],6)}, originally {np.round(self.HPWLe,6)}.\r\n")
@@ -284,6 +427,14 @@ class agent(gym.Env):
         
         self.parameters.node.set_pos(scaled_r_pos)
         self.parameters.node.set_orientation(scaled_orientation)
+        self.node_moved()
+
+    def node_moved(self):
+        """
+        在 node.set_pos / set_orientation 之后更新环境共享的外形索引
+        """
+        if self.parameters.footprints is not None:
+            self.parameters.footprints.update_node(self.parameters.node)
 
     def get_observation_space_shape(self):
         """
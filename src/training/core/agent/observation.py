@@ -1,6 +1,7 @@
-from pcbDraw import draw_los, draw_board_from_graph_multi_agent, draw_ratsnest, get_los_and_ol_multi_agent
+from pcbDraw import draw_los, draw_board_from_graph_multi_agent, draw_ratsnest, get_los_and_ol_multi_agent, get_los_window
 from pcb_vector_utils import compute_pad_referenced_distance_vectors_v2, compute_vector_to_group_midpoint
 from pcb_vector_utils import wrap_angle
+from pcb_geometry import get_los_and_ol_analytic
 import numpy as np
 
 def line_of_sight_and_overlap_v0(parameters, comp_grids):
@@ -35,7 +36,8 @@ def line_of_sight_and_overlap_v0(parameters, comp_grids):
                                         angle_offset=current_orientation,
                                         bx=parameters.board_width,
                                         by=parameters.board_height,
-                                        padding=parameters.padding)
+                                        padding=parameters.padding,
+                                        resolution=parameters.resolution)
 
     # 计算8个方向的视线值
     for i in range(8):
@@ -50,62 +52,128 @@ def line_of_sight_and_overlap_v0(parameters, comp_grids):
 
     return los_grids, los, ol_grids, ol
 
-def get_agent_observation(parameters, tracker=None):
+def get_agent_observation(parameters, tracker=None, dom_table=None):
     """
     获取智能体的观察状态
     
     Args:
         parameters: 智能体参数
         tracker: 跟踪器对象（可选）
+        dom_table: 预编译的距离向量表（可选，见 pcb_vector_utils.build_dom_table）
         
     Returns:
         包含各种观察信息的字典
     """
+    prof = parameters.profiler  # 各阶段耗时统计 (core.profiler)
     node_id = parameters.node.get_id()
-    
-    # 从节点绘制组件网格
-    comp_grids = draw_board_from_graph_multi_agent(g=parameters.graph,
-                                                   node_id=node_id,
-                                                   bx=parameters.board_width,
-                                                   by=parameters.board_height,
-                                                   padding=parameters.padding)
-
-    # 获取视线、重叠度和板边界掩码
-    los, ol, _, ol_grids, boardmask = get_los_and_ol_multi_agent(
-        node=parameters.node,
-        board=parameters.board,
-        radius=np.max(parameters.node.get_size())*1.5,  # 视线半径
-        grid_comps=comp_grids,
-        padding=parameters.padding)  # 新增异形边界二值获取
-
-    # 计算重叠比例
-    ol_ratios = []
-    total = np.sum(ol_grids)/64
-    
-    # 添加安全检查以避免除0错误
-    if total == 0:
-        # 当total为0时，所有ol_ratios设为0（表示没有重叠）
-        ol_ratios = [0.0] * len(ol_grids)
+    radius = np.max(parameters.node.get_size())*1.5  # 视线半径
+    index = parameters.footprints if parameters.spatial_index else None  # 环境共享的外形索引，None 表示遍历全部节点
+
+    if parameters.los_engine == "analytic":
+        # 几何解析引擎：直接由节点中心、尺寸和方向计算扇区与矩形的相交面积
+        comp_grids = None
+        if index is not None:
+            # 只有包围盒与视线圆包围盒相交的组件可能影响特征
+            pos = parameters.node.get_pos()
+            other_nodes = index.nodes_near(pos[0], pos[1], radius, exclude=node_id)
+        else:
+            other_nodes = [n for n in parameters.graph.get_nodes() if n.get_id() != node_id]
+        with prof.timer("observation/los_ol_boardmask"):
+            los, ol, ol_areas, boardmask = get_los_and_ol_analytic(
+                node=parameters.node,
+                other_nodes=other_nodes,
+                board_width=parameters.board_width,
+                board_height=parameters.board_height,
+                radius=radius,
+                padding=parameters.padding)
+
+        total = np.sum(ol_areas)
+        if total == 0:
+            ol_ratios = [0.0] * len(ol_areas)
+        else:
+            ol_ratios = list(ol_areas / total)
     else:
-        for grid in ol_grids:
-            ol_ratios.append((np.sum(grid) / 64) / total)
+        # 从节点绘制组件网格
+        with prof.timer("observation/draw"):
+            if parameters.occupancy is not None:
+                # 增量占用栅格：只重绘自上次观测以来移动过的节点
+                if index is not None:
+                    parameters.occupancy.sync_index(index)
+                else:
+                    parameters.occupancy.sync(parameters.graph.get_nodes())
+                # 只生成视线圆包围盒内的平面
+                window = get_los_window(node=parameters.node,
+                                        board=parameters.board,
+                                        radius=radius,
+                                        padding=parameters.padding,
+                                        resolution=parameters.resolution)
+                comp_grids = parameters.occupancy.comp_grids(node_id, window=window)
+            else:
+                nodes = None
+                if index is not None:
+                    # 视线圆以外的组件不影响裁剪后的平面，只绘制附近的组件
+                    pos = parameters.node.get_pos()
+                    nodes = index.nodes_near(pos[0], pos[1],
+                                             radius + 4*parameters.resolution)
+                comp_grids = draw_board_from_graph_multi_agent(g=parameters.graph,
+                                                               node_id=node_id,
+                                                               bx=parameters.board_width,
+                                                               by=parameters.board_height,
+                                                               padding=parameters.padding,
+                                                               resolution=parameters.resolution,
+                                                               nodes=nodes)
+
+        # 获取视线、重叠度和板边界掩码
+        with prof.timer("observation/los_ol_boardmask"):
+            los, ol, _, ol_grids, boardmask = get_los_and_ol_multi_agent(
+                node=parameters.node,
+                board=parameters.board,
+                radius=radius,
+                grid_comps=comp_grids,
+                padding=parameters.padding,
+                resolution=parameters.resolution)  # 新增异形边界二值获取
+
+        # 计算重叠比例
+        ol_ratios = []
+        total = np.sum(ol_grids)/64
+
+        # 添加安全检查以避免除0错误
+        if total == 0:
+            # 当total为0时，所有ol_ratios设为0（表示没有重叠）
+            ol_ratios = [0.0] * len(ol_grids)
+        else:
+            for grid in ol_grids:
+                ol_ratios.append((np.sum(grid) / 64) / total)
 
     # 计算距离向量（DOM - Direction of Movement）
-    dom, _, _ = compute_pad_referenced_distance_vectors_v2(
-        parameters.node,
-        parameters.neighbors,
-        parameters.eoi,
-        ignore_power=parameters.ignore_power_nets
-        )
+    with prof.timer("observation/dom"):
+        dom, _, _ = compute_pad_referenced_distance_vectors_v2(
+            parameters.node,
+            parameters.neighbors,
+            parameters.eoi,
+            ignore_power=parameters.ignore_power_nets,
+            dom_table=dom_table,
+            return_vectors=False
+            )
 
-    # 计算到组中心的向量
-    _, eucledian_dist, angle = compute_vector_to_group_midpoint(
-        parameters.node,
-        parameters.neighbors
-    )
+        # 计算到组中心的向量
+        _, eucledian_dist, angle = compute_vector_to_group_midpoint(
+            parameters.node,
+            parameters.neighbors
+        )
 
     # 如果提供了跟踪器，记录观察信息
     if tracker is not None:
+        if parameters.occupancy is not None:
+            # 跟踪器需要整板平面
+            comp_grids = parameters.occupancy.comp_grids(node_id)
+        elif comp_grids is None or index is not None:
+            comp_grids = draw_board_from_graph_multi_agent(g=parameters.graph,
+                                                           node_id=node_id,
+                                                           bx=parameters.board_width,
+                                                           by=parameters.board_height,
+                                                           padding=parameters.padding,
+                                                           resolution=parameters.resolution)
         tracker.add_observation(comp_grids=comp_grids)
         tracker.add_ratsnest(
             draw_ratsnest(parameters.node,
@@ -114,7 +182,8 @@ def get_agent_observation(parameters, tracker=None):
                           parameters.board_width,
                           parameters.board_height,
                           padding=parameters.padding,
-                          ignore_power=parameters.ignore_power_nets)
+                          ignore_power=parameters.ignore_power_nets,
+                          resolution=parameters.resolution)
                           )
 
     # 构建信息字典
@@ -0,0 +1,158 @@
+"""
+每个智能体持有的观测缓存。
+
+agent.step 每一步开始时都会重新计算 get_agent_observation，而上一步结束时
+已经为同一智能体计算过 next_state；两者的差别只来自期间其他智能体的移动。
+观测只依赖于：
+    - 当前节点自身的位置、尺寸和方向
+    - 视线圆 (半径 = 1.5 * 节点最大尺寸) 内的其他组件 (los / ol / boardmask)
+    - 邻居节点 (dom / euc_dist)
+因此缓存记录计算观测时所有节点的位姿；只有当前节点、邻居，或移动前后
+可能与视线圆相交的节点发生变化时才失效，否则直接返回缓存的观测。
+
+有环境共享的外形索引 (core.environment.footprints) 时，缓存只记录计算观测时
+视线圆附近的节点，并通过索引的变更日志找出此后移动过的节点，开销随移动
+的节点数而非组件总数增长。
+"""
+import numpy as np
+
+
+class observation_cache():
+    """
+    智能体级别的观测缓存
+    """
+
+    def __init__(self, parameters, margin_px=4):
+        """
+        Args:
+            parameters: 智能体参数 (core.agent.parameters)
+            margin_px: 相交判断的额外余量 (像素)，覆盖栅格化的取整误差
+        """
+        self.parameters = parameters
+        self.margin = margin_px * parameters.resolution
+        self.invalidate()
+
+    def invalidate(self):
+        """
+        清空缓存
+        """
+        self.observation = None
+        self.key = None
+        self.ids = None
+        self.poses = None
+        self.version = None     # 外形索引的版本
+        self.near = None        # 计算观测时视线圆附近的节点 id
+
+    def _key(self):
+        p = self.parameters
+        return (id(p.graph), id(p.node), id(p.neighbors), id(p.eoi), id(p.footprints))
+
+    def _index(self):
+        p = self.parameters
+        return p.footprints if p.spatial_index else None
+
+    def _reach(self):
+        size = self.parameters.node.get_size()
+        return max(size[0], size[1]) * 1.5 + self.margin
+
+    def _near(self, index):
+        pos = self.parameters.node.get_pos()
+        return set(n.get_id() for n in index.nodes_near(pos[0], pos[1], self._reach()))
+
+    def _snapshot(self):
+        ids = []
+        poses = []
+        for n in self.parameters.graph.get_nodes():
+            pos = n.get_pos()
+            size = n.get_size()
+            ids.append(n.get_id())
+            poses.append((float(pos[0]), float(pos[1]),
+                          float(size[0]), float(size[1]),
+                          float(n.get_orientation())))
+        return ids, np.array(poses, dtype=np.float64).reshape(-1, 5)
+
+    def store(self, observation):
+        """
+        记录观测以及计算时所有节点的位姿
+        """
+        self.observation = observation
+        self.key = self._key()
+        index = self._index()
+        if index is not None:
+            self.version = index.version
+            self.near = self._near(index)
+        else:
+            self.ids, self.poses = self._snapshot()
+
+    def get(self):
+        """
+        返回仍然有效的缓存观测；缓存失效时返回 None
+        """
+        if self.observation is None:
+            return None
+
+        # 节点、邻居或相关边被替换（见 environment.initialize_environment_state_from_pcb）
+        if self.key != self._key():
+            self.invalidate()
+            return None
+
+        index = self._index()
+        if index is not None:
+            return self._get_indexed(index)
+
+        ids, poses = self._snapshot()
+        if ids != self.ids:
+            self.invalidate()
+            return None
+
+        changed = np.flatnonzero(np.any(poses != self.poses, axis=1))
+        if len(changed) == 0:
+            return self.observation
+
+        node_id = self.parameters.node.get_id()
+        dependencies = set(n.get_id() for n in self.parameters.neighbors)
+        dependencies.add(node_id)
+        for k in changed:
+            if ids[k] in dependencies:
+                self.invalidate()
+                return None
+
+        # 其他节点：移动前或移动后与视线圆相交时失效
+        own = self.poses[ids.index(node_id)]
+        radius = max(own[2], own[3]) * 1.5 + self.margin
+        for pose in (self.poses[changed], poses[changed]):
+            reach = radius + 0.5 * np.hypot(pose[:, 2], pose[:, 3])
+            dist = np.hypot(pose[:, 0] - own[0], pose[:, 1] - own[1])
+            if np.any(dist <= reach):
+                self.invalidate()
+                return None
+
+        # 只有视线圆以外的节点移动过，缓存仍然有效
+        self.poses = poses
+        return self.observation
+
+    def _get_indexed(self, index):
+        changed = index.changed_since(self.version)
+        if changed is None:
+            self.invalidate()
+            return None
+        if len(changed) == 0:
+            return self.observation
+
+        dependencies = set(n.get_id() for n in self.parameters.neighbors)
+        dependencies.add(self.parameters.node.get_id())
+        # 移动前在视线圆附近（near）或移动后进入视线圆附近的节点使缓存失效
+        near_now = None
+        for node_id in changed:
+            if node_id in dependencies or node_id in self.near:
+                self.invalidate()
+                return None
+            if near_now is None:
+                near_now = self._near(index)
+            if node_id in near_now:
+                self.invalidate()
+                return None
+
+        # 只有视线圆以外的节点移动过，缓存仍然有效
+        self.version = index.version
+        return self.observation
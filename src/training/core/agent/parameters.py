@@ -1,3 +1,7 @@
+from core.profiler import profiler
+from pcbDraw import pcbDraw_resolution
+
+
 # 解析与智能体相关的参数，不改变命令行参数解析
 class parameters:
     """
@@ -59,6 +63,29 @@ class parameters:
         self.ignore_power = pcb_params["ignore_power"]      # 是否忽略电源
         self.log_file = pcb_params["log_file"]              # 日志文件路径
 
+        # 环境共享的增量占用栅格，None 表示每次观测重新绘制整板
+        self.occupancy = pcb_params.get("occupancy", None)
+        # 视线/重叠特征的计算引擎："raster"（栅格）或 "analytic"（几何解析）
+        self.los_engine = pcb_params.get("los_engine", "raster")
+        # 环境共享的增量 HPWL 缓存，None 表示每步调用 graph.calc_hpwl_of_net
+        self.hpwl_cache = pcb_params.get("hpwl_cache", None)
+        # 环境共享的组件外形空间索引，None 表示遍历全部节点
+        self.footprints = pcb_params.get("footprints", None)
+        # 观测与观测缓存是否只查询索引中视线圆附近的组件
+        self.spatial_index = pcb_params.get("spatial_index", self.footprints is not None)
+        # 布局合法性检查："geometric"（外形索引 + 分离轴）或 "raster"（整板平面叠加）
+        self.legality_engine = pcb_params.get("legality_engine", "raster")
+        # 是否缓存观测，只在相关节点移动后重新计算
+        self.observation_cache = pcb_params.get("observation_cache", True)
+        # 环境共享的性能剖析器，None 表示不记录
+        self.profiler = pcb_params.get("profiler", None)
+        if self.profiler is None:
+            self.profiler = profiler(enabled=False)
+        # 观测与奖励栅格的分辨率 (mm/像素)，由环境按板选择；未提供时使用 pcbDraw 默认分辨率
+        self.resolution = pcb_params.get("resolution", None)
+        if self.resolution is None:
+            self.resolution = pcbDraw_resolution()
+
     def write_to_file(self, fileName, append=True):
         """
         将参数写入文件（当前未实现）
@@ -91,7 +118,7 @@ class parameters:
         
         # 跳过复杂对象，只显示基本参数
         for key, value in params.items():
-            if key in ("board", "graph", "node", "neighbors", "eoi", "edge"):
+            if key in ("board", "graph", "node", "neighbors", "eoi", "edge", "occupancy", "hpwl_cache", "footprints"):
                 continue
             s += f"{key} -> {value}<br>"
         s += "<br>"
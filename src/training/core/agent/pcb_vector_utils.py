@@ -357,7 +357,9 @@ def deg2rad(theta):
 def rad2deg(theta):
     return (theta * 360) / (2 * np.pi)
 
-def get_los_feature_vector(n, nn, eoi, b, clamp_at_zero=True, padding=None):
+def get_los_feature_vector(n, nn, eoi, b, clamp_at_zero=True, padding=None,
+                           resolution=None):
+    res = pcbDraw_resolution() if resolution is None else resolution
     current_node_size = n.get_size()
     current_node_position = n.get_pos()
     current_node_orientation = n.get_orientation()
@@ -368,22 +370,24 @@ def get_los_feature_vector(n, nn, eoi, b, clamp_at_zero=True, padding=None):
                                          current_node_orientation,
                                          bx=b.get_width(),
                                          by=b.get_height(),
-                                         padding=padding)
+                                         padding=padding,
+                                         resolution=res)
 
     grid_comps = draw_comps_from_nodes_and_edges(n,
                                                  nn,
                                                  eoi,
                                                  b,
-                                                 padding=padding)
+                                                 padding=padding,
+                                                 resolution=res)
 
     scaled_current_node_pos = [0,0]
-    scaled_current_node_pos[0] = int(current_node_position[0]/pcbDraw_resolution()) + int(3/pcbDraw_resolution())  # centre is offset for padding
-    scaled_current_node_pos[1] = int(current_node_position[1]/pcbDraw_resolution()) + int(3/pcbDraw_resolution())  # centre is offset for padding
+    scaled_current_node_pos[0] = int(current_node_position[0]/res) + int(3/res)  # centre is offset for padding
+    scaled_current_node_pos[1] = int(current_node_position[1]/res) + int(3/res)  # centre is offset for padding
 
     los_feature = []
     box_edge_coords = []
     intersection_point_coords = []
-    los_radius = int( (np.max(current_node_size)*2) / pcbDraw_resolution())
+    los_radius = int( (np.max(current_node_size)*2) / res)
     for i in range(8):
         # The center point of the current node must factor in the padding of
         # the grid!
@@ -400,7 +404,7 @@ def get_los_feature_vector(n, nn, eoi, b, clamp_at_zero=True, padding=None):
             if d == 0:
                 angle = current_node_orientation
                 d = 1E-3
-                m = np.sqrt(np.square(current_node_size[0]/2)+np.square(current_node_size[1]/2)) / pcbDraw_resolution()
+                m = np.sqrt(np.square(current_node_size[0]/2)+np.square(current_node_size[1]/2)) / res
                 # component center as edge coord
                 box_edge_coords.append(
                     (scaled_current_node_pos[0], scaled_current_node_pos[1]))
@@ -414,9 +418,9 @@ def get_los_feature_vector(n, nn, eoi, b, clamp_at_zero=True, padding=None):
                 angle = 2 * np.pi - angle
 
                 x = np.int0(
-                    np.ceil(current_node_size[0] / pcbDraw_resolution()))
+                    np.ceil(current_node_size[0] / res))
                 y = np.int0(
-                    np.ceil(current_node_size[1] / pcbDraw_resolution()))
+                    np.ceil(current_node_size[1] / res))
                 m = distance_from_rectangle_center_to_edge(
                     (x,y),
                     angle-deg2rad(current_node_orientation),
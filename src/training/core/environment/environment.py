@@ -6,7 +6,12 @@ from graph import graph
 from core.agent.agent import agent as agent
 from core.agent.parameters import parameters as agent_parameters
 from core.environment.tracker import tracker
-from pcbDraw import draw_board_from_board_and_graph_with_debug, draw_ratsnest_with_board
+from core.environment.occupancy import occupancy_grid
+from core.environment.hpwl import hpwl_cache
+from core.environment.footprints import footprint_index
+from pcb_board import board_outline_polygon
+from core.profiler import profiler
+from pcbDraw import draw_board_from_board_and_graph_with_debug, draw_ratsnest_with_board, auto_resolution
 import numpy as np
 import random as random_package
 
@@ -36,10 +41,13 @@ class environment:
             sys.exit()
 
         self.rng = np.random.default_rng(seed=self.parameters.seed)  # 随机数生成器
+        # 各阶段耗时统计，由本环境的所有智能体与学习器共享
+        self.profiler = profiler(enabled=self.parameters.profile)
         
         # 初始化环境状态，从PCB文件加载
         self.initialize_environment_state_from_pcb(init=True, idx=self.parameters.idx)
-        self.tracker = tracker()  # 环境跟踪器
+        self.tracker = tracker(frame_size=self.parameters.frame_size,
+                               compress_frames=self.parameters.compress_frames)  # 环境跟踪器
 
         # 数据增强器配置
         if self.parameters.use_dataAugmenter is True:
@@ -68,6 +76,66 @@ class environment:
 
         self.padding = 4  # 绘制时的填充值
 
+        # 调试渲染状态
+        self.render_steps = 0       # 本回合的步数，用于 render="every_n"
+        self.record_video = False   # 调用方将写出视频时置为 True，用于 render="video"
+
+    def should_render(self):
+        """
+        根据渲染策略判断当前步是否绘制调试帧
+
+        parameters.render:
+            "always"  - 每一步都绘制（原调试行为）
+            "never"   - 从不绘制
+            "every_n" - 每 parameters.render_every 步绘制一次
+            "eval"    - 只在评估环境中绘制 (parameters.evaluation)
+            "video"   - 只在调用方将写出视频时绘制 (self.record_video)
+        """
+        if self.parameters.debug is not True:
+            return False
+
+        render = self.parameters.render
+        if render == "always":
+            return True
+        if render == "every_n":
+            return self.render_steps % self.parameters.render_every == 0
+        if render == "eval":
+            return self.parameters.evaluation is True
+        if render == "video":
+            return self.record_video is True
+        return False
+
+    def render(self):
+        """
+        以 parameters.render_scale 缩放后的分辨率绘制组件网格和飞线图，
+        并添加到跟踪器
+        """
+        resolution = self.resolution / self.parameters.render_scale
+
+        # 绘制组件网格
+        comp_grids = draw_board_from_board_and_graph_with_debug(
+            self.b, self.g, padding=self.padding, resolution=resolution)
+
+        # 绘制飞线图，使用np.maximum叠加所有智能体的飞线
+        ratsnest = None
+        for i in range(len(self.agents)):
+            grid = draw_ratsnest_with_board(
+                self.agents[i].parameters.node,      # 当前智能体对应的组件节点
+                self.agents[i].parameters.neighbors, # 邻居组件列表
+                self.agents[i].parameters.eoi,       # 相关边列表（Edges of Interest）
+                self.b,                              # PCB板对象
+                line_thickness=1,                    # 飞线线条粗细
+                padding=self.padding,                # 绘制填充值
+                ignore_power=True,                   # 忽略电源网络
+                resolution=resolution)
+            if ratsnest is None:
+                ratsnest = grid
+            else:
+                np.maximum(ratsnest, grid, out=ratsnest)
+
+        # 将组件网格和飞线图添加到跟踪器，用于后续的可视化和分析
+        self.tracker.add(comp_grids=comp_grids, ratsnest=ratsnest)
+
     def reset(self):
         """
         重置环境状态，开始新的训练回合
@@ -100,38 +168,18 @@ class environment:
         for i in range(len(self.agents)):
             self.agents[i].init_random()
 
+        # 数据增强会移动全部节点，与外形索引完整同步一次
+        if self.footprints is not None:
+            self.footprints.sync(self.g.get_nodes())
+
         # 重置所有智能体状态
         for i in range(len(self.agents)):
             self.agents[i].reset()
 
-        # 调试模式下的可视化
-        if self.parameters.debug:
-            # 绘制组件网格
-            comp_grids = draw_board_from_board_and_graph_with_debug(
-                self.b, self.g, padding=self.padding)
-            
-            # 绘制飞线图
-            for i in range(len(self.agents)):
-                if i == 0:
-                    ratsnest = draw_ratsnest_with_board(
-                        self.agents[i].parameters.node,
-                        self.agents[i].parameters.neighbors,
-                        self.agents[i].parameters.eoi,
-                        self.b,
-                        line_thickness=1,
-                        padding=self.padding,
-                        ignore_power=True)
-                else:
-                    ratsnest = np.maximum(ratsnest, draw_ratsnest_with_board(
-                        self.agents[i].parameters.node,
-                        self.agents[i].parameters.neighbors,
-                        self.agents[i].parameters.eoi,
-                        self.b,
-                        line_thickness=1,
-                        padding=self.padding,
-                        ignore_power=True))
-
-            self.tracker.add(comp_grids=comp_grids, ratsnest=ratsnest)
+        # 调试模式下的可视化（按渲染策略决定是否绘制）
+        self.render_steps = 0
+        if self.should_render():
+            self.render()
 
     def step(self, model, random=False, deterministic:bool=False, rl_model_type:str="SAC"):
         """
@@ -154,6 +202,7 @@ class environment:
         Note:
             - 该方法采用"一票否决"机制，任何智能体终止都会结束当前步进
             - 支持智能体执行顺序的随机化，增加训练多样性
+            - parameters.batched_inference=True 时对所有智能体做一次批量策略推理
             - 提供完整的性能指标记录和可视化支持
         """
         # 初始化数据收集容器
@@ -170,17 +219,44 @@ class environment:
         if self.parameters.shuffle_idxs is True:
             random_package.shuffle(idxs)
 
+        # 批量推理模式：先收集所有智能体的观察，再对策略网络做一次批量前向，
+        # 最后按顺序执行动作。所有智能体的观察都取自本步开始时的布局，
+        # 不再反映同一步中先执行的智能体的移动。
+        batched = (self.parameters.batched_inference is True) and (random is False)
+        if batched:
+            observed = [self.agents[i].observe() for i in idxs]
+            states = np.array([o[1] for o in observed])
+            with self.profiler.timer("policy/inference"):
+                if rl_model_type == "TD3":
+                    policy_actions = model.select_actions(states)
+                else:
+                    policy_actions = model.select_actions(states, evaluate=deterministic)
+
         # 主循环：让每个智能体执行一步动作
-        for i in idxs:
-            # 调用智能体的step方法，执行动作并获取结果
-            # 智能体内部会根据random参数选择动作策略：
-            # - random=True: 使用随机动作
-            # - random=False: 使用策略网络选择动作
-            state, next_state, reward, action, done = self.agents[i].step(
-                model=model,
-                random=random,
-                deterministic=deterministic,
-                rl_model_type=rl_model_type)
+        for k, i in enumerate(idxs):
+            if batched:
+                action, model_action = self.agents[i].choose_action(
+                    model,
+                    observed[k][1],
+                    random=random,
+                    deterministic=deterministic,
+                    rl_model_type=rl_model_type,
+                    policy_action=policy_actions[k])
+                state, next_state, reward, action, done = self.agents[i].apply_action(
+                    observed[k][0],
+                    action,
+                    model_action,
+                    rl_model_type=rl_model_type)
+            else:
+                # 调用智能体的step方法，执行动作并获取结果
+                # 智能体内部会根据random参数选择动作策略：
+                # - random=True: 使用随机动作
+                # - random=False: 使用策略网络选择动作
+                state, next_state, reward, action, done = self.agents[i].step(
+                    model=model,
+                    random=random,
+                    deterministic=deterministic,
+                    rl_model_type=rl_model_type)
             
             # 状态向量格式转换：将字典格式转换为向量格式
             # 原始状态格式：{"los": [...], "ol": [...], "dom": [...], ...}
@@ -222,40 +298,12 @@ class environment:
                 break
 
         # 调试模式下的可视化更新
-        # 当debug=True时，实时更新组件网格和飞线图，便于训练过程监控
-        if self.parameters.debug is True:
-            # 绘制当前PCB布局的组件网格
-            # 组件网格显示了所有电子组件在PCB上的位置和形状
-            comp_grids = draw_board_from_board_and_graph_with_debug(
-                self.b, self.g, padding=self.padding)
-            
-            # 更新飞线图：显示网络连接关系
-            # 飞线图帮助理解组件之间的电气连接，是布局优化的重要参考
-            for i in range(len(self.agents)):
-                if i == 0:
-                    # 第一个智能体：直接创建飞线图
-                    ratsnest = draw_ratsnest_with_board(
-                        self.agents[i].parameters.node,      # 当前智能体对应的组件节点
-                        self.agents[i].parameters.neighbors, # 邻居组件列表
-                        self.agents[i].parameters.eoi,       # 相关边列表（Edges of Interest）
-                        self.b,                             # PCB板对象
-                        line_thickness=1,                    # 飞线线条粗细
-                        padding=self.padding,                # 绘制填充值
-                        ignore_power=True)                   # 忽略电源网络
-                else:
-                    # 后续智能体：将飞线图叠加到现有图上
-                    # 使用np.maximum确保重叠区域的飞线可见性
-                    ratsnest = np.maximum(ratsnest, draw_ratsnest_with_board(
-                        self.agents[i].parameters.node,
-                        self.agents[i].parameters.neighbors,
-                        self.agents[i].parameters.eoi,
-                        self.b,
-                        line_thickness=1,
-                        padding=self.padding,
-                        ignore_power=True))
-
-            # 将组件网格和飞线图添加到跟踪器，用于后续的可视化和分析
-            self.tracker.add(comp_grids=comp_grids, ratsnest=ratsnest)
+        # 按渲染策略 (parameters.render) 更新组件网格和飞线图，便于训练过程监控
+        self.render_steps += 1
+        if self.should_render():
+            with self.profiler.timer("environment/render"):
+                self.render()
+        self.profiler.step()
             
         # 记录性能指标到跟踪器
         # 这些指标将用于训练过程监控、性能分析和可视化
@@ -266,6 +314,19 @@ class environment:
         # 每个观察向量包含完整的状态转换信息，用于强化学习算法训练
         return observation_vec
 
+    def select_resolution(self):
+        """
+        当前板的栅格分辨率 (mm/像素)
+
+        parameters.resolution 为数值时直接使用；为 "auto" 时按当前板的最小
+        组件与视线扇区选择（见 pcbDraw.auto_resolution）。分辨率保存在环境
+        与智能体参数中，同一进程内的多个环境互不影响。
+        """
+        if self.parameters.resolution == "auto":
+            return auto_resolution(self.g.get_nodes(),
+                                   min_pixels=self.parameters.resolution_min_pixels)
+        return float(self.parameters.resolution)
+
     def initialize_environment_state_from_pcb(self, init=False, idx=-1):
         """
         从PCB文件初始化环境状态
@@ -297,6 +358,39 @@ class environment:
         # 重要：将组件原点设置为零
         self.g.set_component_origin_to_zero(self.b)
 
+        # 增量占用栅格，由本环境的所有智能体共享
+        if init:
+            self.resolution = self.select_resolution()
+            if self.parameters.incremental_occupancy is True:
+                self.occupancy = occupancy_grid(self.b.get_width(),
+                                                self.b.get_height(),
+                                                padding=4,
+                                                resolution=self.resolution)
+            else:
+                self.occupancy = None
+
+            # 增量 HPWL 缓存，同样由所有智能体共享
+            if self.parameters.incremental_hpwl is True:
+                self.hpwl_cache = hpwl_cache(self.g)
+            else:
+                self.hpwl_cache = None
+
+            # 组件外形空间索引，由所有智能体共享：观测只查询视线圆内的组件，
+            # 几何合法性检查也基于它。智能体移动节点时增量更新（agent.node_moved）
+            if self.parameters.spatial_index is True or self.parameters.legality_engine == "geometric":
+                outline = None
+                if (self.parameters.legality_engine == "geometric" and
+                    self.parameters.legality_outline is True):
+                    outline = board_outline_polygon(self.b.get_width(),
+                                                    self.b.get_height(),
+                                                    padding=4)
+                self.footprints = footprint_index(self.b.get_width(),
+                                                  self.b.get_height(),
+                                                  outline=outline)
+                self.footprints.sync(self.g.get_nodes())
+            else:
+                self.footprints = None
+
         # 遍历所有节点，为未放置的组件创建智能体
         nn = self.g.get_nodes()
         for i in range(len(nn)):
@@ -342,6 +436,15 @@ class environment:
                         "p": self.parameters.p,           # HPWL权重
                         "ignore_power": self.parameters.ignore_power,
                         "log_file": None if self.parameters.log_dir is None else os.path.join(self.parameters.log_dir, self.p.get_kicad_pcb2().replace(".kicad_pcb", ".log")),
+                        "occupancy": self.occupancy,
+                        "hpwl_cache": self.hpwl_cache,
+                        "footprints": self.footprints,
+                        "spatial_index": self.parameters.spatial_index,
+                        "legality_engine": self.parameters.legality_engine,
+                        "los_engine": self.parameters.los_engine,
+                        "observation_cache": self.parameters.observation_cache,
+                        "profiler": self.profiler,
+                        "resolution": self.resolution,
                     })
 
                     # 创建智能体并添加到列表
@@ -390,6 +493,30 @@ class environment:
         self.initialize_environment_state_from_pcb(init=True, idx=original_idx)
         return all_params
 
+    def get_node_target_params(self):
+        """
+        直接从各PCB图的节点读取目标参数，不重新初始化环境状态，
+        因此可以在回合进行中调用（智能体更新目标时同时写入节点）。
+
+        Returns:
+            all_params: 与 get_all_target_params 格式相同的目标参数列表
+        """
+        all_params = []
+        for p in self.pv:
+            targets = []
+            for n in p.get_graph().get_nodes():
+                if n.get_isPlaced() == 0:
+                    targets.append({
+                        "id": n.get_id(),
+                        "We": n.get_opt_euclidean_distance(),
+                        "HPWLe": n.get_opt_hpwl()
+                    })
+            all_params.append({
+                "kicad_pcb": p.get_kicad_pcb2(),
+                "expert_targets": targets
+            })
+        return all_params
+
     def info(self):
         """
         打印所有智能体的信息
@@ -471,6 +598,8 @@ class environment:
         Returns:
             HPWL值
         """
+        if self.hpwl_cache is not None:
+            return self.hpwl_cache.total_hpwl()
         return self.g.calc_hpwl(True)
 
     def get_parameters(self):
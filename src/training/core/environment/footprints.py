@@ -0,0 +1,264 @@
+"""
+每个环境持有的组件外形空间索引与几何合法性检查。
+
+agent.get_reward 在找到更低的 HPWL 时需要判断当前布局是否合法（组件之间
+没有重叠且都在板内）。原实现为每个节点绘制一张整板平面后逐像素求和，
+每次判断都要分配数百万像素。这里用均匀网格索引每个组件外形（有向矩形）
+的包围盒，节点移动时只重新检查与其包围盒落在相同网格单元中的组件
+（分离轴定理），并维护当前所有重叠组件对与越界组件的集合。判断合法性
+只需检查两个集合是否为空。
+
+索引同时是组件的空间索引：观测只查询视线圆内的组件（nodes_near），
+不再遍历全部节点。智能体在 node.set_pos / set_orientation 之后调用
+update_node，环境在数据增强等批量移动之后调用 sync，索引因此是增量维护
+的。每次更新都记入变更日志，占用栅格与观测缓存据此只处理移动过的节点
+（changed_since）。
+
+坐标约定与 pcb_geometry 相同：x = pos[0] ∈ [0, board_height]，
+y = pos[1] ∈ [0, board_width]。
+"""
+import numpy as np
+
+from pcb_geometry import (rectangle_polygon,
+                          rectangles_overlap,
+                          rectangle_inside_box,
+                          polygon_contains_rectangle)
+
+
+class footprint_index():
+    """
+    环境级别的组件外形均匀网格索引
+    """
+
+    def __init__(self, board_width, board_height, cell_size=None,
+                 outline=None, tolerance=1e-6, max_log=4096):
+        """
+        Args:
+            board_width: 板宽度 (mm)
+            board_height: 板高度 (mm)
+            cell_size: 网格单元边长 (mm)，None 表示板最长边的 1/16
+            outline: 可选的异形边框多边形（节点坐标，见
+                pcb_board.board_outline_polygon），组件还必须位于其中
+            tolerance: 重叠/越界判断的容差 (mm)，仅接触不算重叠
+            max_log: 变更日志保留的条目数，更早的版本需要完整同步
+        """
+        self.board_width = board_width
+        self.board_height = board_height
+        if cell_size is None:
+            cell_size = max(board_width, board_height) / 16
+        self.cell_size = cell_size
+        self.outline = outline
+        self.tolerance = tolerance
+        self.max_log = max_log
+        self.log = []
+        self.log_base = 0
+        self.reset()
+
+    def reset(self):
+        """
+        清空索引
+        """
+        # node_id -> (pose, rect, aabb, cells, node)
+        self.footprints = {}
+        self.cells = {}             # (i, j) -> 包围盒覆盖该单元的节点 id 集合
+        self.conflicts = {}         # node_id -> 与之重叠的节点 id 集合
+        self.outside = set()        # 不在板内的节点 id
+        # 变更日志：log[k] 是版本 log_base+k 到 log_base+k+1 之间更新的节点 id；
+        # 清空后版本号跳过一位，之前的所有版本都需要完整同步
+        self.log_base = self.log_base + len(self.log) + 1
+        self.log = []
+
+    def _cells(self, aabb):
+        x0, y0, x1, y1 = aabb
+        s = self.cell_size
+        return [(i, j)
+                for i in range(int(np.floor(x0 / s)), int(np.floor(x1 / s)) + 1)
+                for j in range(int(np.floor(y0 / s)), int(np.floor(y1 / s)) + 1)]
+
+    def _inside(self, rect):
+        if not rectangle_inside_box(rect, 0.0, 0.0,
+                                    self.board_height, self.board_width,
+                                    tolerance=self.tolerance):
+            return False
+        if self.outline is not None:
+            return polygon_contains_rectangle(self.outline, rect)
+        return True
+
+    def query(self, x0, y0, x1, y1):
+        """
+        包围盒与 [x0,x1]x[y0,y1] 相交的节点 id
+        """
+        s = self.cell_size
+        candidates = set()
+        for i in range(int(np.floor(x0 / s)), int(np.floor(x1 / s)) + 1):
+            for j in range(int(np.floor(y0 / s)), int(np.floor(y1 / s)) + 1):
+                ids = self.cells.get((i, j))
+                if ids is not None:
+                    candidates |= ids
+
+        result = []
+        for node_id in candidates:
+            a = self.footprints[node_id][2]
+            if a[0] <= x1 and a[2] >= x0 and a[1] <= y1 and a[3] >= y0:
+                result.append(node_id)
+        return result
+
+    @property
+    def version(self):
+        """
+        当前版本号，每次节点更新或移除后加一
+        """
+        return self.log_base + len(self.log)
+
+    def _record(self, node_id):
+        self.log.append(node_id)
+        if len(self.log) > self.max_log:
+            drop = len(self.log) - self.max_log // 2
+            del self.log[:drop]
+            self.log_base += drop
+
+    def changed_since(self, version):
+        """
+        自 version 以来被更新或移除的节点 id
+
+        Returns:
+            set 或 None: 日志已不包含该版本（过早或索引已重置）时返回 None，
+                调用方应完整同步
+        """
+        if version is None or version < self.log_base or version > self.version:
+            return None
+        return set(self.log[version - self.log_base:])
+
+    def node(self, node_id):
+        """
+        索引中的节点句柄，不存在时返回 None
+        """
+        footprint = self.footprints.get(node_id)
+        return None if footprint is None else footprint[4]
+
+    def nodes(self):
+        """
+        索引中的全部节点句柄
+        """
+        return [footprint[4] for footprint in self.footprints.values()]
+
+    def pose(self, node_id):
+        """
+        节点最近一次被索引时的 (x, y, 宽, 高, 方向)
+        """
+        return self.footprints[node_id][0]
+
+    def nodes_near(self, x, y, radius, exclude=None):
+        """
+        包围盒与以 (x, y) 为中心、边长 2*radius 的正方形相交的节点句柄
+
+        Args:
+            exclude: 可选，排除的节点 id（通常是当前节点）
+        """
+        return [self.footprints[node_id][4]
+                for node_id in self.query(x - radius, y - radius,
+                                          x + radius, y + radius)
+                if node_id != exclude]
+
+    def _unlink(self, node_id):
+        previous = self.footprints.pop(node_id, None)
+        if previous is None:
+            return
+        for cell in previous[3]:
+            ids = self.cells[cell]
+            ids.discard(node_id)
+            if len(ids) == 0:
+                del self.cells[cell]
+        for other in self.conflicts.pop(node_id, ()):
+            self.conflicts[other].discard(node_id)
+            if len(self.conflicts[other]) == 0:
+                del self.conflicts[other]
+        self.outside.discard(node_id)
+
+    def update_node(self, n):
+        """
+        若节点的位置、尺寸或方向发生变化，则重新索引该节点并更新其
+        重叠与越界状态。
+
+        Returns:
+            bool: 节点是否被更新
+        """
+        node_id = n.get_id()
+        pos = n.get_pos()
+        size = n.get_size()
+        orientation = n.get_orientation()
+        pose = (float(pos[0]), float(pos[1]),
+                float(size[0]), float(size[1]),
+                float(orientation))
+
+        previous = self.footprints.get(node_id)
+        if previous is not None and previous[0] == pose:
+            return False
+        self._unlink(node_id)
+
+        rect = rectangle_polygon(pose[:2], pose[2:4], pose[4])
+        aabb = (rect[:, 0].min(), rect[:, 1].min(),
+                rect[:, 0].max(), rect[:, 1].max())
+
+        overlapping = set()
+        for other in self.query(*aabb):
+            if rectangles_overlap(rect, self.footprints[other][1],
+                                  tolerance=self.tolerance):
+                overlapping.add(other)
+
+        cells = self._cells(aabb)
+        for cell in cells:
+            self.cells.setdefault(cell, set()).add(node_id)
+        self.footprints[node_id] = (pose, rect, aabb, cells, n)
+        self._record(node_id)
+
+        if len(overlapping) > 0:
+            self.conflicts[node_id] = overlapping
+            for other in overlapping:
+                self.conflicts.setdefault(other, set()).add(node_id)
+        if not self._inside(rect):
+            self.outside.add(node_id)
+        return True
+
+    def remove_node(self, node_id):
+        """
+        从索引中移除节点
+        """
+        if node_id in self.footprints:
+            self._unlink(node_id)
+            self._record(node_id)
+
+    def sync(self, nodes):
+        """
+        与图中的节点同步；只有发生移动的节点会被重新检查。
+
+        Args:
+            nodes: 图中的全部节点 (g.get_nodes())
+
+        Returns:
+            list: 本次被更新的节点 id
+        """
+        moved = []
+        ids = set()
+        for n in nodes:
+            ids.add(n.get_id())
+            if self.update_node(n):
+                moved.append(n.get_id())
+
+        for node_id in [k for k in self.footprints if k not in ids]:
+            self.remove_node(node_id)
+            moved.append(node_id)
+
+        return moved
+
+    def overlapping(self, node_id):
+        """
+        与指定节点重叠的节点 id
+        """
+        return set(self.conflicts.get(node_id, ()))
+
+    def is_legal(self):
+        """
+        当前索引中的布局是否合法：任意两个组件都不重叠，且所有组件都在板内
+        """
+        return len(self.conflicts) == 0 and len(self.outside) == 0
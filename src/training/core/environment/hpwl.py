@@ -0,0 +1,152 @@
+"""
+每个环境持有的增量 HPWL（半周长线长）缓存。
+
+agent.reset 与 agent.get_reward 每一步都对智能体的每个网络调用
+graph.calc_hpwl_of_net，每次调用都经过 C++ 绑定并重新扫描网络的全部焊盘。
+这里为每个网络维护焊盘包围盒：只有与移动过的节点相连的网络才会被重新
+计算，单步开销随被移动节点的度数增长，而不是随所有网络的规模增长。
+
+焊盘位置的计算方式与 pcb_vector_utils 相同（节点位置 + kicad_rotate 旋转后
+的焊盘偏移）。构建时会用 graph.calc_hpwl_of_net 校验一次；若结果不一致，
+缓存退化为只对脏网络调用 graph.calc_hpwl_of_net，结果仍与原实现完全相同。
+"""
+import numpy as np
+
+
+class hpwl_cache():
+    """
+    环境级别的增量 HPWL 缓存，由环境中的所有智能体共享
+
+    只支持 do_not_ignore_unplaced=True（所有调用方都使用该模式）。
+    """
+
+    def __init__(self, g, tolerance=1e-6):
+        """
+        Args:
+            g: 网络图对象 (graph)
+            tolerance: 与 graph.calc_hpwl_of_net 校验时允许的绝对误差
+        """
+        self.g = g
+        self.nodes = list(g.get_nodes())
+        node_idx = {}
+        for idx, n in enumerate(self.nodes):
+            node_idx[n.get_id()] = idx
+
+        # 每个网络的焊盘：所属网络、所属节点、未旋转的偏移
+        self.net_ids = []
+        net_idx = {}
+        pad_net = []
+        pad_node = []
+        pad_offset = []
+        for e in g.get_edges():
+            net_id = e.get_net_id()
+            if net_id not in net_idx:
+                net_idx[net_id] = len(self.net_ids)
+                self.net_ids.append(net_id)
+            for i in range(2):
+                idx = node_idx.get(e.get_instance_id(i))
+                if idx is None:
+                    continue
+                pos = e.get_pos(i)
+                pad_net.append(net_idx[net_id])
+                pad_node.append(idx)
+                pad_offset.append([float(pos[0]), float(pos[1])])
+
+        self.net_idx = net_idx
+        self.pad_net = np.array(pad_net, dtype=np.int64)
+        self.pad_node = np.array(pad_node, dtype=np.int64)
+        self.pad_offset = np.array(pad_offset, dtype=np.float64).reshape(-1, 2)
+
+        n_nets = len(self.net_ids)
+        # 网络 -> 成员节点，节点 -> 相连网络
+        self.net_nodes = [np.unique(self.pad_node[self.pad_net == k]) for k in range(n_nets)]
+        self.node_nets = [np.unique(self.pad_net[self.pad_node == k]) for k in range(len(self.nodes))]
+
+        self.poses = np.full((len(self.nodes), 3), np.nan)
+        self.values = np.zeros(n_nets)
+        self.exact = False
+        self.sync()
+
+        # 与 C++ 实现校验一次
+        for k, net_id in enumerate(self.net_ids):
+            if abs(self.values[k] - g.calc_hpwl_of_net(net_id, True)) > tolerance:
+                self.exact = True
+                break
+        if self.exact:
+            self._recompute(np.arange(n_nets))
+
+        total = g.calc_hpwl(True)
+        self.total_matches = abs(np.sum(self.values) - total) <= tolerance * max(1.0, abs(total))
+
+    def _recompute(self, nets):
+        if len(nets) == 0:
+            return
+        if self.exact:
+            for k in nets:
+                self.values[k] = self.g.calc_hpwl_of_net(self.net_ids[k], True)
+            return
+
+        rows = np.isin(self.pad_net, nets)
+        pose = self.poses[self.pad_node[rows]]
+        offset = self.pad_offset[rows]
+        # kicad_rotate
+        theta = np.pi * (pose[:, 2] / 180.0)
+        c = np.cos(theta)
+        s = np.sin(theta)
+        x = pose[:, 0] + offset[:, 0] * c + offset[:, 1] * s
+        y = pose[:, 1] - offset[:, 0] * s + offset[:, 1] * c
+
+        n_nets = len(self.net_ids)
+        lo_x = np.full(n_nets, np.inf)
+        lo_y = np.full(n_nets, np.inf)
+        hi_x = np.full(n_nets, -np.inf)
+        hi_y = np.full(n_nets, -np.inf)
+        net = self.pad_net[rows]
+        np.minimum.at(lo_x, net, x)
+        np.minimum.at(lo_y, net, y)
+        np.maximum.at(hi_x, net, x)
+        np.maximum.at(hi_y, net, y)
+        self.values[nets] = (hi_x[nets] - lo_x[nets]) + (hi_y[nets] - lo_y[nets])
+
+    def _update_nodes(self, node_indices):
+        moved = []
+        for k in node_indices:
+            n = self.nodes[k]
+            pos = n.get_pos()
+            pose = (float(pos[0]), float(pos[1]), float(n.get_orientation()))
+            if tuple(self.poses[k]) != pose:
+                self.poses[k] = pose
+                moved.append(k)
+        if len(moved) == 0:
+            return
+        dirty = np.unique(np.concatenate([self.node_nets[k] for k in moved]))
+        self._recompute(dirty)
+
+    def sync(self):
+        """
+        检查全部节点，重新计算与移动过的节点相连的网络
+        """
+        self._update_nodes(range(len(self.nodes)))
+
+    def nets_hpwl(self, net_ids):
+        """
+        给定网络的 HPWL 之和，等价于
+        sum(graph.calc_hpwl_of_net(net_id, True) for net_id in net_ids)。
+
+        只检查这些网络的成员节点，开销随网络规模而非整板规模增长。
+        """
+        nets = [self.net_idx[net_id] for net_id in net_ids if net_id in self.net_idx]
+        if len(nets) == 0:
+            return 0
+        members = np.unique(np.concatenate([self.net_nodes[k] for k in nets]))
+        self._update_nodes(members)
+        return float(np.sum(self.values[nets]))
+
+    def total_hpwl(self):
+        """
+        整板 HPWL，等价于 graph.calc_hpwl(True)
+        """
+        if not self.total_matches:
+            return self.g.calc_hpwl(True)
+        self.sync()
+        return float(np.sum(self.values))
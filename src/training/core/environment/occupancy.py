@@ -0,0 +1,240 @@
+"""
+每个环境持有的增量占用栅格（occupancy raster）。
+
+draw_board_from_graph_multi_agent 每次观测都会为每个节点分配一张整板平面并
+重新绘制全部组件。这里改为维护一张持久的计数栅格：每个像素记录覆盖它的
+组件数量，某个节点移动时只擦除/重绘该节点的包围盒区域。智能体需要的
+"自身" 与 "其他组件" 平面可以由计数栅格廉价地导出。
+
+像素化方式与 pcbDraw 中的绘制函数完全一致（cv2.boxPoints + drawContours），
+因此导出的平面与逐节点重绘结果逐像素相同。
+"""
+import numpy as np
+import cv2
+
+from pcbDraw import pcbDraw_resolution
+
+
+class occupancy_grid():
+    """
+    环境级别的增量占用栅格
+
+    索引约定与 draw_board_from_graph_multi_agent 相同：
+        idx = 0 ( grid border )
+        idx = 1 ( current node )
+        idx = 2 ( union of all other nodes )
+    """
+
+    def __init__(self, board_width, board_height, padding=4, resolution=None):
+        """
+        Args:
+            board_width: 板宽度 (mm)
+            board_height: 板高度 (mm)
+            padding: 绘制时的填充值 (mm)
+            resolution: 栅格分辨率 (mm/像素)，None 表示使用 pcbDraw 当前分辨率
+        """
+        self.board_width = board_width
+        self.board_height = board_height
+        self.padding = padding
+        self.resolution = pcbDraw_resolution() if resolution is None else resolution
+
+        r = self.resolution
+        self.pad_px = int(padding/r) if padding is not None else 0
+        self.shape = (int(board_width/r) + 2*self.pad_px,
+                      int(board_height/r) + 2*self.pad_px)
+
+        # 板边框平面（常量，只读）
+        self.border = np.zeros(self.shape, np.uint8)
+        if self.pad_px > 0:
+            self.border[:self.pad_px, :] = 64
+            self.border[-self.pad_px:, :] = 64
+            self.border[:, :self.pad_px] = 64
+            self.border[:, -self.pad_px:] = 64
+        self.border.setflags(write=False)
+
+        self.reset()
+
+    def reset(self):
+        """
+        清空所有组件的占用信息
+        """
+        self.count = np.zeros(self.shape, np.uint16)   # 每个像素被多少个组件覆盖
+        self.occupied = np.zeros(self.shape, np.uint8)  # 任意组件覆盖的像素 (64)
+        # node_id -> (pose, (r0, r1, c0, c1), patch)
+        self.footprints = {}
+        self.index_version = None   # 最近一次 sync_index 时外形索引的版本
+
+    def _rasterize(self, pos, size, orientation):
+        r = self.resolution
+        xc = float(pos[0]) / r + self.pad_px
+        yc = float(pos[1]) / r + self.pad_px
+        sz_x = float(size[0]) / r
+        sz_y = float(size[1]) / r
+        # convert the center, size and orientation to rectange points
+        box = cv2.boxPoints(((xc,yc), (sz_x,sz_y), -orientation))
+        box = np.int0(box)  # ensure that box point are integers
+
+        c0, r0 = np.min(box, axis=0)
+        c1, r1 = np.max(box, axis=0) + 1
+        patch = np.zeros((r1-r0, c1-c0), np.uint8)
+        cv2.drawContours(patch, [box - [c0, r0]], 0, (1), -1)
+
+        # clip the footprint to the grid
+        rr0, cc0 = max(r0, 0), max(c0, 0)
+        rr1, cc1 = min(r1, self.shape[0]), min(c1, self.shape[1])
+        if rr0 >= rr1 or cc0 >= cc1:
+            return (0, 0, 0, 0), np.zeros((0, 0), np.uint8)
+
+        patch = patch[rr0-r0:rr1-r0, cc0-c0:cc1-c0]
+        return (int(rr0), int(rr1), int(cc0), int(cc1)), patch
+
+    def _apply(self, region, patch, sign):
+        r0, r1, c0, c1 = region
+        if r0 == r1:
+            return
+        if sign > 0:
+            self.count[r0:r1, c0:c1] += patch
+        else:
+            self.count[r0:r1, c0:c1] -= patch
+        self.occupied[r0:r1, c0:c1] = (self.count[r0:r1, c0:c1] > 0) * np.uint8(64)
+
+    def update_node(self, n):
+        """
+        若节点的位置、尺寸或方向发生变化，则只重绘该节点的区域。
+
+        Returns:
+            bool: 节点栅格是否被更新
+        """
+        node_id = n.get_id()
+        pos = n.get_pos()
+        size = n.get_size()
+        orientation = n.get_orientation()
+        pose = (float(pos[0]), float(pos[1]),
+                float(size[0]), float(size[1]),
+                float(orientation))
+
+        previous = self.footprints.get(node_id)
+        if previous is not None:
+            if previous[0] == pose:
+                return False
+            self._apply(previous[1], previous[2], -1)
+
+        region, patch = self._rasterize(pos, size, orientation)
+        self._apply(region, patch, 1)
+        self.footprints[node_id] = (pose, region, patch)
+        return True
+
+    def remove_node(self, node_id):
+        """
+        从栅格中移除节点
+        """
+        previous = self.footprints.pop(node_id, None)
+        if previous is not None:
+            self._apply(previous[1], previous[2], -1)
+
+    def sync(self, nodes):
+        """
+        与图中的节点同步；只有发生移动的节点会被重绘。
+
+        Args:
+            nodes: 图中的全部节点 (g.get_nodes())
+
+        Returns:
+            list: 本次被更新的节点 id
+        """
+        moved = []
+        ids = set()
+        for n in nodes:
+            ids.add(n.get_id())
+            if self.update_node(n):
+                moved.append(n.get_id())
+
+        for node_id in [k for k in self.footprints if k not in ids]:
+            self.remove_node(node_id)
+            moved.append(node_id)
+
+        return moved
+
+    def sync_index(self, index):
+        """
+        与外形索引 (core.environment.footprints) 同步；只重绘索引变更日志
+        中自上次同步以来移动过的节点，不再遍历全部节点。
+
+        Args:
+            index: 环境共享的 footprint_index
+
+        Returns:
+            list: 本次被更新的节点 id
+        """
+        changed = index.changed_since(self.index_version)
+        if changed is None:
+            moved = self.sync(index.nodes())
+        else:
+            moved = []
+            for node_id in changed:
+                n = index.node(node_id)
+                if n is None:
+                    if node_id in self.footprints:
+                        self.remove_node(node_id)
+                        moved.append(node_id)
+                elif self.update_node(n):
+                    moved.append(node_id)
+        self.index_version = index.version
+        return moved
+
+    def _window(self, window):
+        if window is None:
+            return 0, self.shape[0], 0, self.shape[1]
+        return window
+
+    def node_plane(self, node_id, window=None):
+        """
+        仅包含指定节点的平面 (值为 64)
+
+        window: 可选的 (r0, r1, c0, c1)，只生成该窗口内的平面
+        """
+        w0, w1, v0, v1 = self._window(window)
+        plane = np.zeros((w1-w0, v1-v0), np.uint8)
+        footprint = self.footprints.get(node_id)
+        if footprint is not None:
+            r0, r1, c0, c1 = footprint[1]
+            # 包围盒与窗口的交集
+            rr0, rr1 = max(r0, w0), min(r1, w1)
+            cc0, cc1 = max(c0, v0), min(c1, v1)
+            if rr0 < rr1 and cc0 < cc1:
+                plane[rr0-w0:rr1-w0, cc0-v0:cc1-v0] = \
+                    footprint[2][rr0-r0:rr1-r0, cc0-c0:cc1-c0] * np.uint8(64)
+        return plane
+
+    def others_plane(self, node_id, window=None):
+        """
+        除指定节点之外所有组件的并集平面 (值为 64)
+
+        window: 可选的 (r0, r1, c0, c1)，只生成该窗口内的平面
+        """
+        w0, w1, v0, v1 = self._window(window)
+        plane = self.occupied[w0:w1, v0:v1].copy()
+        footprint = self.footprints.get(node_id)
+        if footprint is not None:
+            r0, r1, c0, c1 = footprint[1]
+            rr0, rr1 = max(r0, w0), min(r1, w1)
+            cc0, cc1 = max(c0, v0), min(c1, v1)
+            if rr0 < rr1 and cc0 < cc1:
+                plane[rr0-w0:rr1-w0, cc0-v0:cc1-v0] = \
+                    (self.count[rr0:rr1, cc0:cc1]
+                     > footprint[2][rr0-r0:rr1-r0, cc0-c0:cc1-c0]) * np.uint8(64)
+        return plane
+
+    def comp_grids(self, node_id, window=None):
+        """
+        返回与 draw_board_from_graph_multi_agent 兼容的平面列表：
+        [边框, 当前节点, 其他组件的并集]。
+
+        get_los_and_ol_multi_agent 只使用其他组件平面的并集，因此结果与
+        逐节点绘制的结果相同。给定 window (见 pcbDraw.get_los_window) 时
+        只生成视线圆包围盒内的平面，内存与带宽随组件尺寸而非板面积增长。
+        """
+        w0, w1, v0, v1 = self._window(window)
+        return [self.border[w0:w1, v0:v1],
+                self.node_plane(node_id, window=window),
+                self.others_plane(node_id, window=window)]
@@ -34,6 +34,12 @@ class parameters:
         
         # 调试和训练参数
         self.debug = params["debug"]                         # 是否启用调试模式
+        self.render = params.get("render", "always")         # 调试渲染策略："always"、"never"、"every_n"、"eval" 或 "video"
+        self.render_every = params.get("render_every", 10)    # render="every_n" 时的渲染间隔（步）
+        self.render_scale = params.get("render_scale", 1.0)   # 调试帧相对于 pcbDraw 分辨率的缩放比例 (<=1)
+        self.evaluation = params.get("evaluation", False)     # 是否为评估环境（render="eval"）
+        self.frame_size = params.get("frame_size", None)      # 跟踪器视频帧最长边的像素数，None 表示保持渲染尺寸
+        self.compress_frames = params.get("compress_frames", True)  # 跟踪器是否在内存中压缩保存视频帧
         self.max_steps = params["max_steps"]                 # 最大步数
         
         # 奖励函数权重参数
@@ -47,6 +53,19 @@ class parameters:
         self.log_dir = params["log_dir"]                     # 日志目录
         self.idx = params["idx"]                             # PCB索引
         self.shuffle_idxs = params["shuffle_idxs"]           # 是否随机打乱智能体执行顺序
+
+        # 性能相关参数
+        self.incremental_occupancy = params.get("incremental_occupancy", True)  # 是否使用增量占用栅格生成观测
+        self.los_engine = params.get("los_engine", "raster")                    # 视线/重叠特征引擎："raster" 或 "analytic"
+        self.incremental_hpwl = params.get("incremental_hpwl", True)            # 是否使用增量 HPWL 缓存计算奖励
+        self.observation_cache = params.get("observation_cache", True)          # 是否缓存智能体观测，只在相关节点移动后重新计算
+        self.batched_inference = params.get("batched_inference", False)         # 是否对所有智能体做一次批量策略推理（观察取自步开始时的布局）
+        self.profile = params.get("profile", False)                             # 是否记录各阶段耗时（见 core.profiler）
+        self.resolution = params.get("resolution", 0.02)                        # 栅格分辨率 (mm/像素)，或 "auto" 按每块板的最小组件自动选择（见 pcbDraw.auto_resolution）
+        self.resolution_min_pixels = params.get("resolution_min_pixels", 8)     # resolution="auto" 时最小组件与视线扇区至少覆盖的像素数
+        self.spatial_index = params.get("spatial_index", True)                  # 是否维护组件外形空间索引，观测只查询视线圆内的组件（见 core.environment.footprints）
+        self.legality_engine = params.get("legality_engine", "raster")          # 布局合法性检查："raster"（整板平面叠加，与基线一致）或 "geometric"（外形索引 + 分离轴，更严格：不允许任何重叠）
+        self.legality_outline = params.get("legality_outline", True)            # 几何检查是否还要求组件位于异形边框内（见 pcb_board.board_outline_polygon）
         
     def write_to_file(self, fileName, append=True):
         """
@@ -1,8 +1,10 @@
 import os
 
 from core import video_utils
+from core.frame_store import frame_store
 from collections import deque
 import numpy as np
+import cv2
 
 import matplotlib
 import matplotlib.pyplot as plt
@@ -15,54 +17,56 @@ class tracker():
     包括组件网格、飞线图、奖励、指标等信息的存储、可视化和分析
     """
     
-    def __init__(self, maxlen=1024):
+    def __init__(self, maxlen=1024, frame_size=None, compress_frames=True):
         """
         初始化环境跟踪器
         
         Args:
             maxlen: 最大记录长度，防止内存溢出
+            frame_size: 视频帧最长边的像素数，None 表示保持渲染尺寸
+            compress_frames: 是否在内存中压缩保存视频帧
         """
         self.maxlen = maxlen
 
+        # 每一步只保存一张合成后的视频帧（见 core.frame_store）
+        self.frames = frame_store(maxlen=self.maxlen,
+                                  max_size=frame_size,
+                                  compress=compress_frames)
+
         # 使用双端队列存储历史数据
-        self.all_comp_grids = deque(maxlen=self.maxlen)  # 组件网格历史
-        self.ratsnest = deque(maxlen=self.maxlen)        # 飞线图历史
         self.rewards = deque(maxlen=self.maxlen)          # 奖励历史
         self.metrics = deque(maxlen=self.maxlen)          # 指标历史
         self.frame_buffer = np.array([])                  # 帧缓冲区
 
     def add_comp_grids(self, comp_grids=None):
         """
-        添加组件网格数据
+        添加组件网格数据（合成为一帧保存）
         
         Args:
             comp_grids: 组件网格数据
         """
         if comp_grids is not None:
-            self.all_comp_grids.append(comp_grids)
+            self.frames.add(comp_grids)
 
     def get_last_comp_grids(self):
         """
-        获取最新的组件网格数据
+        获取最新的合成帧
         
         Returns:
-            最新的组件网格数据
+            最新的合成帧
         """
-        return self.all_comp_grids[-1]
+        return self.frames[-1]
 
     def add(self, comp_grids=None, ratsnest=None):
         """
-        添加组件网格和飞线图数据
+        添加组件网格和飞线图数据，合成为一帧保存
         
         Args:
             comp_grids: 组件网格数据
             ratsnest: 飞线图数据
         """
         if comp_grids is not None:
-            self.all_comp_grids.append(comp_grids)
-
-        if ratsnest is not None:
-            self.ratsnest.append(ratsnest)
+            self.frames.add(comp_grids, ratsnest)
 
     def add_reward(self, reward):
         """
@@ -86,11 +90,27 @@ class tracker():
         """
         重置跟踪器，清空所有历史数据
         """
-        self.all_comp_grids.clear()
-        self.ratsnest.clear()
+        self.frames.clear()
         self.rewards.clear()
         self.metrics.clear()
 
+    def snapshot(self, last=None):
+        """
+        创建与当前跟踪器脱离的拷贝，供异步写出视频、日志等使用
+
+        Args:
+            last: 只保留最后 last 帧与指标，None 表示全部
+        """
+        snap = tracker(maxlen=self.maxlen)
+        snap.frames = self.frames.copy(last=last)
+        items = [(snap.rewards, self.rewards), (snap.metrics, self.metrics)]
+        for dst, src in items:
+            values = list(src)
+            if last is not None:
+                values = values[-last:] if last > 0 else []
+            dst.extend(values)
+        return snap
+
     def create_video(self, fileName=None, v_id=None, display_metrics=True, fps=30):
         """
         创建训练过程视频
@@ -101,22 +121,23 @@ class tracker():
             display_metrics: 是否显示指标
             fps: 帧率
         """
+        # 渲染策略可能没有记录任何帧
+        if len(self.frames) == 0:
+            return
+
+        # 逐帧解码并写入视频
         if display_metrics is True:
-            video_utils.create_video(self.all_comp_grids,
-                                     ratsnest=self.ratsnest,
-                                     v_id=v_id,
-                                     fileName=fileName,
-                                     all_metrics=self.metrics,
-                                     draw_debug=True,
-                                     fps=fps)
+            video_utils.create_video_from_frames(self.frames,
+                                                 v_id=v_id,
+                                                 fileName=fileName,
+                                                 all_metrics=self.metrics,
+                                                 fps=fps)
         else:
-            video_utils.create_video(self.all_comp_grids,
-                                     ratsnest=self.ratsnest,
-                                     v_id=v_id,
-                                     fileName=fileName,
-                                     all_metrics=None,
-                                     draw_debug=True,
-                                     fps=fps)
+            video_utils.create_video_from_frames(self.frames,
+                                                 v_id=v_id,
+                                                 fileName=fileName,
+                                                 all_metrics=None,
+                                                 fps=fps)
 
     def log_run_to_file(self, path=None, filename=None, kicad_pcb=None):
         """
@@ -209,16 +230,19 @@ class tracker():
         Args:
             fileName: 输出文件名
         """
-        video_utils.create_image(self.all_comp_grids,
-                                 ratsnest=self.ratsnest,
-                                 fileName=fileName,
-                                 draw_debug=True)
+        if len(self.frames) == 0:
+            return
+
+        cv2.imwrite(fileName, self.frames[-1])
 
     def video_tensor(self):
         """
         获取视频张量数据
         
         Returns:
-            视频张量
+            视频张量，没有记录任何帧时返回 None
         """
-        return video_utils.get_video_tensor(self.all_comp_grids, self.ratsnest)
+        if len(self.frames) == 0:
+            return None
+
+        return video_utils.get_video_tensor_from_frames(self.frames)
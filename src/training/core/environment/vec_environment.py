@@ -0,0 +1,238 @@
+"""
+多进程向量化环境。
+
+训练时每个进程只驱动一个 environment，观测栅格化是单线程 CPU 计算。
+vec_environment 在 K 个工作进程中各运行一个 environment（各自加载 pcb 对象，
+各自的随机种子），学习器每一步向所有工作进程广播 step 命令，工作进程把
+转移数据写入共享内存，学习器一次性批量写入经验回放缓冲区。
+
+策略网络以 CPU 共享内存副本的形式传给工作进程，sync_policy 原地更新其权重。
+每一步都是同步的（等待所有工作进程完成），因此在相同的工作进程种子下
+行为可以复现。
+
+工作进程重新读取 pcb 文件，因此构造时把学习器环境当前的专家目标
+(We/HPWLe，例如 explore_for_expert_targets 的结果) 发送给每个工作进程；
+工作进程在训练中找到的更优目标在回合结束与 close() 时合并回学习器环境，
+回调中的最优值日志、评估与 PCB 快照因此使用最新的目标。
+"""
+import copy
+import random as random_package
+
+import numpy as np
+import torch
+import torch.multiprocessing as mp
+
+
+def worker_seeds(seed, num_envs):
+    """
+    由基础种子派生出每个工作进程的独立种子（可复现）
+    """
+    return [int(s.generate_state(1)[0]) for s in np.random.SeedSequence(seed).spawn(num_envs)]
+
+
+def max_agents_of(env):
+    """
+    环境中所有 PCB 的最大智能体数量（未放置的组件数）
+    """
+    max_agents = 0
+    for p in env.pv:
+        g = p.get_graph()
+        max_agents = max(max_agents, sum(1 for n in g.get_nodes() if n.get_isPlaced() == 0))
+    return max_agents
+
+
+def _worker(remote, parameters, seed, policy, rl_model_type, buffers, index, targets):
+    # 工作进程中才导入环境，避免主进程的 C++ 对象被继承
+    from core.environment.environment import environment
+    from multithread_explorer import apply_expert_targets
+
+    np.random.seed(seed % 2**32)
+    random_package.seed(seed)
+    torch.manual_seed(seed)
+    torch.set_num_threads(1)
+
+    parameters.seed = seed
+    env = environment(parameters)
+    # 学习器环境的专家目标，reset 时智能体从节点读取
+    apply_expert_targets(env, targets)
+    env.reset()
+
+    state, action, next_state, reward, done = [b[index].numpy() for b in buffers]
+
+    while True:
+        cmd, data = remote.recv()
+        if cmd == "step":
+            with torch.no_grad():
+                obs_vec = env.step(model=policy,
+                                   random=data["random"],
+                                   deterministic=data["deterministic"],
+                                   rl_model_type=rl_model_type)
+            episode_done = False
+            for i, indiv_obs in enumerate(obs_vec):
+                state[i] = indiv_obs[0]
+                next_state[i] = indiv_obs[1]
+                reward[i] = indiv_obs[2]
+                action[i] = indiv_obs[3]
+                done[i] = float(indiv_obs[4])
+                if indiv_obs[4] is True:
+                    episode_done = True
+
+            # 回合结束后自动重置
+            if episode_done:
+                env.reset()
+                env.tracker.reset()
+            remote.send((len(obs_vec), episode_done))
+        elif cmd == "calc_hpwl":
+            remote.send(env.calc_hpwl())
+        elif cmd == "get_targets":
+            remote.send(env.get_node_target_params())
+        elif cmd == "close":
+            remote.close()
+            break
+
+
+class vec_environment():
+    """
+    在 K 个工作进程中运行 environment 的向量化环境
+    """
+
+    def __init__(self, env, num_envs, policy, rl_model_type="SAC", seed=None):
+        """
+        Args:
+            env: 学习器进程中的 environment，用于读取参数、状态维度和最大智能体数；
+                其专家目标发送给工作进程，工作进程的目标也合并回该环境
+            num_envs: 工作进程数量 K
+            policy: 策略网络 (SAC.policy 或 TD3.actor)
+            rl_model_type: "SAC" 或 "TD3"
+            seed: 基础种子，None 表示使用环境参数中的种子
+        """
+        self.env = env
+        self.num_envs = num_envs
+        self.rl_model_type = rl_model_type
+        self.seeds = worker_seeds(env.parameters.seed if seed is None else seed, num_envs)
+
+        state_dim = env.agents[0].get_observation_space_shape()
+        action_dim = env.agents[0].action_space.shape[0]
+        self.max_agents = max_agents_of(env)
+
+        # 共享内存中的转移数据 (K, max_agents, dim)
+        self.buffers = [torch.zeros((num_envs, self.max_agents, state_dim)).share_memory_(),
+                        torch.zeros((num_envs, self.max_agents, action_dim)).share_memory_(),
+                        torch.zeros((num_envs, self.max_agents, state_dim)).share_memory_(),
+                        torch.zeros((num_envs, self.max_agents)).share_memory_(),
+                        torch.zeros((num_envs, self.max_agents)).share_memory_()]
+
+        # 策略网络的 CPU 共享内存副本
+        self.policy = copy.deepcopy(policy).to("cpu")
+        self.policy.device = torch.device("cpu")
+        self.policy.share_memory()
+        self.policy.eval()
+
+        # 工作进程不录制调试视频，也不写日志文件
+        parameters = copy.deepcopy(env.parameters)
+        parameters.debug = False
+        parameters.log_dir = None
+
+        from multithread_explorer import merge_expert_targets
+        targets = merge_expert_targets([env.get_node_target_params()])
+
+        ctx = mp.get_context("spawn")
+        self.remotes = []
+        self.processes = []
+        for k in range(num_envs):
+            remote, worker_remote = ctx.Pipe()
+            process = ctx.Process(target=_worker,
+                                  args=(worker_remote, parameters, self.seeds[k],
+                                        self.policy, rl_model_type,
+                                        self.buffers, k, targets),
+                                  daemon=True)
+            process.start()
+            worker_remote.close()
+            self.remotes.append(remote)
+            self.processes.append(process)
+
+        self.closed = False
+
+    def sync_policy(self, policy):
+        """
+        将学习器的策略权重原地复制到共享内存副本
+        """
+        with torch.no_grad():
+            for shared, param in zip(self.policy.state_dict().values(),
+                                     policy.state_dict().values()):
+                shared.copy_(param)
+
+    def step(self, random=False, deterministic=False):
+        """
+        所有工作进程同步执行一步
+
+        Returns:
+            transitions: (state, action, next_state, reward, not_done)，按工作
+                进程顺序拼接的 numpy 数组，可直接传给 ReplayMemory.add_batch
+            rewards: 每个工作进程的奖励数组列表
+            dones: 每个工作进程本步是否结束回合（结束后已自动重置）
+        """
+        for remote in self.remotes:
+            remote.send(("step", {"random": random, "deterministic": deterministic}))
+        results = [remote.recv() for remote in self.remotes]
+
+        state, action, next_state, reward, done = [b.numpy() for b in self.buffers]
+        columns = [[], [], [], [], []]
+        rewards = []
+        dones = []
+        for k, (n, episode_done) in enumerate(results):
+            columns[0].append(state[k, :n])
+            columns[1].append(action[k, :n])
+            columns[2].append(next_state[k, :n])
+            columns[3].append(reward[k, :n].reshape(-1, 1))
+            columns[4].append(1. - done[k, :n].reshape(-1, 1))
+            rewards.append(reward[k, :n].copy())
+            dones.append(episode_done)
+
+        # 回合结束的工作进程可能找到了更优的专家目标
+        if any(dones):
+            self.merge_targets([k for k in range(self.num_envs) if dones[k]])
+
+        transitions = tuple(np.concatenate(c) for c in columns)
+        return transitions, rewards, dones
+
+    def merge_targets(self, workers=None):
+        """
+        将工作进程的专家目标与学习器环境的目标合并（逐节点取最小值），
+        写回学习器环境并重置它，使其智能体读取新的目标
+
+        Args:
+            workers: 查询的工作进程编号列表，None 表示全部
+        """
+        from multithread_explorer import merge_expert_targets, apply_expert_targets
+
+        if workers is None:
+            workers = range(self.num_envs)
+        for k in workers:
+            self.remotes[k].send(("get_targets", None))
+        all_targets = [self.env.get_node_target_params()]
+        all_targets += [self.remotes[k].recv() for k in workers]
+
+        apply_expert_targets(self.env, merge_expert_targets(all_targets))
+        self.env.reset()
+
+    def calc_hpwl(self):
+        """
+        每个工作进程当前的 HPWL
+        """
+        for remote in self.remotes:
+            remote.send(("calc_hpwl", None))
+        return [remote.recv() for remote in self.remotes]
+
+    def close(self):
+        """
+        合并工作进程的专家目标后关闭所有工作进程
+        """
+        if self.closed:
+            return
+        self.merge_targets()
+        for remote in self.remotes:
+            remote.send(("close", None))
+        for process in self.processes:
+            process.join()
+        self.closed = True
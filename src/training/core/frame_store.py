@@ -0,0 +1,119 @@
+"""
+环境视频的紧凑帧存储。
+
+环境跟踪器原来为每一步保存整板分辨率的 comp_grids 平面和飞线图，
+只在写出视频时才合成视频帧。frame_store 在添加时就把每一步合成为单张
+uint8 帧，可选地缩小到目标尺寸，并以 zlib 压缩的形式保存在内存中。
+板面图像大部分为空白，deflate（LZ77 + Huffman，对游程友好）可以把帧
+压缩一到两个数量级。
+
+迭代时逐帧解码，视频与张量写出函数可以直接从存储中流式读取，
+无需一次性展开所有帧。
+"""
+import zlib
+from collections import deque
+
+import cv2
+import numpy as np
+
+
+def compose_frame(comp_grids, ratsnest=None, draw_debug=True):
+    """
+    由调试平面合成单通道帧，合成方式与 video_utils.create_video 相同：
+    边框/已放置组件 + 2*未放置组件，再叠加名称平面 (draw_debug) 与飞线图。
+    """
+    frame = np.squeeze(comp_grids[0]) + 2*np.squeeze(comp_grids[1])
+    if draw_debug is True and len(comp_grids) > 2:
+        frame = np.maximum(frame, np.squeeze(comp_grids[2]))
+    if ratsnest is not None:
+        frame = np.maximum(frame, np.squeeze(ratsnest))
+    return frame.astype(np.uint8, copy=False)
+
+
+class frame_store():
+    """
+    有界的合成帧序列（可选缩小与压缩）
+    """
+
+    def __init__(self, maxlen=1024, max_size=None, compress=True, level=1):
+        """
+        Args:
+            maxlen: 保留的帧数，超出时丢弃最早的帧
+            max_size: 帧最长边的像素数，更大的帧会被缩小 (cv2.INTER_AREA)；
+                None 表示保持渲染尺寸
+            compress: 是否在内存中以 zlib 压缩保存帧
+            level: zlib 压缩级别
+        """
+        self.maxlen = maxlen
+        self.max_size = max_size
+        self.compress = compress
+        self.level = level
+        self.frames = deque(maxlen=maxlen)
+
+    def _resize(self, frame):
+        if self.max_size is None:
+            return frame
+        scale = self.max_size / max(frame.shape)
+        if scale >= 1:
+            return frame
+        size = (max(1, int(frame.shape[1]*scale)), max(1, int(frame.shape[0]*scale)))
+        return cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+
+    def add(self, comp_grids, ratsnest=None, draw_debug=True):
+        """
+        合成、缩小并保存一步的帧
+        """
+        self.add_frame(compose_frame(comp_grids, ratsnest, draw_debug=draw_debug))
+
+    def add_frame(self, frame):
+        """
+        保存已经合成的单通道 uint8 帧
+        """
+        frame = np.ascontiguousarray(self._resize(frame), dtype=np.uint8)
+        if self.compress is True:
+            self.frames.append((frame.shape, zlib.compress(frame.tobytes(), self.level)))
+        else:
+            self.frames.append((frame.shape, frame))
+
+    def _decode(self, item):
+        shape, data = item
+        if self.compress is True:
+            return np.frombuffer(zlib.decompress(data), dtype=np.uint8).reshape(shape).copy()
+        return data.copy()
+
+    def __len__(self):
+        return len(self.frames)
+
+    def __getitem__(self, idx):
+        return self._decode(self.frames[idx])
+
+    def __iter__(self):
+        for item in self.frames:
+            yield self._decode(item)
+
+    def nbytes(self):
+        """
+        已保存帧占用的内存（字节）
+        """
+        return sum(len(data) if self.compress is True else data.nbytes
+                   for _, data in self.frames)
+
+    def copy(self, last=None):
+        """
+        共享帧数据的浅拷贝（已保存的帧不会再被修改）
+
+        Args:
+            last: 只拷贝最后 last 帧，None 表示全部
+        """
+        store = frame_store(maxlen=self.maxlen,
+                            max_size=self.max_size,
+                            compress=self.compress,
+                            level=self.level)
+        items = list(self.frames)
+        if last is not None:
+            items = items[-last:] if last > 0 else []
+        store.frames.extend(items)
+        return store
+
+    def clear(self):
+        self.frames.clear()
@@ -0,0 +1,159 @@
+"""
+训练步骤的轻量级性能剖析。
+
+环境、智能体与学习器在热点路径上用命名计时器记录耗时：
+
+    with profiler.timer("observation/draw"):
+        ...
+
+以及用计数器记录事件次数（例如观测缓存命中）。数据按名称累计，
+每 N 步由 log_and_eval_callback 导出到 TensorBoard 标量与 log_dir 下的
+CSV 文件后清零。
+
+未启用时 timer 返回共享的空上下文管理器，count 直接返回，开销只有一次
+属性判断与函数调用。
+"""
+import csv
+import os
+import time
+from contextlib import nullcontext
+
+_null_timer = nullcontext()
+
+
+class _timer():
+    __slots__ = ("profiler", "name", "start")
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.profiler.add(self.name, time.perf_counter() - self.start)
+        return False
+
+
+class profiler():
+    """
+    命名计时器与计数器的累计器
+    """
+
+    def __init__(self, enabled=True):
+        """
+        Args:
+            enabled: 是否记录；False 时所有操作都是空操作
+        """
+        self.enabled = enabled
+        self.reset()
+
+    def reset(self):
+        """
+        清空累计数据，开始新的统计区间
+        """
+        self.timings = {}       # 名称 -> [调用次数, 总耗时 (秒)]
+        self.counters = {}      # 名称 -> 次数
+        self.steps = 0          # 区间内的环境步数
+
+    def timer(self, name):
+        """
+        返回记录 name 耗时的上下文管理器
+        """
+        if self.enabled is False:
+            return _null_timer
+        return _timer(self, name)
+
+    def add(self, name, seconds):
+        """
+        直接累计一次耗时
+        """
+        entry = self.timings.get(name)
+        if entry is None:
+            self.timings[name] = [1, seconds]
+        else:
+            entry[0] += 1
+            entry[1] += seconds
+
+    def count(self, name, n=1):
+        """
+        计数器 name 增加 n
+        """
+        if self.enabled is False:
+            return
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def step(self):
+        """
+        记录一个环境步，用于计算每步耗时
+        """
+        if self.enabled is False:
+            return
+        self.steps += 1
+
+    def summary(self):
+        """
+        当前区间的统计结果
+
+        Returns:
+            list: 每个计时器/计数器一项，按名称排序：
+                {"name", "calls", "total_ms", "ms_per_call", "ms_per_step"}；
+                计数器的 total_ms 等为 None，calls 为计数值
+        """
+        steps = max(self.steps, 1)
+        rows = []
+        for name in sorted(self.timings):
+            calls, seconds = self.timings[name]
+            rows.append({"name": name,
+                         "calls": calls,
+                         "total_ms": seconds * 1000,
+                         "ms_per_call": seconds * 1000 / calls,
+                         "ms_per_step": seconds * 1000 / steps})
+        for name in sorted(self.counters):
+            rows.append({"name": name,
+                         "calls": self.counters[name],
+                         "total_ms": None,
+                         "ms_per_call": None,
+                         "ms_per_step": None})
+        return rows
+
+    def export(self, global_step, writer=None, csv_file=None):
+        """
+        导出当前区间的统计结果并清零
+
+        Args:
+            global_step: 训练步数，作为 TensorBoard 的 global_step 与 CSV 的第一列
+            writer: TensorBoard SummaryWriter（可选），计时器写入
+                profile/<名称>/ms_per_step，计数器写入 profile/<名称>/per_step
+            csv_file: CSV 文件路径（可选），不存在时写入表头后追加
+        """
+        if self.enabled is False:
+            return
+        rows = self.summary()
+        steps = max(self.steps, 1)
+
+        if writer is not None:
+            for row in rows:
+                if row["total_ms"] is None:
+                    writer.add_scalar(tag=f"profile/{row['name']}/per_step",
+                                      scalar_value=row["calls"] / steps,
+                                      global_step=global_step)
+                else:
+                    writer.add_scalar(tag=f"profile/{row['name']}/ms_per_step",
+                                      scalar_value=row["ms_per_step"],
+                                      global_step=global_step)
+
+        if csv_file is not None:
+            new_file = not os.path.isfile(csv_file)
+            with open(csv_file, "a", newline="", encoding="utf-8") as f:
+                w = csv.writer(f)
+                if new_file:
+                    w.writerow(["timesteps", "steps", "name", "calls",
+                                "total_ms", "ms_per_call", "ms_per_step"])
+                for row in rows:
+                    w.writerow([global_step, self.steps, row["name"], row["calls"],
+                                row["total_ms"], row["ms_per_call"], row["ms_per_step"]])
+
+        self.reset()
@@ -1,5 +1,6 @@
 import cv2
 from datetime import datetime
+from itertools import chain
 import numpy as np
 import torch
 
@@ -69,63 +70,8 @@ def create_video(all_comp_grids,
                     (128, 128, 0),
                     2)
 
-        accumulated_reward = 0
         if all_metrics is not None and frame > 0:
-            height_mult = 0.04
-            total_cost = 0
-            total_reward = 0
-            total_nodes = 0
-            for item in all_metrics[frame-1]:
-                # For five components
-                cv2.putText(metrics_img,
-                            f"id; cost    : {item['id']} ({item['name']}); {np.round(item['weighted_cost'],2)} ({np.round(item['reward'],2)})",
-                            (int(0.02*width), int(height_mult*height)),
-                            cv2.FONT_HERSHEY_SIMPLEX,
-                            0.4,
-                            (128, 128, 0),
-                            1)
-                height_mult += 0.04
-                cv2.putText(metrics_img,
-                            f"rW; rHPWL   : {np.round(item['W'],2)} ({np.round(item['We'],2)}); {np.round(item['HPWL'],2)} ({np.round(item['HPWLe'],2)})", (int(0.02*width), int(height_mult*height)),
-                            cv2.FONT_HERSHEY_SIMPLEX,
-                            0.4,
-                            (128, 128, 0),
-                            1)
-                height_mult += 0.04
-                cv2.putText(metrics_img,
-                            f"ol           : {np.round(item['ol'],2)}", (int(0.02*width), int(height_mult*height)),
-                            cv2.FONT_HERSHEY_SIMPLEX,
-                            0.4,
-                            (128, 128, 0),
-                            1)
-
-                total_cost += item["weighted_cost"]
-                total_reward += item["reward"]
-                total_nodes += 1
-                height_mult += 0.075
-
-            cv2.putText(metrics_img,
-                        f"Average cost        : {np.round(total_cost/total_nodes,2)}",
-                        (int(0.02*width), int(0.85*height)),
-                        cv2.FONT_HERSHEY_SIMPLEX,
-                        0.4,
-                        (128, 128, 0),
-                        1)
-            cv2.putText(metrics_img,
-                        f"Average reward      : {np.round(total_reward/total_nodes,2)}",
-                        (int(0.02*width), int(0.9*height)),
-                        cv2.FONT_HERSHEY_SIMPLEX,
-                        0.4,
-                        (128, 128, 0),
-                        1)
-            accumulated_reward += total_reward/total_nodes
-            cv2.putText(metrics_img,
-                        f"Accumulated reward      : {np.round(accumulated_reward,2)}",
-                        (int(0.02*width), int(0.95*height)),
-                        cv2.FONT_HERSHEY_SIMPLEX,
-                        0.4,
-                        (128, 128, 0),
-                        1)
+            draw_metrics(metrics_img, all_metrics[frame-1], width, height)
 
         if all_metrics is not None:
             metrics_img = np.reshape(metrics_img,
@@ -139,6 +85,67 @@ def create_video(all_comp_grids,
 
     video.release()
 
+def draw_metrics(metrics_img, metrics, width, height):
+    """
+    Draws the per component metrics of one step onto metrics_img.
+    """
+    accumulated_reward = 0
+    height_mult = 0.04
+    total_cost = 0
+    total_reward = 0
+    total_nodes = 0
+    for item in metrics:
+        # For five components
+        cv2.putText(metrics_img,
+                    f"id; cost    : {item['id']} ({item['name']}); {np.round(item['weighted_cost'],2)} ({np.round(item['reward'],2)})",
+                    (int(0.02*width), int(height_mult*height)),
+                    cv2.FONT_HERSHEY_SIMPLEX,
+                    0.4,
+                    (128, 128, 0),
+                    1)
+        height_mult += 0.04
+        cv2.putText(metrics_img,
+                    f"rW; rHPWL   : {np.round(item['W'],2)} ({np.round(item['We'],2)}); {np.round(item['HPWL'],2)} ({np.round(item['HPWLe'],2)})", (int(0.02*width), int(height_mult*height)),
+                    cv2.FONT_HERSHEY_SIMPLEX,
+                    0.4,
+                    (128, 128, 0),
+                    1)
+        height_mult += 0.04
+        cv2.putText(metrics_img,
+                    f"ol           : {np.round(item['ol'],2)}", (int(0.02*width), int(height_mult*height)),
+                    cv2.FONT_HERSHEY_SIMPLEX,
+                    0.4,
+                    (128, 128, 0),
+                    1)
+
+        total_cost += item["weighted_cost"]
+        total_reward += item["reward"]
+        total_nodes += 1
+        height_mult += 0.075
+
+    cv2.putText(metrics_img,
+                f"Average cost        : {np.round(total_cost/total_nodes,2)}",
+                (int(0.02*width), int(0.85*height)),
+                cv2.FONT_HERSHEY_SIMPLEX,
+                0.4,
+                (128, 128, 0),
+                1)
+    cv2.putText(metrics_img,
+                f"Average reward      : {np.round(total_reward/total_nodes,2)}",
+                (int(0.02*width), int(0.9*height)),
+                cv2.FONT_HERSHEY_SIMPLEX,
+                0.4,
+                (128, 128, 0),
+                1)
+    accumulated_reward += total_reward/total_nodes
+    cv2.putText(metrics_img,
+                f"Accumulated reward      : {np.round(accumulated_reward,2)}",
+                (int(0.02*width), int(0.95*height)),
+                cv2.FONT_HERSHEY_SIMPLEX,
+                0.4,
+                (128, 128, 0),
+                1)
+
 def video_frames(all_comp_grids, ratsnest, v_id=None):
     width = all_comp_grids[0][0].shape[0]
     height = all_comp_grids[0][0].shape[1]
@@ -247,3 +254,103 @@ def get_video_tensor(all_comp_grids, ratsnest):
     video_tensor = torch.tensor(np.array(frame_buf))
     video_tensor = video_tensor.view([1,frames,channels,height,width])
     return video_tensor
+
+def create_video_from_frames(frames,
+                             fileName=None,
+                             v_id=None,
+                             all_metrics=None,
+                             fps=30):
+    """
+    Streams composed single channel frames (e.g. a core.frame_store) into an
+    .mp4 file. Equivalent to create_video(..., draw_debug=True) without
+    keeping the decoded frames in memory.
+    """
+    frames = iter(frames)
+    first = next(frames, None)
+    if first is None:
+        return
+
+    height, width = first.shape[:2]
+    channel = 1
+    video_width = width
+    if all_metrics is not None:
+        metrics_width = int(1*width)
+        video_width = width + metrics_width
+
+    fourcc = cv2.VideoWriter_fourcc(*"mp4v")
+
+    ts = datetime.now().strftime("%s_%f")
+
+    if fileName is None:
+        fileName = f"{ts}_video.mp4"
+
+    video = cv2.VideoWriter(fileName, fourcc, float(
+        fps), (video_width, height), False)
+
+    if v_id is not None:
+        for _ in range(fps):
+            img = np.zeros((height, video_width, 1), np.uint8)
+            (text_width, text_height) = cv2.getTextSize(text=f"{v_id}",
+            fontFace = cv2.FONT_HERSHEY_SIMPLEX,
+                fontScale = 5,
+                thickness=2
+                )[0]
+
+            cv2.putText(img,
+            f"{v_id}",
+            (int(0.5*video_width - text_width/2), int(0.5*height + text_height/2)),
+            cv2.FONT_HERSHEY_SIMPLEX,
+            6,
+            (128, 128, 0),
+            3
+            )
+            video.write(img)
+
+    for frame, img in enumerate(chain([first], frames)):
+        cv2.putText(img, f"{frame}",
+                    (int(0.075*width), int(0.1*height)),
+                    cv2.FONT_HERSHEY_SIMPLEX,
+                    0.85, # 0.85 is the font scale
+                    (128, 128, 0),
+                    2)
+
+        if all_metrics is not None:
+            metrics_img = np.zeros((height, metrics_width, channel),
+                                   dtype = np.uint8)
+            if frame > 0:
+                draw_metrics(metrics_img, all_metrics[frame-1], width, height)
+            metrics_img = np.reshape(metrics_img,
+                                     (metrics_img.shape[0],metrics_img.shape[1]))
+            video.write(cv2.hconcat([img,metrics_img]))
+        else:
+            video.write(img)
+
+    video.release()
+
+def get_video_tensor_from_frames(frames):
+    """
+    (1, frames, 3, height, width) uint8 tensor of composed single channel
+    frames, for tensorboard.
+    """
+    channels = 3
+    n_frames = len(frames)
+    if n_frames == 0:
+        return None
+
+    frame_buf = None
+    for frame_number, frame in enumerate(frames):
+        height, width = frame.shape[:2]
+        if frame_buf is None:
+            frame_buf = np.zeros((n_frames, channels, height, width), np.uint8)
+
+        cv2.putText(frame, f"{frame_number}",
+                    (int(0.075*width),int(0.1*height)),
+                    cv2.FONT_HERSHEY_SIMPLEX,
+                    0.85,    # 0.85 is the font scale
+                    (128, 128, 0),
+                    2)
+        frame_buf[frame_number] = frame
+
+    video_tensor = torch.from_numpy(frame_buf)
+    video_tensor = video_tensor.view([1,n_frames,channels,height,width])
+    return video_tensor
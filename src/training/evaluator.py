@@ -0,0 +1,420 @@
+"""
+Policy evaluation episodes, in-process, on a process pool or on a separate
+evaluator process.
+
+evaluate_policy runs the evaluation episodes of log_and_eval_callback.evaluate
+on a given policy network: every episode steps its own evaluation environment
+deterministically, optionally saves the best layouts at 0%, 10% and 20%
+overlap, and hands videos and run logs to an artifact_writer.
+
+Episodes are described by (pcb_idx, run, seed) jobs (evaluation_jobs) and
+executed by run_evaluation_jobs, sequentially or distributed across a
+process pool. Each job seeds its own environment and the results are
+collected in job order, so they are the same for any number of workers.
+
+async_evaluator runs evaluate_policy on a separate (spawned) process. The
+caller snapshots the policy weights (policy_snapshot) and the expert targets
+(environment.get_target_params) at submission time, so training keeps running
+while the evaluator works on a frozen copy. Finished results are collected
+with poll() and logged by the caller; the evaluator process logs its videos
+to its own tensorboard event file in the same log directory.
+"""
+import copy
+import os
+import multiprocessing as mp
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+import numpy as np
+import torch
+
+from core.environment.environment import environment
+from core.environment.utils import get_pcb_num
+from core.environment.vec_environment import worker_seeds
+from artifact_writer import artifact_writer
+
+
+def policy_snapshot(policy):
+    """
+    Detached CPU copy of a policy network (SAC.policy or TD3.actor).
+    """
+    snapshot = copy.deepcopy(policy).to("cpu")
+    snapshot.device = torch.device("cpu")
+    snapshot.eval()
+    return snapshot
+
+
+def apply_target_params(env, target_params):
+    """
+    Overwrite the expert targets (We, HPWLe) of the environment agents with
+    target_params (environment.get_target_params), matched by node id.
+    """
+    for item in target_params:
+        for agnt in env.agents:
+            if item["id"] == agnt.parameters.node.get_id():
+                agnt.We = item["We"]
+                agnt.HPWLe = item["HPWLe"]
+
+
+def evaluation_jobs(num_pcbs: int, runs: int, seed: int, idx: int = -1):
+    """
+    Deterministic (pcb_idx, run, seed) evaluation jobs.
+    :param num_pcbs: Number of layouts in the pcb file
+    :param runs: Number of episodes
+    :param seed: Base seed; every episode gets an independent seed derived
+     from it
+    :param idx: Layout of every episode; -1 draws a layout per episode from
+     the base seed
+    :return: List of (pcb_idx, run, seed) tuples
+    """
+    rng = np.random.default_rng(seed=seed)
+    jobs = []
+    for run, run_seed in enumerate(worker_seeds(seed, runs)):
+        pcb_idx = int(rng.integers(num_pcbs)) if idx == -1 else idx
+        jobs.append((pcb_idx, run, run_seed))
+    return jobs
+
+
+def _job_worker(fn, job, kwargs):
+    # runs on a pool process; one thread per process
+    torch.set_num_threads(1)
+    with torch.no_grad():
+        return fn(job, **kwargs)
+
+
+def run_evaluation_jobs(fn, jobs, workers: int = 1, **kwargs):
+    """
+    Run fn(job, **kwargs) for every job, on a process pool when workers > 1.
+    Every job seeds its own environment, so the results do not depend on the
+    number of workers or on the completion order.
+    :param fn: Module level function (picklable) running one job
+    :param jobs: List of jobs, e.g. from evaluation_jobs
+    :param workers: Number of worker processes, defaults to 1 (in-process)
+    :return: Results of fn in job order
+    """
+    if workers <= 1 or len(jobs) <= 1:
+        return [fn(job, **kwargs) for job in jobs]
+
+    with ProcessPoolExecutor(max_workers=min(workers, len(jobs)),
+                             mp_context=mp.get_context("spawn")) as executor:
+        futures = [executor.submit(_job_worker, fn, job, kwargs) for job in jobs]
+        return [future.result() for future in futures]
+
+
+def evaluation_episode(job,
+                       params,
+                       policy,
+                       rl_model_type: str,
+                       output_dir: str,
+                       num_evaluations: int,
+                       t: int = 0,
+                       target_params=None,
+                       quick_eval: bool = True,
+                       parameters_text: str = "",
+                       artifacts=None,
+                       return_snapshot: bool = False,
+                       verbose: int = 0):
+    """
+    Run one deterministic evaluation episode on its own environment.
+    :param job: (pcb_idx, run, seed), see evaluation_jobs
+    :param return_snapshot: Return the tracker snapshot of the episode, e.g.
+     to log its video to tensorboard, defaults to False
+    :return: Dictionary with run, pcb_idx, seed, reward, steps and the best
+     hpwl at 0%, 10% and 20% overlap (1E6 when not reached or quick_eval)
+    :rtype: dict
+
+    See evaluate_policy for the other arguments.
+    """
+    pcb_idx, i, seed = job
+
+    close_artifacts = artifacts is None
+    if artifacts is None:
+        artifacts = artifact_writer(max_workers=1)
+
+    file_best_hpwl_zero_overlap = "best_hpwl_zero_overlap"
+    file_best_hpwl_10_overlap = "best_hpwl_10_overlap"
+    file_best_hpwl_20_overlap = "best_hpwl_20_overlap"
+
+    params = copy.deepcopy(params)
+    params.idx = pcb_idx
+    params.seed = seed
+    eval_env = environment(params)
+    # evaluate always writes a video of every episode
+    eval_env.record_video = True
+
+    if verbose > 1:
+        print(f"Starting evaluation {i}/{num_evaluations} with pcb {eval_env.idx}.")
+
+    run_output_dir = os.path.join(output_dir, f"run_{i}")
+    if os.path.isdir(run_output_dir) is False:
+        os.makedirs(run_output_dir)
+
+    evaluation_log = open(os.path.join(run_output_dir,"evaluation.log"), "w", encoding="utf-8")
+    evaluation_log.write(f"timestamp={datetime.now().strftime('%Y-%m-%d %H:%M:%S:%f')}\r\n")
+    evaluation_log.write("parameters begin\r\n")
+    evaluation_log.write(parameters_text)
+    evaluation_log.write("parameters end\r\n")
+
+    best_hpwl = {file_best_hpwl_zero_overlap: 1E6,
+                 file_best_hpwl_10_overlap: 1E6,
+                 file_best_hpwl_20_overlap: 1E6}
+
+    eval_env.reset()
+    # agents are rebuilt on reset
+    if target_params is not None:
+        apply_target_params(eval_env, target_params)
+
+    done = False
+    episode_reward = 0
+    episode_steps=0
+    while not done:
+        episode_steps += 1
+        obs_vec = eval_env.step(model=policy,
+                                random=False,
+                                deterministic=True,
+                                rl_model_type=rl_model_type)
+        step_reward=0
+
+        if quick_eval is False: # save best layouts
+            hpwl = eval_env.calc_hpwl()
+
+            all_ol = []
+            for indiv_obs in obs_vec:
+                next_state_ol = indiv_obs[1][8:16]
+                ol_ratios = indiv_obs[-1]["ol_ratios"]
+                all_ol.append(np.sum(np.array(next_state_ol)*np.array(ol_ratios))*100)
+
+            max_ol = np.max(all_ol)
+            for best_file, legal, label in (
+                    (file_best_hpwl_zero_overlap, max_ol < 1, "Zero overlap"),
+                    (file_best_hpwl_10_overlap, max_ol <= 10, "10% overlap"),
+                    (file_best_hpwl_20_overlap, max_ol <= 20, "20% overlap")):
+                if (hpwl >= best_hpwl[best_file]) or not legal:
+                    continue
+                best_hpwl[best_file] = hpwl
+
+                filename = best_file + f"_{t}k_{i}.{num_evaluations-1}.{episode_steps}.pcb"
+                eval_env.write_current_pcb_file(path=run_output_dir, filename=filename)
+                message = f"run={i}/{num_evaluations-1} @ episode_step={episode_steps} : {label} best hpwl : hpwl={np.round(hpwl,4)}, overlap={np.round(np.sum(all_ol)/8,4)}"
+                evaluation_log.write(message + "\r\n")
+                evaluation_log.write(f"all_ol={all_ol}\r\n")
+
+                # Capture snapshot
+                snapshot_filename=f"{i}.{num_evaluations-1}.{episode_steps}"
+                artifacts.submit(
+                    eval_env.tracker.snapshot(last=1).capture_snapshot,
+                    fileName=os.path.join(run_output_dir,
+                                          snapshot_filename+".png")
+                                          )
+                # the board was serialized above; copy it instead of
+                # writing the same layout again
+                artifacts.copy_file(
+                    os.path.join(run_output_dir, filename),
+                    os.path.join(run_output_dir, snapshot_filename+".pcb"))
+                # overwrite best; unique filename for easier processing
+                # with automated tools
+                artifacts.copy_file(
+                    os.path.join(run_output_dir, filename),
+                    os.path.join(run_output_dir, best_file+".pcb"))
+                if verbose == 1:
+                    print(message)
+
+        for indiv_obs in obs_vec:
+            step_reward += indiv_obs[2]
+            if indiv_obs[4] is True:
+                done = True
+
+        step_reward /= len(obs_vec)
+        episode_reward += step_reward
+
+    evaluation_log.write(f"eval_env episode {i} performed {episode_steps} in environment.\r\n")
+    evaluation_log.close()
+    if verbose == 1:
+        print(f"eval_env episode {i} performed {episode_steps} in environment.")
+    # encode the video and write the run log asynchronously from a
+    # snapshot of the tracker
+    snapshot = eval_env.tracker.snapshot()
+    artifacts.submit(
+        snapshot.create_video,
+        fileName=os.path.join(run_output_dir, f"{i}.mp4"),
+        display_metrics=False)
+
+    # eval_env.tracker.create_plot(fileName=os.path.join(video_path,
+    #                                                    f'{i}.png'))
+    artifacts.submit(
+        snapshot.log_run_to_file,
+        path=run_output_dir, filename=f"{i}.log",
+        kicad_pcb=eval_env.g.get_kicad_pcb_file()
+        )
+
+    if close_artifacts is True:
+        artifacts.close()
+
+    result = {"run": i,
+              "pcb_idx": pcb_idx,
+              "seed": seed,
+              "reward": episode_reward,
+              "steps": episode_steps,
+              "best_hpwl_zero_overlap": best_hpwl[file_best_hpwl_zero_overlap],
+              "best_hpwl_10_overlap": best_hpwl[file_best_hpwl_10_overlap],
+              "best_hpwl_20_overlap": best_hpwl[file_best_hpwl_20_overlap]}
+    if return_snapshot is True:
+        result["snapshot"] = snapshot
+    return result
+
+
+def evaluate_policy(params,
+                    policy,
+                    rl_model_type: str,
+                    output_dir: str,
+                    num_evaluations: int,
+                    t: int = 0,
+                    target_params=None,
+                    quick_eval: bool = True,
+                    video_tag: str = "evaluation_run",
+                    parameters_text: str = "",
+                    artifacts=None,
+                    log_video=None,
+                    workers: int = 1,
+                    verbose: int = 0):
+    """
+    Run num_evaluations deterministic evaluation episodes.
+    :param params: Environment parameters of the evaluation environment;
+     params.seed is the base seed of the episodes and params.idx selects the
+     layout (-1: one drawn per episode)
+    :param policy: Policy network (SAC.policy or TD3.actor)
+    :param rl_model_type: "SAC" or "TD3"
+    :param output_dir: Directory that receives one run_{i} directory per
+     episode
+    :param num_evaluations: Number of episodes
+    :param t: Training timesteps in thousands, used in layout filenames
+    :param target_params: Expert targets to apply to the agents, defaults to
+     None (keep the targets of the pcb file)
+    :param quick_eval: When False saves the best layouts of every episode,
+     defaults to True
+    :param video_tag: Tensorboard tag of the episode videos
+    :param parameters_text: Text written to the parameters section of every
+     evaluation.log
+    :param artifacts: artifact_writer that persists videos, logs and
+     snapshots of in-process episodes; defaults to None (a private writer,
+     closed on return)
+    :param log_video: Callable (snapshot, tag, global_step) that logs an
+     episode video to tensorboard, defaults to None (no tensorboard video)
+    :param workers: Number of processes running episodes in parallel,
+     defaults to 1 (in-process). Results do not depend on it.
+    :param verbose: function verbosity, defaults to 0
+    :return: List containing the average reward per episode and average
+     steps per episode
+    :rtype: list
+    """
+    close_artifacts = artifacts is None
+    if artifacts is None:
+        artifacts = artifact_writer(max_workers=1)
+
+    jobs = evaluation_jobs(num_pcbs=get_pcb_num(params.pcb_file),
+                           runs=num_evaluations,
+                           seed=params.seed,
+                           idx=params.idx)
+    results = run_evaluation_jobs(
+        evaluation_episode,
+        jobs,
+        workers=workers,
+        params=params,
+        policy=policy if workers <= 1 else policy_snapshot(policy),
+        rl_model_type=rl_model_type,
+        output_dir=output_dir,
+        num_evaluations=num_evaluations,
+        t=t,
+        target_params=target_params,
+        quick_eval=quick_eval,
+        parameters_text=parameters_text,
+        # pool processes write their own artifacts
+        artifacts=artifacts if workers <= 1 else None,
+        return_snapshot=log_video is not None,
+        verbose=verbose)
+
+    if log_video is not None:
+        for result in results:
+            artifacts.submit(log_video, result.pop("snapshot"),
+                             tag=video_tag, global_step=result["run"])
+
+    if close_artifacts is True:
+        artifacts.close()
+
+    return [sum(r["reward"] for r in results) / num_evaluations,
+            sum(r["steps"] for r in results) / num_evaluations]
+
+
+def _evaluation_worker(log_dir, kwargs):
+    # runs on the evaluator process; leave the cores to training
+    torch.set_num_threads(1)
+
+    from torch.utils.tensorboard import SummaryWriter
+    writer = SummaryWriter(log_dir=log_dir, filename_suffix=".evaluator")
+
+    def log_video(snapshot, tag="evaluation_run", global_step=0):
+        vids = snapshot.video_tensor()
+        if vids is not None:
+            writer.add_video(tag=tag, vid_tensor=vids,
+                             global_step=global_step, fps=30)
+            writer.flush()
+
+    try:
+        with torch.no_grad():
+            return evaluate_policy(log_video=log_video, **kwargs)
+    finally:
+        writer.close()
+
+
+class async_evaluator():
+    def __init__(self, log_dir: str, max_pending: int = 2):
+        """
+        :param log_dir: Tensorboard log directory of the evaluator process
+        :param max_pending: Maximum number of queued or running evaluations;
+         submit blocks until the oldest one finished when exceeded.
+        """
+        self.log_dir = log_dir
+        self.max_pending = max_pending
+        self.executor = ProcessPoolExecutor(max_workers=1,
+                                            mp_context=mp.get_context("spawn"))
+        self.pending = deque()
+        self.finished = []
+
+    def submit(self, key, **kwargs):
+        """
+        Queue evaluate_policy(**kwargs) on the evaluator process. The policy
+        and target_params must be snapshots that the caller no longer
+        modifies.
+        :param key: Returned by poll() together with the result, e.g. the
+         global step and dataset of the evaluation
+        """
+        while len(self.pending) >= self.max_pending:
+            k, future = self.pending.popleft()
+            self.finished.append((k, future.result()))
+        self.pending.append((key, self.executor.submit(_evaluation_worker,
+                                                       self.log_dir,
+                                                       kwargs)))
+
+    def poll(self, wait: bool = False):
+        """
+        Collect finished evaluations in submission order.
+        :param wait: Block until every pending evaluation finished
+        :return: List of (key, [mean episode reward, mean episode steps])
+        """
+        while len(self.pending) > 0 and (wait is True or self.pending[0][1].done()):
+            k, future = self.pending.popleft()
+            self.finished.append((k, future.result()))
+        finished = self.finished
+        self.finished = []
+        return finished
+
+    def close(self):
+        """
+        Wait for the pending evaluations and stop the evaluator process.
+        :return: The results that were not collected yet (see poll)
+        """
+        try:
+            return self.poll(wait=True)
+        finally:
+            self.executor.shutdown(wait=True)
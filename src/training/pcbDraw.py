@@ -14,16 +14,24 @@ from graph import node
 from graph import edge
 from graph_utils import kicad_rotate
 import sys
-from pcb_board import board_mask
+from pcb_board import board_mask, board_mask_plane
 
 r = 0.02    # resolution in mm
 
+def _resolution(resolution):
+    """
+    Resolution used by a drawing call: the module resolution unless an
+    explicit (e.g. reduced, for debug rendering) resolution is given.
+    """
+    return r if resolution is None else resolution
+
 def draw_board_from_board_and_graph(b,
                                     g,
                                     draw_placed=True,
                                     draw_unplaced=True,
                                     padding=None,
-                                    line_thickness=-1):
+                                    line_thickness=-1,
+                                    resolution=None):
     """
     Parameters
     ----------
@@ -43,6 +51,7 @@ def draw_board_from_board_and_graph(b,
         drawing containing the board with the placed components. Position 1
         contains the unplaced component.
     """
+    r = _resolution(resolution)
     nv = g.get_nodes()
 
     # Setup grid
@@ -104,7 +113,8 @@ def draw_board_from_board_and_graph_with_debug(b,
                                                draw_placed=True,
                                                draw_unplaced=True,
                                                padding=None,
-                                               line_thickness=-1):
+                                               line_thickness=-1,
+                                               resolution=None):
     """
     从PCB板和图形对象生成调试用的可视化图像
     
@@ -125,6 +135,9 @@ def draw_board_from_board_and_graph_with_debug(b,
         图像边距（毫米），默认为None（无边距）
     line_thickness : int, optional
         绘制线条的厚度，-1表示填充，默认为-1
+    resolution : float, optional
+        绘制分辨率（毫米/像素），None表示使用模块分辨率；调试渲染可使用
+        更低的分辨率以减少绘制开销和内存占用
 
     Returns
     -------
@@ -132,6 +145,8 @@ def draw_board_from_board_and_graph_with_debug(b,
         [已放置组件图像, 未放置组件图像, 组件名称图像]
         每个图像都是灰度图像，尺寸为 (H, W, 1)
     """
+    r = _resolution(resolution)
+
     # 获取图形中的所有节点（组件）
     nv = g.get_nodes()
 
@@ -151,17 +166,12 @@ def draw_board_from_board_and_graph_with_debug(b,
     
     # 生成PCB板的掩码图像（异形边框）
     if padding is not None:
-        # 有边距时，生成包含边距的板掩码
-        mask=board_mask(x*r+2*padding,y*r+2*padding,r)
-        mask = np.max(mask, axis=0)              # 8通道合并成1通道
-        mask = np.expand_dims(mask, axis=-1)     # 调整维度 (H, W, 1)
-        grid_comps[0] = mask
+        # 有边距时，生成包含边距的板掩码（缓存的单通道只读掩码）
+        mask = board_mask_plane(x*r+2*padding,y*r+2*padding,r)
     else:
         # 无边距时，生成原始尺寸的板掩码
-       mask = board_mask(x*r, y*r, r)
-       mask = np.max(mask, axis=0)
-       mask = np.expand_dims(mask, axis=-1)
-       grid_comps[0] = mask
+        mask = board_mask_plane(x*r, y*r, r)
+    grid_comps[0] = mask[..., np.newaxis]   # 调整维度 (H, W, 1)
 
     # 遍历所有节点（组件），绘制每个组件
     for n in nv:
@@ -202,7 +212,8 @@ def draw_board_from_board_and_graph_with_debug(b,
             tmp = draw_node_name(n,
                                  b.get_height(),
                                  b.get_width(),
-                                 padding=padding)
+                                 padding=padding,
+                                 resolution=r)
             tmp = np.reshape(tmp,(tmp.shape[0],tmp.shape[1],1))
             # 将名称标签叠加到第三个通道
             grid_comps[2] = np.maximum(tmp, grid_comps[2])
@@ -241,7 +252,8 @@ def draw_board_from_board_and_graph_multi_agent(b, g,
                                                 draw_placed=True,
                                                 draw_unplaced=True,
                                                 padding=None,
-                                                line_thickness=-1):
+                                                line_thickness=-1,
+                                                resolution=None):
     """
     Parameters
     ----------
@@ -261,6 +273,7 @@ def draw_board_from_board_and_graph_multi_agent(b, g,
         drawing containing the board with the placed components. Position 1
         contains the unplaced component.
     """
+    r = _resolution(resolution)
     nv = g.get_nodes()
 
     # Setup grid
@@ -322,7 +335,8 @@ def draw_board_from_board_and_graph_multi_agent(b, g,
         print("draw_board_from_board_and_graph_multi_agent requires padding.")
         sys.exit()
 
-def draw_comps_from_nodes_and_edges(n, nn, e, b, padding=None):
+def draw_comps_from_nodes_and_edges(n, nn, e, b, padding=None, resolution=None):
+    r = _resolution(resolution)
     # Setup grid
     x = b.get_width() / r
     y = b.get_height() / r
@@ -407,7 +421,9 @@ def draw_board_from_nodes_and_edges_multi_agent(n,
                                                 e,
                                                 bx,
                                                 by,
-                                                padding=None):
+                                                padding=None,
+                                                resolution=None):
+    r = _resolution(resolution)
     # Setup grid
     x = bx / r
     y = by / r
@@ -491,12 +507,21 @@ def draw_board_from_nodes_and_edges_multi_agent(n,
 # idx = 0 ( grid border )
 # idx = 1 ( current node  )
 # idx = 2 ... ( neighbors ... )
-def draw_board_from_graph_multi_agent(g, node_id, bx, by, padding=None):
+def draw_board_from_graph_multi_agent(g, node_id, bx, by, padding=None,
+                                      resolution=None, nodes=None):
+    # nodes - optional subset of g.get_nodes() to draw, e.g. the components
+    # near node_id returned by a spatial index. The current node is always
+    # drawn.
+    r = _resolution(resolution)
     # Setup grid
     x = bx / r
     y = by / r
 
-    all_nodes = g.get_nodes()
+    if nodes is None:
+        all_nodes = g.get_nodes()
+    else:
+        all_nodes = [n for n in nodes if n.get_id() != node_id]
+        all_nodes.append(g.get_node_by_id(node_id))
 
     if padding is not None:
         grid_comps = np.zeros(
@@ -559,7 +584,9 @@ def draw_board_from_graph_multi_agent(g, node_id, bx, by, padding=None):
         return grid_comps
 
 # only comp_grids[0] is used.
-def draw_board_from_nodes_multi_agent(n, bx, by, padding=None):
+def draw_board_from_nodes_multi_agent(n, bx, by, padding=None,
+                                      resolution=None):
+    r = _resolution(resolution)
     # Setup grid
     x = bx / r
     y = by / r
@@ -618,7 +645,8 @@ def draw_ratsnest_with_board(current_node,
                              b,
                              line_thickness=1,
                              padding=None,
-                             ignore_power=False):
+                             ignore_power=False,
+                             resolution=None):
     # Setup grid
     bx = b.get_height()
     by = b.get_width()
@@ -630,7 +658,8 @@ def draw_ratsnest_with_board(current_node,
                          by,
                          line_thickness=line_thickness,
                          padding=padding,
-                         ignore_power=ignore_power)
+                         ignore_power=ignore_power,
+                         resolution=resolution)
 
 def draw_ratsnest(current_node,
                   neighbor_nodes,
@@ -639,7 +668,9 @@ def draw_ratsnest(current_node,
                   by,
                   line_thickness=1,
                   padding=None,
-                  ignore_power=False):
+                  ignore_power=False,
+                  resolution=None):
+    r = _resolution(resolution)
     x = bx / r
     y = by / r
 
@@ -723,7 +754,8 @@ def draw_los(pos_x,
              angle_offset,
              bx,
              by,
-             padding=None):
+             padding=None,
+             resolution=None):
     """
     Parameters
     ----------
@@ -745,6 +777,7 @@ def draw_los(pos_x,
     None.
 
     """
+    r = _resolution(resolution)
     x = bx / r
     y = by / r
     if padding is not None:
@@ -798,7 +831,8 @@ def draw_node_name(n,
                    by,
                    padding=None,
                    loc="top_right",
-                   designator_only=False):
+                   designator_only=False,
+                   resolution=None):
     """
     在图像上绘制组件名称标签
     
@@ -818,12 +852,15 @@ def draw_node_name(n,
         文本位置，可选"top_left"或"top_right"，默认为"top_right"
     designator_only : bool, optional
         是否只显示组件名称，True时只显示name，False时显示"id (name)"，默认为False
+    resolution : float, optional
+        绘制分辨率（毫米/像素），None表示使用模块分辨率
 
     Returns
     -------
     numpy.ndarray
         包含文本标签的灰度图像，尺寸为 (H, W, 1)
     """
+    r = _resolution(resolution)
 
     # 将物理尺寸转换为像素网格尺寸
     x = bx / r
@@ -915,6 +952,47 @@ def set_pcbDraw_resolution(resolution):
     global r
     r = resolution
 
+# auto_resolution 可选的栅格步长（毫米/像素），从细到粗
+RESOLUTION_LADDER = (0.01, 0.02, 0.025, 0.05, 0.1, 0.2, 0.25, 0.5)
+
+def auto_resolution(nodes, min_pixels=8, ladder=RESOLUTION_LADDER):
+    """
+    选择仍能分辨最小组件与最窄视线扇区的最粗分辨率
+
+    观测中的 los/ol/boardmask 都是像素比例，只要最小的组件外形和视线
+    扇区（半径 1.5*最大尺寸、张角 45°，弦长 2*R*sin(22.5°)）各至少覆盖
+    min_pixels 个像素，更细的栅格只会增加绘制与求和的开销。
+
+    Parameters
+    ----------
+    nodes : list
+        图中的节点（graph.get_nodes()）
+    min_pixels : int, optional
+        最小组件边长与最窄扇区弦长至少对应的像素数，默认为8
+    ladder : tuple, optional
+        可选的分辨率，从细到粗；只在其中选择以便不同板之间共享
+        board_mask 缓存并保持结果可复现
+
+    Returns
+    -------
+    float
+        ladder 中不超过上限的最粗分辨率；上限小于 ladder[0] 时返回 ladder[0]
+    """
+    limit = np.inf
+    for n in nodes:
+        size = n.get_size()
+        smallest = min(size[0], size[1])
+        if smallest <= 0:
+            continue
+        wedge = 2 * 1.5 * max(size[0], size[1]) * np.sin(np.pi / 8)
+        limit = min(limit, smallest / min_pixels, wedge / min_pixels)
+
+    resolution = ladder[0]
+    for res in ladder:
+        if res <= limit:
+            resolution = res
+    return resolution
+
 def setup_empty_grid(bx, by, resolution, padding=None):
     """
     创建空的图像网格
@@ -952,19 +1030,53 @@ def setup_empty_grid(bx, by, resolution, padding=None):
 
     return grid
 
+def get_los_window(node, board, radius, padding, resolution=None):
+    """
+    Bounding box of the line of sight circle on the (padded) grid.
+
+    Returns (r0, r1, c0, c1) so that grid[r0:r1, c0:c1] contains every pixel
+    that cv2.ellipse can draw for the line of sight segments of `node`.
+    """
+    res = _resolution(resolution)
+    pos = node.get_pos()
+    if padding is not None:
+        pad = int(padding/res)
+    else:
+        pad = 0
+    rows = int(board.get_width()/res) + 2*pad
+    cols = int(board.get_height()/res) + 2*pad
+
+    cx = int(pos[0]/res) + pad
+    cy = int(pos[1]/res) + pad
+    radius = int(radius / res)
+
+    r0 = min(max(cy - radius - 1, 0), rows)
+    r1 = max(min(cy + radius + 2, rows), r0)
+    c0 = min(max(cx - radius - 1, 0), cols)
+    c1 = max(min(cx + radius + 2, cols), c0)
+    return r0, r1, c0, c1
+
 def get_los_and_ol_multi_agent(node,
                                board,
                                radius,
                                grid_comps,
                                padding,
-                               los_type=0):
+                               los_type=0,
+                               crop=True,
+                               resolution=None):
     # type 0 - traditional case
     # type 1 - remove current node from the radius.
     # type 3 - cropped grid showing overlapping section
     # type 4 - cropped grid showing overlapping section and current node.
+    #
+    # crop (type 0 and 1 only) - work on the bounding box of the line of
+    # sight circle instead of the whole board. grid_comps may either be
+    # full grids or already cropped to get_los_window(...). The returned
+    # masks then have the window's shape; the ratios are unchanged since
+    # nothing outside the circle contributes to them.
 
     angle_offset = node.get_orientation()
-    res = pcbDraw_resolution()
+    res = _resolution(resolution)
     x = board.get_width() / res
     y = board.get_height() / res
     pos = node.get_pos()
@@ -976,36 +1088,32 @@ def get_los_and_ol_multi_agent(node,
         cx = int(pos[0]/res)
         cy = int(pos[1]/res)
 
-    radius = int(radius / res)
-
     if los_type in (0, 1):
         if padding is not None:
-            los_segments_mask = np.zeros(
-                (8,int(x)+2*int(padding/res),int(y)+2*int(padding/res)),
-                np.uint8)
-            los_segments = np.zeros(
-                (8,int(x)+2*int(padding/res),int(y)+2*int(padding/res)),
-                np.uint8)
-            overlap_segments_mask = np.zeros(
-                (8,int(x)+2*int(padding/res),int(y)+2*int(padding/res)),
-                np.uint8)
-            overlap_segments = np.zeros(
-                (8,int(x)+2*int(padding/res),int(y)+2*int(padding/res)),
-                np.uint8)
-            overlap_board_mask = np.zeros(
-                (8,int(x)+2*int(padding/res),int(y)+2*int(padding/res)),
-                np.uint8)
-            hebing=np.zeros(
-                (8,int(x)+2*int(padding/res),int(y)+2*int(padding/res)),
-                np.uint8)
+            grid_shape = (int(x)+2*int(padding/res), int(y)+2*int(padding/res))
         else:
-            los_segments_mask = np.zeros((8,int(x),int(y)), np.uint8)
-            los_segments = np.zeros((8,int(x),int(y)), np.uint8)
-            overlap_segments_mask = np.zeros((8,int(x),int(y)), np.uint8)
-            overlap_segments = np.zeros((8,int(x),int(y)), np.uint8)
-            overlap_board_mask = np.zeros((8,int(x),int(y)), np.uint8)
-            hebing=np.zeros((8,int(x),int(y)), np.uint8)
+            grid_shape = (int(x), int(y))
 
+        if crop:
+            r0, r1, c0, c1 = get_los_window(node, board, radius, padding,
+                                            resolution=res)
+        else:
+            r0, r1, c0, c1 = 0, grid_shape[0], 0, grid_shape[1]
+        shape = (r1-r0, c1-c0)
+        grid_comps = [g if g.shape == shape else g[r0:r1, c0:c1]
+                      for g in grid_comps]
+        cx -= c0
+        cy -= r0
+
+    radius = int(radius / res)
+
+    if los_type in (0, 1):
+        los_segments_mask = np.zeros((8,) + shape, np.uint8)
+        los_segments = np.zeros((8,) + shape, np.uint8)
+        overlap_segments_mask = np.zeros((8,) + shape, np.uint8)
+        overlap_segments = np.zeros((8,) + shape, np.uint8)
+        overlap_board_mask = np.zeros((8,) + shape, np.uint8)
+        hebing=np.zeros((8,) + shape, np.uint8)
 
         segment_mask_pixels = np.zeros(8)
         segment_pixels = np.zeros(8)
@@ -1018,6 +1126,7 @@ def get_los_and_ol_multi_agent(node,
            board_mask_img=board_mask(x*res+2*padding,y*res+2*padding,res)
         else: 
              board_mask_img=board_mask( x*res, y*res, res)#异形边框程序导入，获取二值图像
+        board_mask_img = board_mask_img[:, r0:r1, c0:c1]
         for i in range(8):
             cv2.ellipse(los_segments_mask[i],
                         (cx,cy),
@@ -1086,7 +1195,7 @@ def get_los_and_ol_multi_agent(node,
     if los_type in (3, 4):
         grid = setup_empty_grid(bx=board.get_width(),
                                 by=board.get_height(),
-                                resolution=pcbDraw_resolution(),
+                                resolution=res,
                                 padding=padding)
 
         cv2.circle(img=grid,
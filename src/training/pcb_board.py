@@ -1,4 +1,5 @@
 import os
+import functools
 import pandas as pd
 import numpy as np
 import cv2
@@ -6,20 +7,17 @@ import ast
 from pcb import pcb
 
 
-def board_mask(physical_height_mm,physical_width_mm, grid_step_mm):
+def default_board_csv_path():
     """
-    生成 (8, H, W) 的异形边框掩码，每张图像通道单独填充。
-    修复了坐标系统问题，确保正确的图像方向。
+    返回默认的异形边框点集文件路径 (board_csv/mokuai.csv)。
     """
     # 获取项目根目录
     project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-    csv_path = os.path.join(project_root, "board_csv", "mokuai.csv")
+    return os.path.join(project_root, "board_csv", "mokuai.csv")
 
-    # 正确的像素尺寸计算
-    grid_width = int(physical_width_mm / grid_step_mm)
-    grid_height = int(physical_height_mm / grid_step_mm)
-    row_index = 8
 
+@functools.lru_cache(maxsize=None)
+def _load_board_outline(csv_path, row_index):
     # 读取并解析 CSV 中区域点集
     df = pd.read_csv(csv_path, header=None)
     raw_row = df.iloc[row_index].dropna()
@@ -32,7 +30,25 @@ def board_mask(physical_height_mm,physical_width_mm, grid_step_mm):
         except:
             continue
     points = np.array(points, dtype=np.float32)
+    points.setflags(write=False)
+    return points
+
+
+def load_board_outline(csv_path=None, row_index=8):
+    """
+    读取异形边框的多边形点集（原始坐标，单位 mm）。
+
+    每个 (csv_path, row_index) 只解析一次，之后返回缓存的只读数组。
+    """
+    if csv_path is None:
+        csv_path = default_board_csv_path()
+    return _load_board_outline(os.path.abspath(csv_path), row_index)
 
+
+def scale_board_outline(points, physical_height_mm, physical_width_mm):
+    """
+    将边框点集缩放并居中到给定的物理尺寸（单位 mm，未翻转 Y 轴）。
+    """
     # 缩放 + 居中处理
     min_xy = np.min(points, axis=0)
     size_xy = np.max(points, axis=0) - min_xy
@@ -45,28 +61,95 @@ def board_mask(physical_height_mm,physical_width_mm, grid_step_mm):
     points_scaled[:, 0] += delta_x / 2
     points_scaled[:, 1] += delta_y / 2
 
+    return points_scaled
+
+
+def board_outline_polygon(board_width, board_height, padding=4,
+                          csv_path=None, row_index=8):
+    """
+    异形边框在节点坐标系 (node.get_pos()) 下的多边形，单位 mm。
+
+    与 board_mask 的像素位置一致：掩码按含填充的栅格
+    (board_width + 2*padding 行, board_height + 2*padding 列) 缩放，
+    节点 x 坐标对应列，y 坐标对应行，再减去填充。
+    """
+    points = load_board_outline(csv_path, row_index)
+    points_scaled = scale_board_outline(points,
+                                        board_width + 2*padding,
+                                        board_height + 2*padding)
+    return np.asarray(points_scaled, dtype=np.float64) - padding
+
+
+@functools.lru_cache(maxsize=32)
+def _board_mask_plane(csv_path, row_index,
+                      physical_height_mm, physical_width_mm, grid_step_mm):
+    points = _load_board_outline(csv_path, row_index)
+
+    # 正确的像素尺寸计算
+    grid_width = int(physical_width_mm / grid_step_mm)
+    grid_height = int(physical_height_mm / grid_step_mm)
+
+    points_scaled = scale_board_outline(points,
+                                        physical_height_mm,
+                                        physical_width_mm)
+
     # 转为像素坐标 - 修复坐标映射
     pixel_points = (points_scaled / grid_step_mm).astype(np.int32)
-    
+
     # 确保坐标在有效范围内
     pixel_points[:, 0] = np.clip(pixel_points[:, 0], 0, grid_width - 1)   # X坐标
     pixel_points[:, 1] = np.clip(pixel_points[:, 1], 0, grid_height - 1)  # Y坐标
-    
+
     # 修复Y轴方向 - OpenCV的Y轴向下为正，需要翻转
     pixel_points[:, 1] = grid_height - 1 - pixel_points[:, 1]
 
-    # 初始化 8 张图像 - 正确的维度顺序 (8, height, width)
-    overlap_board_mask = np.zeros((8, grid_height, grid_width), dtype=np.uint8)
-
-    # 对每一张图进行填充
-    for i in range(8):
-        cv2.fillPoly(overlap_board_mask[i], [pixel_points], 64)
+    plane = np.zeros((grid_height, grid_width), dtype=np.uint8)
+    cv2.fillPoly(plane, [pixel_points], 64)
 
     # 沿x轴镜像对称（水平翻转）
-    overlap_board_mask = np.flip(overlap_board_mask, axis=1)
+    plane = np.ascontiguousarray(np.flip(plane, axis=0))
+    plane.setflags(write=False)
+    return plane
+
 
-    return overlap_board_mask
+def board_mask_plane(physical_height_mm, physical_width_mm, grid_step_mm,
+                     csv_path=None, row_index=8):
+    """
+    生成单通道 (H, W) 的异形边框掩码（只读）。
+
+    结果按 (csv_path, row_index, 物理尺寸, 分辨率) 缓存，尺寸中已包含
+    调用方的 padding。所有智能体和评估环境共享同一份只读数组，调用方
+    不得原地修改。
+    """
+    if csv_path is None:
+        csv_path = default_board_csv_path()
+    return _board_mask_plane(os.path.abspath(csv_path),
+                             row_index,
+                             float(physical_height_mm),
+                             float(physical_width_mm),
+                             float(grid_step_mm))
 
 
+def board_mask(physical_height_mm,physical_width_mm, grid_step_mm,
+               csv_path=None, row_index=8):
+    """
+    生成 (8, H, W) 的异形边框掩码，每张图像通道单独填充。
+    修复了坐标系统问题，确保正确的图像方向。
+
+    8 个通道内容相同，返回的是缓存单通道掩码的只读广播视图，不会
+    重复分配内存。
+    """
+    plane = board_mask_plane(physical_height_mm,
+                             physical_width_mm,
+                             grid_step_mm,
+                             csv_path=csv_path,
+                             row_index=row_index)
+    return np.broadcast_to(plane, (8,) + plane.shape)
 
 
+def clear_board_mask_cache():
+    """
+    清空边框点集与掩码缓存（边框文件在运行时被修改后调用）。
+    """
+    _load_board_outline.cache_clear()
+    _board_mask_plane.cache_clear()
@@ -0,0 +1,411 @@
+"""
+Analytic (geometry-based) line-of-sight and overlap features.
+
+This module computes the same 8-sector ``los``, ``ol`` and ``boardmask``
+features as ``pcbDraw.get_los_and_ol_multi_agent`` directly from node
+centres, sizes and orientations, without rasterizing anything.
+
+Every footprint is a convex polygon (oriented rectangle) and every line of
+sight sector is convex (45 degree wedge), so all intersections reduce to
+convex polygon clipping. Areas of unions of convex polygons are computed
+exactly with a vertical slab decomposition.
+
+Conventions follow the raster path exactly:
+    - sector i spans [-22.5 - orientation - 45*i, 22.5 - orientation - 45*i]
+      degrees, measured like ``cv2.ellipse`` in (pos[0], pos[1]) coordinates.
+    - rectangles are built like ``cv2.boxPoints(((x, y), size, -orientation))``.
+    - the board interior is the un-padded region of the raster grid, i.e.
+      x in [0, board_height] and y in [0, board_width]; everything else
+      within the padded grid counts as border.
+
+The only approximation is the polygonal approximation of the sector arc.
+With the default ``arc_segments=16`` the sector area is under-estimated by
+less than 0.05%.
+
+Tolerance against the raster path at r = 0.02 mm, for components of 1 to
+4 mm: ``los`` within 0.03 and, in sectors where the node's footprint
+covers at least 0.5 mm^2, ``ol`` within 0.06 (absolute). The residual comes
+from the raster path itself: cv2.drawContours fills boundary pixels
+inclusively and truncates corner coordinates, which moves every edge by
+up to about one pixel. The error grows with the footprint edge length per
+area, so thin slivers of the footprint in a sector (below 0.5 mm^2) can
+differ by up to about 0.1.
+
+The module also provides the separating axis and containment tests used by
+core.environment.footprints to decide whether a placement is legal.
+"""
+import numpy as np
+
+# Empty intervals in the slab sweep are parked here so that they never
+# contribute to the union length.
+_EMPTY = -1e30
+
+
+def polygon_area(poly):
+    """
+    Area of a simple polygon given as an (n, 2) array (shoelace formula).
+    """
+    if len(poly) < 3:
+        return 0.0
+    x = poly[:, 0]
+    y = poly[:, 1]
+    return 0.5 * np.abs(np.dot(x, np.roll(y, -1)) - np.dot(y, np.roll(x, -1)))
+
+
+def rectangle_polygon(pos, size, orientation):
+    """
+    Corners of an oriented rectangle, identical to
+    cv2.boxPoints(((pos[0], pos[1]), size, -orientation)) but in floating
+    point millimetres.
+    """
+    theta = np.deg2rad(-orientation)
+    b = np.cos(theta) * 0.5
+    a = np.sin(theta) * 0.5
+    w = float(size[0])
+    h = float(size[1])
+    cx = float(pos[0])
+    cy = float(pos[1])
+
+    p0 = (cx - a*h - b*w, cy + b*h - a*w)
+    p1 = (cx + a*h - b*w, cy - b*h - a*w)
+    p2 = (2*cx - p0[0], 2*cy - p0[1])
+    p3 = (2*cx - p1[0], 2*cy - p1[1])
+    return np.array([p0, p1, p2, p3], dtype=np.float64)
+
+
+def axis_aligned_polygon(x0, y0, x1, y1):
+    """
+    Counter-clockwise polygon of the axis aligned rectangle [x0,x1]x[y0,y1].
+    """
+    return np.array([[x0, y0], [x1, y0], [x1, y1], [x0, y1]], dtype=np.float64)
+
+
+def sector_polygon(center, radius, start, stop, arc_segments=16):
+    """
+    Convex polygon approximating a circular sector.
+
+    Parameters
+    ----------
+    center : tuple
+        Sector apex (x, y).
+    radius : float
+        Sector radius.
+    start, stop : float
+        Start and stop angles in degrees, using the cv2.ellipse convention
+        (x = cx + r*cos(t), y = cy + r*sin(t)).
+    arc_segments : int, optional
+        Number of chords used to approximate the arc.
+    """
+    t = np.deg2rad(np.linspace(start, stop, arc_segments + 1))
+    arc = np.stack([center[0] + radius*np.cos(t),
+                    center[1] + radius*np.sin(t)], axis=1)
+    return np.vstack([np.array([center], dtype=np.float64), arc])
+
+
+def _orient_ccw(poly):
+    x = poly[:, 0]
+    y = poly[:, 1]
+    signed = np.dot(x, np.roll(y, -1)) - np.dot(y, np.roll(x, -1))
+    return poly if signed >= 0 else poly[::-1]
+
+
+def clip_convex(subject, clip):
+    """
+    Intersection of a polygon with a convex polygon (Sutherland-Hodgman).
+
+    Returns an (n, 2) array, empty when the polygons do not intersect.
+    """
+    if len(subject) < 3 or len(clip) < 3:
+        return np.zeros((0, 2))
+    clip = _orient_ccw(clip)
+    output = subject
+    for i in range(len(clip)):
+        if len(output) == 0:
+            break
+        a = clip[i]
+        b = clip[(i + 1) % len(clip)]
+        edge = b - a
+        # >= 0 is inside for a counter-clockwise clip polygon
+        side = edge[0]*(output[:, 1] - a[1]) - edge[1]*(output[:, 0] - a[0])
+        inside = side >= -1e-12
+        if inside.all():
+            continue
+        if not inside.any():
+            return np.zeros((0, 2))
+
+        nxt = np.roll(output, -1, axis=0)
+        side_nxt = np.roll(side, -1)
+        inside_nxt = np.roll(inside, -1)
+        pts = []
+        for j in range(len(output)):
+            if inside[j]:
+                pts.append(output[j])
+            if inside[j] != inside_nxt[j]:
+                t = side[j] / (side[j] - side_nxt[j])
+                pts.append(output[j] + t*(nxt[j] - output[j]))
+        output = np.array(pts) if len(pts) > 0 else np.zeros((0, 2))
+    return output
+
+
+def union_area(polygons):
+    """
+    Exact area of the union of convex polygons.
+
+    The x axis is split at every vertex and at every crossing between edges
+    of different polygons. Inside each slab every polygon's vertical chord
+    has linearly moving end points that never cross, so the union length is
+    linear and the midpoint rule is exact.
+    """
+    polygons = [p for p in polygons if len(p) >= 3]
+    if len(polygons) == 0:
+        return 0.0
+    if len(polygons) == 1:
+        return polygon_area(polygons[0])
+
+    starts = np.vstack(polygons)
+    ends = np.vstack([np.roll(p, -1, axis=0) for p in polygons])
+    owner = np.concatenate([np.full(len(p), k) for k, p in enumerate(polygons)])
+
+    xs = [starts[:, 0]]
+
+    # crossings between edges of different polygons
+    p = starts[:, None, :]
+    r = (ends - starts)[:, None, :]
+    q = starts[None, :, :]
+    s = (ends - starts)[None, :, :]
+    denom = r[..., 0]*s[..., 1] - r[..., 1]*s[..., 0]
+    qp = q - p
+    with np.errstate(divide="ignore", invalid="ignore"):
+        t = (qp[..., 0]*s[..., 1] - qp[..., 1]*s[..., 0]) / denom
+        u = (qp[..., 0]*r[..., 1] - qp[..., 1]*r[..., 0]) / denom
+    valid = ((owner[:, None] != owner[None, :]) & (np.abs(denom) > 1e-15)
+             & (t >= 0) & (t <= 1) & (u >= 0) & (u <= 1))
+    if valid.any():
+        # mask first: t is inf/nan where denom == 0
+        i, j = np.nonzero(valid)
+        xs.append(starts[i, 0] + t[i, j]*(ends[i, 0] - starts[i, 0]))
+
+    xs = np.unique(np.concatenate(xs))
+    if len(xs) < 2:
+        return 0.0
+    mids = 0.5*(xs[:-1] + xs[1:])
+    widths = np.diff(xs)
+
+    # chord of every polygon at every slab midpoint
+    x0 = starts[:, 0][None, :]
+    x1 = ends[:, 0][None, :]
+    y0 = starts[:, 1][None, :]
+    y1 = ends[:, 1][None, :]
+    xm = mids[:, None]
+    spans = (np.minimum(x0, x1) < xm) & (np.maximum(x0, x1) > xm)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        y = y0 + (xm - x0)*(y1 - y0)/(x1 - x0)
+
+    n_polys = len(polygons)
+    lo = np.full((len(mids), n_polys), _EMPTY)
+    hi = np.full((len(mids), n_polys), _EMPTY)
+    for k in range(n_polys):
+        edges = owner == k
+        mask = spans[:, edges]
+        yk = np.where(mask, y[:, edges], np.nan)
+        covered = mask.any(axis=1)
+        lo[covered, k] = np.nanmin(yk[covered], axis=1)
+        hi[covered, k] = np.nanmax(yk[covered], axis=1)
+
+    order = np.argsort(lo, axis=1)
+    lo = np.take_along_axis(lo, order, axis=1)
+    hi = np.take_along_axis(hi, order, axis=1)
+    prev_end = np.maximum.accumulate(hi, axis=1)
+    prev_end = np.concatenate([np.full((len(mids), 1), _EMPTY),
+                               prev_end[:, :-1]], axis=1)
+    length = np.clip(hi - np.maximum(lo, prev_end), 0.0, None).sum(axis=1)
+
+    return float(np.dot(length, widths))
+
+
+def _covered_area(region, region_area, interior, obstacles):
+    """
+    Area of `region` covered by the border (outside `interior`) or by any of
+    the obstacle rectangles.
+    """
+    inside = clip_convex(region, interior)
+    inside_area = polygon_area(inside)
+    covered = []
+    for rect in obstacles:
+        c = clip_convex(inside, rect)
+        if len(c) >= 3:
+            covered.append(c)
+    return (region_area - inside_area) + union_area(covered)
+
+
+def get_los_and_ol_analytic(node,
+                            other_nodes,
+                            board_width,
+                            board_height,
+                            radius,
+                            padding,
+                            arc_segments=16):
+    """
+    Geometric counterpart of pcbDraw.get_los_and_ol_multi_agent (los_type=0).
+
+    Parameters
+    ----------
+    node : graph.node
+        The current node.
+    other_nodes : list
+        Every other node on the board (placed or not).
+    board_width, board_height : float
+        Board dimensions in mm.
+    radius : float
+        Line of sight radius in mm.
+    padding : float or None
+        Raster padding in mm. Sectors are clipped to the padded grid, like
+        the raster path.
+
+    Returns
+    -------
+    segment_ratio : np.ndarray
+        (8,) fraction of each sector covered by other components or border.
+    overlap_ratio : np.ndarray
+        (8,) fraction of the node's footprint inside each sector that is
+        covered by other components or border.
+    overlap_areas : np.ndarray
+        (8,) area (mm^2) of the node's footprint inside each sector; the
+        analytic counterpart of summing ``ol_grids``.
+    overlap_board_ratio : np.ndarray
+        (8,) always zero, because the raster path computes
+        ``(footprint & mask) & ~mask``.
+    """
+    pos = node.get_pos()
+    size = node.get_size()
+    angle_offset = node.get_orientation()
+    center = (float(pos[0]), float(pos[1]))
+
+    pad = 0.0 if padding is None else float(padding)
+    grid = axis_aligned_polygon(-pad, -pad, board_height + pad, board_width + pad)
+    interior = axis_aligned_polygon(0.0, 0.0, board_height, board_width)
+
+    current = rectangle_polygon(pos, size, angle_offset)
+
+    # Only rectangles that can reach the line of sight circle matter.
+    obstacles = []
+    for v in other_nodes:
+        v_pos = v.get_pos()
+        v_size = v.get_size()
+        reach = radius + 0.5*np.hypot(v_size[0], v_size[1])
+        if np.hypot(v_pos[0] - center[0], v_pos[1] - center[1]) > reach:
+            continue
+        obstacles.append(rectangle_polygon(v_pos, v_size, v.get_orientation()))
+
+    segment_ratio = np.zeros(8)
+    overlap_ratio = np.zeros(8)
+    overlap_areas = np.zeros(8)
+    overlap_board_ratio = np.zeros(8)
+
+    start = -22.5 - angle_offset
+    stop = 22.5 - angle_offset
+    for i in range(8):
+        sector = clip_convex(sector_polygon(center, radius, start, stop,
+                                            arc_segments=arc_segments), grid)
+        sector_area = polygon_area(sector)
+        if sector_area > 0:
+            segment_ratio[i] = _covered_area(sector, sector_area,
+                                             interior, obstacles) / sector_area
+
+        footprint = clip_convex(current, sector)
+        footprint_area = polygon_area(footprint)
+        overlap_areas[i] = footprint_area
+        if footprint_area > 0:
+            overlap_ratio[i] = _covered_area(footprint, footprint_area,
+                                             interior, obstacles) / footprint_area
+
+        start -= 45
+        stop -= 45
+
+    return segment_ratio, overlap_ratio, overlap_areas, overlap_board_ratio
+
+
+def _projection_gap(a, b, axes):
+    """
+    Largest separation of the projections of the convex polygons a and b
+    on any of the axes; negative when they overlap on every axis (the
+    penetration depth along the least overlapping axis).
+    """
+    pa = a @ axes.T
+    pb = b @ axes.T
+    gap = np.maximum(pb.min(axis=0) - pa.max(axis=0),
+                     pa.min(axis=0) - pb.max(axis=0))
+    return gap.max()
+
+
+def _edge_normals(rect):
+    edges = np.roll(rect, -1, axis=0)[:2] - rect[:2]
+    normals = np.stack([-edges[:, 1], edges[:, 0]], axis=1)
+    length = np.hypot(normals[:, 0], normals[:, 1])
+    length[length == 0] = 1.0
+    return normals / length[:, None]
+
+
+def rectangles_overlap(a, b, tolerance=1e-6):
+    """
+    Separating axis test of two oriented rectangles (see rectangle_polygon).
+
+    Rectangles that only touch, or that overlap by at most `tolerance` mm
+    along some axis, do not overlap.
+    """
+    axes = np.vstack([_edge_normals(a), _edge_normals(b)])
+    return _projection_gap(a, b, axes) < -tolerance
+
+
+def rectangle_inside_box(rect, x0, y0, x1, y1, tolerance=1e-6):
+    """
+    Whether every corner of `rect` lies inside [x0,x1]x[y0,y1].
+    """
+    return bool(np.all(rect[:, 0] >= x0 - tolerance) and
+                np.all(rect[:, 0] <= x1 + tolerance) and
+                np.all(rect[:, 1] >= y0 - tolerance) and
+                np.all(rect[:, 1] <= y1 + tolerance))
+
+
+def _points_in_polygon(points, poly):
+    """
+    Even-odd rule point in polygon test for an (m, 2) array of points.
+    """
+    x = points[:, 0][:, None]
+    y = points[:, 1][:, None]
+    x0 = poly[:, 0][None, :]
+    y0 = poly[:, 1][None, :]
+    x1 = np.roll(poly[:, 0], -1)[None, :]
+    y1 = np.roll(poly[:, 1], -1)[None, :]
+    crosses = (y0 > y) != (y1 > y)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        xi = x0 + (y - y0) * (x1 - x0) / (y1 - y0)
+    return np.count_nonzero(crosses & (x < xi), axis=1) % 2 == 1
+
+
+def _segments_cross(p0, p1, q0, q1):
+    """
+    Proper crossings between every segment p0[i]-p1[i] and q0[j]-q1[j].
+    """
+    def cross(o, a, b):
+        return ((a[..., 0] - o[..., 0]) * (b[..., 1] - o[..., 1]) -
+                (a[..., 1] - o[..., 1]) * (b[..., 0] - o[..., 0]))
+    p0, p1 = p0[:, None], p1[:, None]
+    q0, q1 = q0[None, :], q1[None, :]
+    d1 = cross(q0, q1, p0)
+    d2 = cross(q0, q1, p1)
+    d3 = cross(p0, p1, q0)
+    d4 = cross(p0, p1, q1)
+    return ((d1 * d2) < 0) & ((d3 * d4) < 0)
+
+
+def polygon_contains_rectangle(outline, rect):
+    """
+    Whether the simple (possibly non-convex) polygon `outline` contains the
+    oriented rectangle `rect`: every corner is inside the outline and no
+    outline edge crosses a rectangle edge.
+    """
+    if not np.all(_points_in_polygon(rect, outline)):
+        return False
+    return not np.any(_segments_cross(rect, np.roll(rect, -1, axis=0),
+                                      outline, np.roll(outline, -1, axis=0)))
@@ -21,7 +21,12 @@ def calculate_resultant_vector( x : float, y : float ):
 
     return euclidean_dist, angle
 
-def compute_pad_referenced_distance_vectors_v2(n, nn, e, ignore_power=False):
+def compute_pad_referenced_distance_vectors_v2(n,
+                                               nn,
+                                               e,
+                                               ignore_power=False,
+                                               dom_table=None,
+                                               return_vectors=True):
     """
 
     Parameters
@@ -32,6 +37,13 @@ def compute_pad_referenced_distance_vectors_v2(n, nn, e, ignore_power=False):
         DESCRIPTION.
     e : TYPE
         DESCRIPTION.
+    dom_table : dict, optional
+        Table from build_dom_table(n, nn, e, ignore_power). When given, the
+        vectors are computed with NumPy group reductions instead of list
+        scans; the results are the same.
+    return_vectors : bool, optional
+        Only used together with dom_table. When False, resultant_vecs and
+        all_vecs are not built and None is returned for both.
 
     Returns
     -------
@@ -63,6 +75,12 @@ def compute_pad_referenced_distance_vectors_v2(n, nn, e, ignore_power=False):
         carried out. The magnitude of the resultant vector is divded by the
         number of vectors in the net.
     """
+    if dom_table is not None:
+        return dom_table_distance_vectors(dom_table,
+                                          n,
+                                          nn,
+                                          return_vectors=return_vectors)
+
     current_node_id = n.get_id()
     current_node_pos = n.get_pos()
     net_ids = []
@@ -182,6 +200,153 @@ def compute_pad_referenced_distance_vectors_v2(n, nn, e, ignore_power=False):
     # print(dom)
     return dom, resultant_vecs, all_vecs
 
+def build_dom_table(n, nn, e, ignore_power=False):
+    """
+    Precompile the candidate pad to pad vectors visited by
+    compute_pad_referenced_distance_vectors_v2 into index arrays.
+
+    Rows follow the visiting order of the loop implementation (net order,
+    then edge order, then side). Rows sharing (net, neighbor, current pad)
+    form a pair of which only the shortest vector is kept; pairs are
+    grouped by current pad.
+
+    Returns
+    -------
+    dict
+        header : (E, 5) [net_id, current_node_id, target_node_id,
+            current_pad_id, target_pad_id] of every row.
+        current_offset, neighbor_offset : (E, 2) unrotated pad offsets.
+        neighbor_idx : (E,) index of the target node in `nn`.
+        pair : (E,) pair index of every row, in order of first appearance.
+        pair_group : (P,) current pad group of every pair, in order of first
+            appearance.
+    """
+    current_node_id = n.get_id()
+
+    nn_idx = {}
+    for idx, v in enumerate(nn):
+        # the first match wins, like the loop implementation
+        nn_idx.setdefault(v.get_id(), idx)
+
+    net_ids = []
+    for ee in e:
+        if (ignore_power is True) and (ee.get_power_rail() > 0):
+            continue
+        if ee.get_net_id() not in net_ids:
+            net_ids.append(ee.get_net_id())
+
+    header = []
+    current_offset = []
+    neighbor_offset = []
+    neighbor_idx = []
+    for net_id in net_ids:
+        for ee in e:
+            if ee.get_net_id() != net_id:
+                continue
+            for i in range(2):
+                if ee.get_instance_id(i) != current_node_id:
+                    continue
+                idx = nn_idx.get(ee.get_instance_id(1-i))
+                if idx is None:
+                    continue
+                header.append([net_id,
+                               current_node_id,
+                               nn[idx].get_id(),
+                               ee.get_pad_id(i),
+                               ee.get_pad_id(1-i)])
+                current_offset.append([float(ee.get_pos(i)[0]),
+                                       float(ee.get_pos(i)[1])])
+                neighbor_offset.append([float(ee.get_pos(1-i)[0]),
+                                        float(ee.get_pos(1-i)[1])])
+                neighbor_idx.append(idx)
+
+    pairs = {}
+    groups = {}
+    pair = []
+    pair_group = []
+    for h in header:
+        key = tuple(h[0:4])
+        if key not in pairs:
+            pairs[key] = len(pairs)
+            group_key = (h[1], h[3])
+            if group_key not in groups:
+                groups[group_key] = len(groups)
+            pair_group.append(groups[group_key])
+        pair.append(pairs[key])
+
+    return {"header": header,
+            "current_offset": np.array(current_offset, dtype=np.float64).reshape(-1, 2),
+            "neighbor_offset": np.array(neighbor_offset, dtype=np.float64).reshape(-1, 2),
+            "neighbor_idx": np.array(neighbor_idx, dtype=np.int64),
+            "pair": np.array(pair, dtype=np.int64),
+            "pair_group": np.array(pair_group, dtype=np.int64)}
+
+def dom_table_distance_vectors(dom_table, n, nn, return_vectors=True):
+    """
+    Array counterpart of compute_pad_referenced_distance_vectors_v2 using a
+    table from build_dom_table.
+    """
+    pair = dom_table["pair"]
+    pair_group = dom_table["pair_group"]
+    n_rows = len(pair)
+    n_pairs = len(pair_group)
+    if n_pairs == 0:
+        dom = rectangular_to_polar(np.sum([]))
+        if return_vectors is False:
+            return dom, None, None
+        return dom, [], []
+
+    current_node_pos = n.get_pos()
+    poses = np.array([[v.get_pos()[0], v.get_pos()[1], v.get_orientation()]
+                      for v in nn], dtype=np.float64)[dom_table["neighbor_idx"]]
+
+    crx, cry = _kicad_rotate_array(dom_table["current_offset"], n.get_orientation())
+    nrx, nry = _kicad_rotate_array(dom_table["neighbor_offset"], poses[:, 2])
+
+    sx = current_node_pos[0] + crx
+    sy = current_node_pos[1] + cry
+    dx = poses[:, 0] + nrx
+    dy = poses[:, 1] + nry
+
+    delta_x = dx - sx
+    delta_y = sy - dy
+    dist = np.sqrt(np.square(delta_x) + np.square(delta_y))
+    angle = np.where((delta_x == 0.0) & (delta_y == 0.0),
+                     0.0,
+                     np.arctan2(delta_y, delta_x))
+
+    # Keep the first shortest vector of every pair.
+    shortest = np.full(n_pairs, np.inf)
+    np.minimum.at(shortest, pair, dist)
+    rows = np.arange(n_rows)
+    is_min = dist == shortest[pair]
+    winner = np.full(n_pairs, n_rows)
+    np.minimum.at(winner, pair[is_min], rows[is_min])
+
+    # Magnitudes are divided by the number of vectors, then summed per
+    # current pad and over all pads.
+    z = polar_to_rectangular(dist[winner] / n_pairs, angle[winner])
+    n_groups = int(pair_group.max()) + 1
+    group_z = (np.bincount(pair_group, weights=z.real, minlength=n_groups)
+               + 1j*np.bincount(pair_group, weights=z.imag, minlength=n_groups))
+    dom = rectangular_to_polar(np.sum(group_z))
+
+    if return_vectors is False:
+        return dom, None, None
+
+    header = dom_table["header"]
+    all_vecs = [[] for _ in range(n_groups)]
+    last = [None] * n_groups
+    for p in range(n_pairs):
+        w = winner[p]
+        g = pair_group[p]
+        all_vecs[g].append(header[w] + [sx[w], sy[w], dx[w], dy[w],
+                                        dist[w], angle[w]])
+        last[g] = header[w]
+    resultant_vecs = [[last[g], rectangular_to_polar(group_z[g])]
+                      for g in range(n_groups)]
+    return dom, resultant_vecs, all_vecs
+
 def sort_resultant_vectors( resultant_vecs ):
     # reverse = None (Sorts in Ascending order)
     # key is set to sort using second element of
@@ -263,7 +428,16 @@ def compute_sum_of_euclidean_distances(n, nn, eoi):
 def compute_sum_of_euclidean_distances_between_pads(n,
                                                     nn,
                                                     eoi,
-                                                    ignore_power=False):
+                                                    ignore_power=False,
+                                                    pad_table=None):
+    # A pad table built once with build_pad_table(n, nn, eoi) turns the
+    # computation into a single batched rotate/diff/min-reduce.
+    if pad_table is not None:
+        return pad_table_sum_of_euclidean_distances(pad_table,
+                                                    n,
+                                                    nn,
+                                                    ignore_power=ignore_power)
+
     current_node_id = n.get_id()
     current_node_pos = n.get_pos()
     current_node_orientation = n.get_orientation()
@@ -307,6 +481,105 @@ def compute_sum_of_euclidean_distances_between_pads(n,
 
     return np.sum(all_lengths)
 
+def build_pad_table(n, nn, eoi):
+    """
+    Precompile the pad to pad connections of node `n` into flat arrays.
+
+    One row is created for every (edge, side) where the current node owns
+    the pad, exactly the candidates visited by
+    compute_sum_of_euclidean_distances_between_pads. Only the node poses
+    change between calls, so the table is built once per agent.
+
+    Returns
+    -------
+    dict
+        pad_id : (E,) pad id on the current node.
+        current_offset : (E, 2) unrotated current pad offset.
+        neighbor_idx : (E,) index of the connected node in `nn`.
+        neighbor_offset : (E, 2) unrotated neighbor pad offset.
+        power : (E,) True if the edge belongs to a power rail.
+        pins : number of pins of the current node.
+    """
+    current_node_id = n.get_id()
+    current_node_pins = n.get_pin_count()
+
+    nn_idx = {}
+    for idx, v in enumerate(nn):
+        # the first match wins, like the loop implementation
+        nn_idx.setdefault(v.get_id(), idx)
+
+    pad_id = []
+    current_offset = []
+    neighbor_idx = []
+    neighbor_offset = []
+    power = []
+    for e in eoi:
+        for k in range(2):
+            if e.get_instance_id(k) != current_node_id:
+                continue
+            if not 0 <= e.get_pad_id(k) < current_node_pins:
+                continue
+            idx = nn_idx.get(e.get_instance_id(1-k))
+            if idx is None:
+                continue
+            pad_id.append(e.get_pad_id(k))
+            current_offset.append([float(e.get_pos(k)[0]), float(e.get_pos(k)[1])])
+            neighbor_idx.append(idx)
+            neighbor_offset.append([float(e.get_pos(1-k)[0]), float(e.get_pos(1-k)[1])])
+            power.append(e.get_power_rail() > 0)
+
+    return {"pad_id": np.array(pad_id, dtype=np.int64),
+            "current_offset": np.array(current_offset, dtype=np.float64).reshape(-1, 2),
+            "neighbor_idx": np.array(neighbor_idx, dtype=np.int64),
+            "neighbor_offset": np.array(neighbor_offset, dtype=np.float64).reshape(-1, 2),
+            "power": np.array(power, dtype=bool),
+            "pins": current_node_pins}
+
+def _kicad_rotate_array(offsets, a):
+    # vectorized kicad_rotate, `a` holds one angle (degrees) per row
+    theta = np.pi * (np.asarray(a, dtype=np.float64) / 180.0)
+    c = np.cos(theta)
+    s = np.sin(theta)
+    rx = offsets[:, 0] * c + offsets[:, 1] * s
+    ry = - offsets[:, 0] * s + offsets[:, 1] * c
+    return rx, ry
+
+def pad_table_sum_of_euclidean_distances(pad_table, n, nn, ignore_power=False):
+    """
+    Batched counterpart of compute_sum_of_euclidean_distances_between_pads
+    using a table from build_pad_table.
+    """
+    if ignore_power is True:
+        keep = ~pad_table["power"]
+        pad_id = pad_table["pad_id"][keep]
+        current_offset = pad_table["current_offset"][keep]
+        neighbor_idx = pad_table["neighbor_idx"][keep]
+        neighbor_offset = pad_table["neighbor_offset"][keep]
+    else:
+        pad_id = pad_table["pad_id"]
+        current_offset = pad_table["current_offset"]
+        neighbor_idx = pad_table["neighbor_idx"]
+        neighbor_offset = pad_table["neighbor_offset"]
+
+    if len(pad_id) == 0:
+        return 0.0
+
+    current_node_pos = n.get_pos()
+    poses = np.array([[v.get_pos()[0], v.get_pos()[1], v.get_orientation()]
+                      for v in nn], dtype=np.float64)[neighbor_idx]
+
+    crx, cry = _kicad_rotate_array(current_offset, n.get_orientation())
+    nrx, nry = _kicad_rotate_array(neighbor_offset, poses[:, 2])
+
+    dx = (current_node_pos[0] + crx) - (poses[:, 0] + nrx)
+    dy = (current_node_pos[1] + cry) - (poses[:, 1] + nry)
+    lengths = np.sqrt(np.square(dx) + np.square(dy))
+
+    # shortest connection of every pad, summed over the pads that have one
+    shortest = np.full(pad_table["pins"], np.inf)
+    np.minimum.at(shortest, pad_id, lengths)
+    return np.sum(shortest[np.isfinite(shortest)])
+
 def distance_between_two_points(p1,p2):
     if p1[0] == p2[0] and p1[1] == p2[1]:
         return 0
@@ -373,7 +646,9 @@ def deg2rad(theta):
 def rad2deg(theta):
     return (theta * 360) / (2 * np.pi)
 
-def get_los_feature_vector(n, nn, eoi, b, clamp_at_zero=True, padding=None):
+def get_los_feature_vector(n, nn, eoi, b, clamp_at_zero=True, padding=None,
+                           resolution=None):
+    res = pcbDraw_resolution() if resolution is None else resolution
     current_node_size = n.get_size()
     current_node_position = n.get_pos()
     current_node_orientation = n.get_orientation()
@@ -384,22 +659,24 @@ def get_los_feature_vector(n, nn, eoi, b, clamp_at_zero=True, padding=None):
                                 current_node_orientation,
                                 bx=b.get_width(),
                                 by=b.get_height(),
-                                padding=padding)
+                                padding=padding,
+                                resolution=res)
 
     grid_comps = draw_comps_from_nodes_and_edges(n,
                                                  nn,
                                                  eoi,
                                                  b,
-                                                 padding=padding)
+                                                 padding=padding,
+                                                 resolution=res)
 
     scaled_current_node_pos = [0,0]
-    scaled_current_node_pos[0] = int(current_node_position[0]/pcbDraw_resolution()) + int(3/pcbDraw_resolution())  # centre is offset for padding
-    scaled_current_node_pos[1] = int(current_node_position[1]/pcbDraw_resolution()) + int(3/pcbDraw_resolution())  # centre is offset for padding
+    scaled_current_node_pos[0] = int(current_node_position[0]/res) + int(3/res)  # centre is offset for padding
+    scaled_current_node_pos[1] = int(current_node_position[1]/res) + int(3/res)  # centre is offset for padding
 
     los_feature = []
     box_edge_coords = []
     intersection_point_coords = []
-    los_radius = int( (np.max(current_node_size)*2) / pcbDraw_resolution())
+    los_radius = int( (np.max(current_node_size)*2) / res)
     for i in range(8):
         # The center point of the current node must factor in the padding
         # of the grid!
@@ -416,7 +693,7 @@ def get_los_feature_vector(n, nn, eoi, b, clamp_at_zero=True, padding=None):
             if d == 0:
                 angle = current_node_orientation
                 d = 1E-3
-                m = np.sqrt(np.square(current_node_size[0]/2)+np.square(current_node_size[1]/2)) / pcbDraw_resolution()
+                m = np.sqrt(np.square(current_node_size[0]/2)+np.square(current_node_size[1]/2)) / res
                 # component center as edge coord
                 box_edge_coords.append((scaled_current_node_pos[0],
                                         scaled_current_node_pos[1]))
@@ -429,8 +706,8 @@ def get_los_feature_vector(n, nn, eoi, b, clamp_at_zero=True, padding=None):
 
                 angle = 2 * np.pi - angle
 
-                x = np.int0(np.ceil(current_node_size[0] / pcbDraw_resolution()))
-                y = np.int0(np.ceil(current_node_size[1] / pcbDraw_resolution()))
+                x = np.int0(np.ceil(current_node_size[0] / res))
+                y = np.int0(np.ceil(current_node_size[1] / res))
                 m = distance_from_rectangle_center_to_edge((x,y),
                                                            angle-deg2rad(current_node_orientation),
                                                            degrees=False)
@@ -59,8 +59,10 @@ def cmdline_args():
         "--auto_seed", required=False, action="store_true", default=False,
         help="ignore seed value and generate one based of the current time\
               for everyrun")
-    parser.add_argument("--workers", required=False, type=int, default=2,
-                        help="number of workers on which 'runs' will execute.")
+    parser.add_argument("--workers", required=False, type=int, default=1,
+                        help="number of processes on which 'runs' will execute\
+                              concurrently. Every process trains a full model,\
+                              so GPU and memory use scale with this value.")
     parser.add_argument("--verbose", required=False, type=int, default=0,
                         help="Program verbosity")
     # How often (time steps) we evaluate
@@ -96,7 +98,51 @@ def cmdline_args():
     parser.add_argument("--enable_gpu_optimization", required=False, type=str, default="true", 
                         help="启用GPU优化，取值为 'true' 或 'false'")
     parser.add_argument("--num_workers", required=False, type=int, default=6,
-                        help="工作线程数量")
+                        help="专家目标探索的工作进程数量（需启用 --enable_multithread）")
+    parser.add_argument("--los_engine", required=False, type=str,
+                        default="raster", choices=["raster", "analytic"],
+                        help="视线/重叠特征的计算引擎：raster（栅格）或 analytic（几何解析）")
+    parser.add_argument("--num_envs", required=False, type=int, default=1,
+                        help="训练时并行运行的环境（工作进程）数量；大于 1 时使用多进程向量化环境收集转移")
+    parser.add_argument("--batched_inference", required=False,
+                        action="store_true", default=False,
+                        help="每步对所有智能体做一次批量策略推理（观察取自步开始时的布局）")
+    parser.add_argument("--render", required=False, type=str,
+                        default="video", choices=["always", "never", "every_n", "eval", "video"],
+                        help="调试渲染策略：always（每步）、never、every_n（每 --render_every 步）、eval（只在评估环境）或 video（只在将写出视频时）")
+    parser.add_argument("--render_every", required=False, type=int, default=10,
+                        help="--render every_n 时的渲染间隔（步）")
+    parser.add_argument("--render_scale", required=False, type=float, default=1.0,
+                        help="调试帧相对于绘制分辨率的缩放比例，默认 1.0（全分辨率）；小于 1 时以更低\
+                              分辨率绘制和存储，评估与探索视频也随之缩小")
+    parser.add_argument("--frame_size", required=False, type=int, default=None,
+                        help="评估/探索视频帧最长边的像素数，默认保持渲染尺寸")
+    parser.add_argument("--async_evaluation", required=False,
+                        action="store_true", default=False,
+                        help="周期评估在独立的评估进程中基于策略快照运行，训练不再等待评估完成")
+    parser.add_argument("--evaluation_workers", required=False, type=int, default=1,
+                        help="评估回合并行运行的进程数量；结果与进程数无关")
+    parser.add_argument("--profile_every", required=False, type=int, default=None,
+                        help="每 N 步把各阶段耗时（观测、奖励、策略推理、回放缓冲区、梯度更新）写入 TensorBoard 与 log_dir/profile.csv；默认不记录")
+    parser.add_argument("--resolution", required=False, type=str, default="0.02",
+                        help="观测与奖励栅格的分辨率 (mm/像素)，或 auto：按每块板的最小组件与视线扇区选择最粗的可用分辨率")
+    parser.add_argument("--resolution_min_pixels", required=False, type=int, default=8,
+                        help="--resolution auto 时最小组件与视线扇区至少覆盖的像素数")
+    parser.add_argument("--no_spatial_index", required=False,
+                        action="store_true", default=False,
+                        help="不维护组件外形空间索引，观测遍历全部组件（用于对比）")
+    parser.add_argument("--legality_engine", required=False, type=str,
+                        default="raster", choices=["geometric", "raster"],
+                        help="找到更低 HPWL 时的布局合法性检查：raster（默认，整板平面叠加，与基线结果一致）\
+                              或 geometric（外形索引 + 分离轴，快得多）。注意 geometric 拒绝任何两组件重叠并要求组件\
+                              位于异形边框内，而 raster 容许叠加值不超过 128 的轻微重叠，因此两者接受的 HPWL/We\
+                              目标不同，geometric 的结果不能直接与基线结果比较")
+    parser.add_argument("--replay_buffer", required=False, type=str,
+                        default="ram", choices=["ram", "memmap"],
+                        help="经验回放缓冲区后端：ram（内存）或 memmap（log_dir/replay_buffer 下的内存映射文件，可保存/恢复）")
+    parser.add_argument("--replay_buffer_warm_start", required=False, type=str,
+                        default=None,
+                        help="已保存的 memmap 回放缓冲区目录；加载其内容并相应减少 start_timesteps 的随机探索")
 
     args = parser.parse_args()
 
@@ -130,6 +176,22 @@ def cmdline_args():
     settings["enable_multithread"] = args.enable_multithread.lower() == "true" if isinstance(args.enable_multithread, str) else args.enable_multithread
     settings["enable_gpu_optimization"] = args.enable_gpu_optimization.lower() == "true" if isinstance(args.enable_gpu_optimization, str) else args.enable_gpu_optimization  
     settings["num_workers"] = args.num_workers
+    settings["los_engine"] = args.los_engine
+    settings["replay_buffer"] = args.replay_buffer
+    settings["num_envs"] = args.num_envs
+    settings["batched_inference"] = args.batched_inference
+    settings["render"] = args.render
+    settings["render_every"] = args.render_every
+    settings["render_scale"] = args.render_scale
+    settings["frame_size"] = args.frame_size
+    settings["replay_buffer_warm_start"] = args.replay_buffer_warm_start
+    settings["async_evaluation"] = args.async_evaluation
+    settings["evaluation_workers"] = args.evaluation_workers
+    settings["profile_every"] = args.profile_every
+    settings["resolution"] = "auto" if args.resolution == "auto" else float(args.resolution)
+    settings["resolution_min_pixels"] = args.resolution_min_pixels
+    settings["legality_engine"] = args.legality_engine
+    settings["spatial_index"] = not args.no_spatial_index
 
     if args.device == "cuda":
         settings["device"] = "cuda" if torch.cuda.is_available() else "cpu"
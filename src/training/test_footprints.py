@@ -0,0 +1,61 @@
+"""Unit tests for core.environment.footprints"""
+from core.environment.footprints import footprint_index
+
+class _node():
+    def __init__(self, node_id, pos, size, orientation=0.0):
+        self.node_id = node_id
+        self.pos = pos
+        self.size = size
+        self.orientation = orientation
+
+    def get_id(self):
+        return self.node_id
+
+    def get_pos(self):
+        return self.pos
+
+    def get_size(self):
+        return self.size
+
+    def get_orientation(self):
+        return self.orientation
+
+def test_legality_is_maintained_incrementally():
+    """Moving a node onto another makes the placement illegal, moving it
+    back or out of the board is tracked without resynchronising."""
+    a = _node(0, (5, 5), (2, 2))
+    b = _node(1, (10, 10), (2, 2))
+    index = footprint_index(20, 20, cell_size=4)
+    index.sync([a, b])
+    assert index.is_legal()
+
+    b.pos = (6, 6)
+    index.update_node(b)
+    assert not index.is_legal()
+    assert index.overlapping(0) == {1}
+
+    b.orientation = 45.0
+    b.pos = (8.2, 5)
+    index.update_node(b)
+    assert index.is_legal()
+
+    a.pos = (0.5, 5)
+    index.update_node(a)
+    assert not index.is_legal()
+
+def test_query_and_change_log():
+    nodes = [_node(i, (2 + 4*i, 2), (1, 1)) for i in range(5)]
+    index = footprint_index(20, 20, cell_size=3)
+    index.sync(nodes)
+    assert sorted(n.get_id() for n in index.nodes_near(8, 2, 2.6)) == [1, 2]
+
+    version = index.version
+    assert index.changed_since(version) == set()
+    nodes[3].pos = (14, 10)
+    index.update_node(nodes[3])
+    index.remove_node(4)
+    assert index.changed_since(version) == {3, 4}
+    assert index.node(4) is None
+
+    index.reset()
+    assert index.changed_since(version) is None
@@ -0,0 +1,112 @@
+"""Unit tests for pcb_geometry module"""
+import numpy as np
+import pytest
+import pcb_geometry
+
+class _node():
+    def __init__(self, node_id, pos, size, orientation=0.0):
+        self.node_id = node_id
+        self.pos = pos
+        self.size = size
+        self.orientation = orientation
+
+    def get_id(self):
+        return self.node_id
+
+    def get_pos(self):
+        return self.pos
+
+    def get_size(self):
+        return self.size
+
+    def get_orientation(self):
+        return self.orientation
+
+class _graph():
+    def __init__(self, nodes):
+        self.nodes = nodes
+
+    def get_nodes(self):
+        return self.nodes
+
+class _board():
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+
+    def get_width(self):
+        return self.width
+
+    def get_height(self):
+        return self.height
+
+def test_union_area_of_overlapping_squares():
+    """Two unit-offset 2x2 squares overlap in a 1x1 square."""
+    a = pcb_geometry.axis_aligned_polygon(0, 0, 2, 2)
+    b = pcb_geometry.axis_aligned_polygon(1, 1, 3, 3)
+    assert np.isclose(pcb_geometry.union_area([a, b]), 7.0)
+
+def test_union_area_of_rotated_rectangles():
+    """A square and the same square rotated by 45 degrees intersect in a
+    regular octagon with apothem 1."""
+    a = pcb_geometry.rectangle_polygon((0, 0), (2, 2), 0)
+    b = pcb_geometry.rectangle_polygon((0, 0), (2, 2), 45)
+    octagon = 8 * np.tan(np.pi / 8)
+    assert np.isclose(pcb_geometry.union_area([a, b]), 8 - octagon)
+
+def test_clip_convex_disjoint():
+    a = pcb_geometry.axis_aligned_polygon(0, 0, 1, 1)
+    b = pcb_geometry.axis_aligned_polygon(2, 2, 3, 3)
+    assert len(pcb_geometry.clip_convex(a, b)) == 0
+
+def test_sector_area():
+    """Sector polygon converges to r^2 * theta / 2."""
+    sector = pcb_geometry.sector_polygon((0, 0), 2.0, -22.5, 22.5,
+                                         arc_segments=64)
+    assert np.isclose(pcb_geometry.polygon_area(sector), np.pi / 2, rtol=1e-3)
+
+def test_rectangles_overlap_separating_axis():
+    """Axis aligned boxes separate on x, the same box rotated by 45 degrees
+    reaches across the gap, and touching rectangles do not overlap."""
+    a = pcb_geometry.rectangle_polygon((0, 0), (2, 2), 0)
+    b = pcb_geometry.rectangle_polygon((2.3, 0), (2, 2), 0)
+    c = pcb_geometry.rectangle_polygon((2.3, 0), (2, 2), 45)
+    d = pcb_geometry.rectangle_polygon((2, 0), (2, 2), 0)
+    assert not pcb_geometry.rectangles_overlap(a, b)
+    assert pcb_geometry.rectangles_overlap(a, c)
+    assert not pcb_geometry.rectangles_overlap(a, d)
+
+def test_polygon_contains_rectangle():
+    """A U-shaped outline contains a rectangle in one leg, but not one
+    bridging the gap between the legs although all its corners are inside."""
+    outline = np.array([[0, 0], [5, 0], [5, 3], [4, 3], [4, 1], [1, 1],
+                        [1, 3], [0, 3]], dtype=np.float64)
+    leg = pcb_geometry.axis_aligned_polygon(0.2, 1.5, 0.8, 2.8)
+    bridge = pcb_geometry.axis_aligned_polygon(0.5, 2.0, 4.5, 2.8)
+    assert pcb_geometry.polygon_contains_rectangle(outline, leg)
+    assert not pcb_geometry.polygon_contains_rectangle(outline, bridge)
+
+def test_analytic_los_and_ol_match_raster():
+    """The analytic features stay within the tolerance stated in the module
+    docstring of the raster path at r = 0.02 mm, on random boards."""
+    pcbDraw = pytest.importorskip("pcbDraw")
+    rng = np.random.default_rng(0)
+    board = _board(20.0, 20.0)
+    for _ in range(20):
+        nodes = [_node(i,
+                       tuple(rng.uniform(2, 18, 2)),
+                       tuple(rng.uniform(1, 4, 2)),
+                       float(rng.choice([0, 30, 45, 90])))
+                 for i in range(6)]
+        node = nodes[0]
+        radius = np.max(node.get_size())*1.5
+        grids = pcbDraw.draw_board_from_graph_multi_agent(_graph(nodes), 0, 20.0, 20.0,
+                                                          padding=4, resolution=0.02)
+        los, ol, _, _, _ = pcbDraw.get_los_and_ol_multi_agent(node, board, radius, grids,
+                                                              padding=4, resolution=0.02)
+        a_los, a_ol, areas, _ = pcb_geometry.get_los_and_ol_analytic(node, nodes[1:],
+                                                                     20.0, 20.0, radius,
+                                                                     padding=4)
+        assert np.max(np.abs(np.array(los) - a_los)) <= 0.03
+        large = areas >= 0.5
+        assert np.all(np.abs(np.array(ol) - a_ol)[large] <= 0.06)
@@ -7,3 +7,60 @@ def test_calculate_resultant_vector():
     euclidean_dist, angle = pcb_vector_utils.calculate_resultant_vector(0,0)
     assert euclidean_dist == 0.0
     assert angle == 0.0
+
+class _node():
+    def __init__(self, id, pos, orientation, pins=0):
+        self.id = id
+        self.pos = pos
+        self.orientation = orientation
+        self.pins = pins
+    def get_id(self): return self.id
+    def get_pos(self): return self.pos
+    def get_orientation(self): return self.orientation
+    def get_pin_count(self): return self.pins
+
+class _edge():
+    def __init__(self, ids, pads, pos, power=0, net=0):
+        self.net = net
+        self.ids = ids
+        self.pads = pads
+        self.pos = pos
+        self.power = power
+    def get_instance_id(self, i): return self.ids[i]
+    def get_pad_id(self, i): return self.pads[i]
+    def get_pos(self, i): return self.pos[i]
+    def get_power_rail(self): return self.power
+    def get_net_id(self): return self.net
+
+def test_pad_table_matches_loop_implementation():
+    """The batched pad table must give the same wirelength as the loops."""
+    n = _node(0, (10.0, 10.0), 90, pins=2)
+    nn = [_node(1, (14.0, 7.0), 0), _node(2, (3.0, 12.0), 45)]
+    eoi = [_edge((0, 1), (0, 0), ((1.0, 0.5), (-1.0, 0.0))),
+           _edge((2, 0), (1, 0), ((0.5, 0.5), (1.0, 0.5))),
+           _edge((0, 2), (1, 0), ((-1.0, 0.0), (0.0, 1.0)), power=1)]
+    pad_table = pcb_vector_utils.build_pad_table(n, nn, eoi)
+    for ignore_power in (False, True):
+        expected = pcb_vector_utils.compute_sum_of_euclidean_distances_between_pads(
+            n, nn, eoi, ignore_power=ignore_power)
+        batched = pcb_vector_utils.compute_sum_of_euclidean_distances_between_pads(
+            n, nn, eoi, ignore_power=ignore_power, pad_table=pad_table)
+        assert abs(expected - batched) < 1e-9
+
+def test_dom_table_matches_loop_implementation():
+    """The array based dom must match the list based implementation."""
+    n = _node(0, (10.0, 10.0), 90, pins=2)
+    nn = [_node(1, (14.0, 7.0), 0), _node(2, (3.0, 12.0), 45)]
+    eoi = [_edge((0, 1), (0, 0), ((1.0, 0.5), (-1.0, 0.0)), net=1),
+           _edge((0, 1), (0, 1), ((1.0, 0.5), (1.0, 0.0)), net=1),
+           _edge((2, 0), (1, 0), ((0.5, 0.5), (1.0, 0.5)), net=2),
+           _edge((0, 2), (1, 0), ((-1.0, 0.0), (0.0, 1.0)), net=3, power=1)]
+    for ignore_power in (False, True):
+        dom, resultant_vecs, _ = pcb_vector_utils.compute_pad_referenced_distance_vectors_v2(
+            n, nn, eoi, ignore_power=ignore_power)
+        dom_table = pcb_vector_utils.build_dom_table(n, nn, eoi, ignore_power=ignore_power)
+        fast_dom, fast_resultant_vecs, _ = pcb_vector_utils.compute_pad_referenced_distance_vectors_v2(
+            n, nn, eoi, ignore_power=ignore_power, dom_table=dom_table)
+        assert abs(dom[0] - fast_dom[0]) < 1e-9
+        assert abs(dom[1] - fast_dom[1]) < 1e-9
+        assert [v[0] for v in resultant_vecs] == [v[0] for v in fast_resultant_vecs]
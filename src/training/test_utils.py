@@ -0,0 +1,87 @@
+"""Unit tests for the replay memories in utils"""
+import os
+
+import numpy as np
+import pytest
+
+pytest.importorskip("torch")
+
+from utils import ReplayMemory, MemmapReplayMemory
+
+def _batch(first, n):
+    rows = np.arange(first, first + n, dtype=np.float32)
+    return (np.stack([rows, rows + 0.5], axis=1),  # state
+            rows.reshape(-1, 1) * 10,               # action
+            np.stack([rows, rows - 0.5], axis=1),  # next_state
+            rows.reshape(-1, 1) * 100,              # reward
+            np.ones((n, 1), dtype=np.float32))      # done
+
+def _rows(buffer, latest=None):
+    latest = len(buffer) if latest is None else latest
+    return [int(t.state[0, 0]) for t in buffer.get_latest(latest)]
+
+def test_ring_buffer_wraparound():
+    buffer = ReplayMemory(5, device="cpu")
+    buffer.add_batch(*_batch(0, 3))
+    for i in range(3, 6):
+        buffer.add(*[c[0] for c in _batch(i, 1)])
+    buffer.add_batch(*_batch(6, 3))           # bulk copy across the end
+    assert len(buffer) == 5
+    assert buffer.position == 4
+    assert _rows(buffer) == [4, 5, 6, 7, 8]
+    assert _rows(buffer, 2) == [7, 8]
+    assert buffer.memory["reward"][buffer._latest_indices(5), 0].tolist() == \
+        [400, 500, 600, 700, 800]
+
+def test_add_batch_larger_than_capacity_keeps_latest():
+    buffer = ReplayMemory(4, device="cpu")
+    buffer.add_batch(*_batch(0, 2))
+    buffer.add_batch(*_batch(2, 9))
+    assert len(buffer) == 4
+    assert _rows(buffer) == [7, 8, 9, 10]
+
+def test_resize_grows_and_shrinks_in_place():
+    buffer = ReplayMemory(5, device="cpu")
+    buffer.add_batch(*_batch(0, 7))            # wrapped: 2..6
+    buffer.resize(8)
+    assert (len(buffer), buffer.position) == (5, 5)
+    buffer.add_batch(*_batch(7, 2))
+    assert _rows(buffer) == [2, 3, 4, 5, 6, 7, 8]
+
+    buffer.resize(3)                           # keeps the latest transitions
+    assert (len(buffer), buffer.capacity, buffer.position) == (3, 3, 0)
+    assert _rows(buffer) == [6, 7, 8]
+    buffer.add(*[c[0] for c in _batch(9, 1)])
+    assert _rows(buffer) == [7, 8, 9]
+
+def test_add_latest_from_copies_across_the_wrap():
+    source = ReplayMemory(4, device="cpu")
+    source.add_batch(*_batch(0, 6))            # wrapped: 2..5
+    target = ReplayMemory(10, device="cpu")
+    target.add_latest_from(source, 3)
+    assert _rows(target) == [3, 4, 5]
+    target.add_content_of(source)
+    assert _rows(target) == [3, 4, 5, 2, 3, 4, 5]
+
+def test_memmap_save_load_sample_round_trip(tmp_path):
+    directory = str(tmp_path / "replay_buffer")
+    buffer = MemmapReplayMemory(8, device="cpu", directory=directory)
+    buffer.add_batch(*_batch(0, 11))
+    buffer.save()
+    files = sorted(os.listdir(directory))
+
+    loaded = MemmapReplayMemory.load(directory, device="cpu")
+    assert len(loaded) == 8
+    assert loaded.position == buffer.position
+    state, action, next_state, reward, done = loaded.sample(8)
+    rows = sorted(state[:, 0].tolist())
+    assert rows == list(range(3, 11))
+    assert np.allclose(reward.numpy().ravel(), state[:, 0].numpy() * 100)
+
+    # loading is read-only: copying into a larger buffer keeps the saved files
+    target = MemmapReplayMemory(50, device="cpu", directory=str(tmp_path / "run"))
+    target.add_content_of(loaded)
+    assert len(target) == 8
+    with pytest.raises(ValueError):
+        loaded.resize(50)
+    assert sorted(os.listdir(directory)) == files
@@ -0,0 +1,59 @@
+"""Smoke test for core.environment.vec_environment with two workers"""
+import os
+
+import pytest
+
+torch = pytest.importorskip("torch")
+pytest.importorskip("gym")
+pytest.importorskip("pcb")
+
+from core.environment.environment import environment
+from core.environment.parameters import parameters
+from core.environment.vec_environment import vec_environment
+
+PCB_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                        "..", "..", "dataset", "base", "1_merged.pcb")
+
+def _targets(env):
+    return {(p["kicad_pcb"], t["id"]): (t["We"], t["HPWLe"])
+            for p in env.get_node_target_params()
+            for t in p["expert_targets"]}
+
+def test_vec_environment_steps_and_merges_targets():
+    env = environment(parameters({"pcb_file": PCB_FILE,
+                                  "training_pcb": PCB_FILE,
+                                  "evaluation_pcb": PCB_FILE,
+                                  "net": "",
+                                  "use_dataAugmenter": True,
+                                  "augment_position": True,
+                                  "augment_orientation": True,
+                                  "agent_max_action": 1,
+                                  "agent_expl_noise": 0.1,
+                                  "debug": False,
+                                  "max_steps": 3,
+                                  "w": 2, "o": 2, "hpwl": 6,
+                                  "seed": 0,
+                                  "ignore_power": True,
+                                  "log_dir": None,
+                                  "idx": 0,
+                                  "shuffle_idxs": False}))
+    env.reset()
+    initial = _targets(env)
+
+    vec_env = vec_environment(env, num_envs=2, policy=torch.nn.Linear(1, 1))
+    finished = [False, False]
+    try:
+        for _ in range(3):
+            transitions, rewards, dones = vec_env.step(random=True)
+            assert len(rewards) == 2
+            assert transitions[0].shape[0] == sum(len(r) for r in rewards)
+            finished = [f or d for f, d in zip(finished, dones)]
+        # max_steps=3: every worker finished an episode and was merged back
+        assert all(finished)
+    finally:
+        vec_env.close()
+
+    merged = _targets(env)
+    assert merged.keys() == initial.keys()
+    for key, (We, HPWLe) in merged.items():
+        assert We <= initial[key][0] and HPWLe <= initial[key][1]
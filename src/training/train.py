@@ -9,25 +9,30 @@ seed for numpy and torch random number generators, while program_info prints
 the device being used. The log_configuration function logs the training
 configuration to a tensorboard file, while training_run sets up the
 environment and model, trains the model, and returns the best metrics.
-Finally, main reads command line arguments, performs multiple training runs,
-and prints the average of the best rewards and steps for each run.
+Finally, main reads command line arguments, performs multiple training runs
+(concurrently on --workers processes), and prints the average of the best rewards and steps for each run.
 
 To run this script, execute the main function.
 """
 
 from core.environment.environment import environment
 from core.environment.parameters import parameters
+from core.environment.vec_environment import vec_environment
 
 import numpy as np
 import torch
 import sys
 import os 
 import random
+import copy
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor
 
 from run_config import cmdline_args, write_desc_log
 from hyperparameters import load_hyperparameters_from_file
 from model_setup import setup_model
 from callbacks import log_and_eval_callback
+from utils import MemmapReplayMemory
 
 best_reward = -np.inf          # New best model, you could save the agent here
 
@@ -62,6 +67,35 @@ def log_configuration(writer, args=None, cmdline_args=None, global_step=1):
     writer.add_text(tag="params", text_string=s, global_step=global_step)
     writer.flush()
 
+def setup_replay_buffer(model, settings):
+    """
+    Select the replay buffer backend and optionally warm start it from a
+    saved memmap buffer.
+
+    Returns the number of random exploration steps still required.
+    """
+    start_timesteps = settings["start_timesteps"]
+
+    if settings.get("replay_buffer", "ram") == "memmap":
+        model.replay_buffer = MemmapReplayMemory(
+            model.buffer_size,
+            device=model.device,
+            directory=os.path.join(settings["log_dir"], "replay_buffer"))
+
+    warm_start = settings.get("replay_buffer_warm_start", None)
+    if warm_start is not None:
+        # the new buffer's files would overwrite the ones being loaded
+        if (isinstance(model.replay_buffer, MemmapReplayMemory) and
+            os.path.realpath(warm_start) == os.path.realpath(model.replay_buffer.directory)):
+            raise ValueError(f"--replay_buffer_warm_start {warm_start} is the replay buffer directory of this run; use a different log_dir.")
+        previous = MemmapReplayMemory.load(warm_start, device=model.device)
+        model.replay_buffer.add_content_of(previous)
+        # stored transitions replace the same number of random steps
+        start_timesteps = max(0, start_timesteps - len(model.replay_buffer))
+        print(f"Warm started replay buffer from {warm_start} with {len(model.replay_buffer)} transitions; start_timesteps={start_timesteps}")
+
+    return start_timesteps
+
 def training_run(settings):
     setup_seed(seed=settings["seed"][settings["run"]])
 
@@ -97,6 +131,17 @@ def training_run(settings):
                            "log_dir": settings["log_dir"],
                            "idx": settings["pcb_idx"],
                            "shuffle_idxs": settings["shuffle_training_idxs"],
+                           "los_engine": settings.get("los_engine", "raster"),
+                           "batched_inference": settings.get("batched_inference", False),
+                           "render": settings.get("render", "always"),
+                           "render_every": settings.get("render_every", 10),
+                           "render_scale": settings.get("render_scale", 1.0),
+                           "frame_size": settings.get("frame_size", None),
+                           "profile": settings.get("profile_every", None) is not None,
+                           "resolution": settings.get("resolution", 0.02),
+                           "resolution_min_pixels": settings.get("resolution_min_pixels", 8),
+                           "legality_engine": settings.get("legality_engine", "raster"),
+                           "spatial_index": settings.get("spatial_index", True),
                            })
 
     env = environment(env_params)
@@ -125,30 +170,95 @@ def training_run(settings):
                                          hyperparameters=hp,
                                          model=model)
 
+    start_timesteps = setup_replay_buffer(model, settings)
+
     model.explore_for_expert_targets(
         reward_target_exploration_steps=settings["target_exploration_steps"],
-        output_dir=settings["log_dir"]
+        output_dir=settings["log_dir"],
+        num_workers=settings["num_workers"] if settings.get("enable_multithread", False) else 1
     )
+    vec_env = None
+    if settings.get("num_envs", 1) > 1:
+        vec_env = vec_environment(env,
+                                  num_envs=settings["num_envs"],
+                                  policy=model.policy if settings["policy"] == "SAC" else model.actor,
+                                  rl_model_type=settings["policy"])
+
     model.learn(timesteps=settings["max_timesteps"],
                 callback=callback,
-                start_timesteps=settings["start_timesteps"],
-                incremental_replay_buffer=settings["incremental_replay_buffer"]
+                start_timesteps=start_timesteps,
+                incremental_replay_buffer=settings["incremental_replay_buffer"],
+                vec_env=vec_env
                 )
 
+    if vec_env is not None:
+        vec_env.close()
+
     return [callback.best_metrics, callback.best_mean_metrics]
 
+def redirection_file(settings, stream):
+    """
+    Path of the file that stream ("stdout" or "stderr") is redirected to
+    """
+    return os.path.join(settings["tensorboard_dir"],
+                        f"{settings['policy']}_{settings['experiment']}.{stream}")
+
+def _training_run_worker(settings, run, reopen_redirection=False):
+    settings = copy.deepcopy(settings)
+    settings["run"] = run
+
+    if reopen_redirection is False:
+        return training_run(settings=settings)
+
+    # Spawned processes do not inherit the reassigned sys.stdout/sys.stderr
+    # of main(); append to the same files for the duration of the run.
+    stdout, stderr = sys.stdout, sys.stderr
+    if settings["redirect_stdout"] is True:
+        sys.stdout = open(redirection_file(settings, "stdout"), "a", encoding="utf-8")
+    if settings["redirect_stderr"] is True:
+        sys.stderr = open(redirection_file(settings, "stderr"), "a", encoding="utf-8")
+    try:
+        return training_run(settings=settings)
+    finally:
+        if sys.stdout is not stdout:
+            sys.stdout.close()
+            sys.stdout = stdout
+        if sys.stderr is not stderr:
+            sys.stderr.close()
+            sys.stderr = stderr
+
+def execute_runs(settings):
+    """
+    Execute settings["runs"] independent training runs on settings["workers"]
+    processes. Every run has its own seed, log_dir and tensorboard writer.
+
+    Returns the [best_metrics, best_mean_metrics] of every run, in run order.
+    """
+    runs = int(settings["runs"])
+    workers = max(1, min(settings.get("workers", 1), runs))
+
+    if workers == 1:
+        return [_training_run_worker(settings, run) for run in range(runs)]
+
+    # flush what main() wrote before the workers append to the same files
+    sys.stdout.flush()
+    sys.stderr.flush()
+
+    # spawn: every run initializes its own torch/CUDA state and pcb objects
+    with ProcessPoolExecutor(max_workers=workers,
+                             mp_context=mp.get_context("spawn")) as executor:
+        futures = [executor.submit(_training_run_worker, settings, run, True)
+                   for run in range(runs)]
+        return [f.result() for f in futures]
+
 def main():
     args,settings = cmdline_args()
 
     if settings["redirect_stdout"] is True:
-        redirection_file = os.path.join(settings["tensorboard_dir"],
-                                        f"{settings['policy']}_{settings['experiment']}.stdout")
-        sys.stdout = open(redirection_file, "w", encoding="utf-8")
+        sys.stdout = open(redirection_file(settings, "stdout"), "w", encoding="utf-8")
 
     if settings["redirect_stderr"] is True:
-        redirection_file = os.path.join(settings["tensorboard_dir"],
-                                        f"{settings['policy']}_{settings['experiment']}.stderr")
-        sys.stderr = open(redirection_file, "w", encoding="utf-8")
+        sys.stderr = open(redirection_file(settings, "stderr"), "w", encoding="utf-8")
 
     program_info(args.device)
 
@@ -157,12 +267,7 @@ def main():
     mean_best_mean_rewards = []
     mean_best_mean_steps = []
     
-    ## todo 这部分可以修改为多线程，相当于每个线程里独立训练一个智能体，最后进行比较
-
-    for run in range(settings["runs"]):
-        settings["run"] = run
-        perf_metrics = training_run(settings=settings)
-
+    for perf_metrics in execute_runs(settings):
         mean_best_rewards.append(perf_metrics[0][0])
         mean_best_steps.append(perf_metrics[0][1])
         mean_best_mean_rewards.append(perf_metrics[1][0])
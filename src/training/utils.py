@@ -2,6 +2,8 @@ import torch
 import numpy as np
 from collections import namedtuple
 import random
+import os
+import json
 
 def soft_update(target, source, tau):
     for target_param, param in zip(target.parameters(), source.parameters()):
@@ -21,6 +23,10 @@ class ReplayMemory(object):
     A replay memory buffer used in reinforcement learning algorithms to store\
           and sample transitions.
 
+    Transitions are stored column-wise in preallocated float32 arrays (one\
+          per Transition field) that are used as a ring buffer. The arrays\
+          are allocated on the first add, once the field sizes are known.
+
     Args:
         capacity (int): The maximum capacity of the replay memory.
         device (str): The device to store the tensors (e.g., 'cpu', 'cuda').
@@ -28,13 +34,18 @@ class ReplayMemory(object):
     Attributes:
         capacity (int): The maximum capacity of the replay memory.
         device (str): The device to store the tensors.
-        memory (list): A list to store the transitions.
+        memory (dict): Field name -> (capacity, field size) float32 array,\
+              None until the first transition is added.
         position (int): The current position in the memory buffer.
+        size (int): The number of transitions stored.
 
     Methods:
         add(*args): Saves a transition to the replay memory.
+        add_batch(*args): Saves a batch of transitions given field-wise.
         add_content_of(other): Adds the content of another replay buffer to\
               this replay buffer.
+        resize(capacity): Changes the capacity, keeping the latest\
+              transitions.
         get_latest(latest): Returns the latest elements from the replay memory.
         add_latest_from(other, latest): Adds the latest samples from another\
              buffer to this buffer.
@@ -50,21 +61,79 @@ class ReplayMemory(object):
 
     def __init__(self, capacity, device):
         self.device = device
-        self.capacity = capacity
-        self.memory = []
+        self.capacity = int(capacity)
+        self.memory = None
         self.position = 0
+        self.size = 0
+
+    def _new_field(self, field, capacity, size):
+        # np.zeros maps untouched pages lazily, so a large capacity only
+        # costs memory once it is filled.
+        return np.zeros((capacity, size), dtype=np.float32)
+
+    def _allocate(self, sizes):
+        self.memory = {}
+        for field, size in zip(Transition._fields, sizes):
+            self.memory[field] = self._new_field(field, self.capacity, size)
+
+    def _latest_indices(self, latest):
+        # Indices of the `latest` most recent transitions, oldest first.
+        latest = min(int(latest), self.size)
+        return (self.position - latest + np.arange(latest)) % self.capacity
+
+    def _add_columns(self, columns):
+        """
+        Bulk copy of transitions given as one (n, field size) array per field.
+        """
+        n = len(columns[0])
+        if n == 0:
+            return
+        if self.memory is None:
+            self._allocate([c.shape[1] for c in columns])
+        if n > self.capacity:
+            columns = [c[-self.capacity:] for c in columns]
+            n = self.capacity
+
+        first = min(n, self.capacity - self.position)
+        for field, c in zip(Transition._fields, columns):
+            self.memory[field][self.position:self.position+first] = c[:first]
+            self.memory[field][:n-first] = c[first:]
+        self.position = (self.position + n) % self.capacity
+        self.size = min(self.size + n, self.capacity)
+
+    def _columns(self, indices):
+        return [self.memory[field][indices] for field in Transition._fields]
+
+    def _to_tensors(self, indices):
+        # One gather and one host to device copy per field.
+        return tuple(torch.from_numpy(self.memory[field][indices]).to(self.device)
+                     for field in Transition._fields)
 
     def add(self, *args):
         """Saves a transition."""
-        if len(self.memory) < self.capacity:
-            self.memory.append(None)
-
         reshaped_args = []
         for arg in args:
-            reshaped_args.append(np.reshape(arg, (1, -1)))
+            reshaped_args.append(np.reshape(arg, (-1,)))
 
-        self.memory[self.position] = Transition(*reshaped_args)
+        if self.memory is None:
+            self._allocate([len(arg) for arg in reshaped_args])
+
+        for field, arg in zip(Transition._fields, reshaped_args):
+            self.memory[field][self.position] = arg
         self.position = (self.position + 1) % self.capacity
+        self.size = min(self.size + 1, self.capacity)
+
+    def add_batch(self, *args):
+        """
+        Saves a batch of transitions with one bulk copy per field.
+
+        Args:
+            *args: (state, action, next_state, reward, done) arrays, each\
+                  with one row per transition.
+        """
+        n = len(args[0])
+        self._add_columns([np.reshape(np.asarray(arg, dtype=np.float32), (n, -1))
+                           for arg in args])
 
     def add_content_of(self, other):
         """
@@ -73,9 +142,40 @@ class ReplayMemory(object):
         Args:
             other (ReplayMemory): Another replay buffer.
         """
-        latest_trans = other.get_latest(self.capacity)
-        for transition in latest_trans:
-            self.add(*transition)
+        self.add_latest_from(other, self.capacity)
+
+    def resize(self, capacity):
+        """
+        Changes the capacity of the replay memory, keeping the latest\
+              transitions (same content as add_content_of into a new buffer\
+              of the given capacity).
+
+        Each field is moved with a bulk copy (at most two slices, oldest\
+              first); no per transition work is done.
+
+        Args:
+            capacity (int): The new capacity.
+        """
+        capacity = int(capacity)
+        if capacity == self.capacity:
+            return
+        if self.memory is None:
+            self.capacity = capacity
+            return
+
+        keep = min(self.size, capacity)
+        start = (self.position - keep) % self.capacity
+        first = min(keep, self.capacity - start)
+        for field in Transition._fields:
+            old = self.memory[field]
+            new = self._new_field(field, capacity, old.shape[1])
+            new[:first] = old[start:start+first]
+            new[first:keep] = old[:keep-first]
+            self.memory[field] = new
+
+        self.capacity = capacity
+        self.size = keep
+        self.position = keep % capacity
 
     def get_latest(self, latest):
         """
@@ -87,15 +187,11 @@ class ReplayMemory(object):
         Returns:
             list: A list containing the latest elements.
         """
-        if self.capacity < latest:
-            latest_trans = self.memory[self.position:].copy() + self.memory[:self.position].copy()
-        elif len(self.memory) < self.capacity:
-            latest_trans = self.memory[-latest:].copy()
-        elif self.position >= latest:
-            latest_trans = self.memory[:self.position][-latest:].copy()
-        else:
-            latest_trans = self.memory[-latest+self.position:].copy() + self.memory[:self.position].copy()
-        return latest_trans
+        if self.size == 0:
+            return []
+        columns = self._columns(self._latest_indices(latest))
+        return [Transition(*[np.reshape(c[i], (1, -1)) for c in columns])
+                for i in range(len(columns[0]))]
 
     def add_latest_from(self, other, latest):
         """
@@ -105,13 +201,18 @@ class ReplayMemory(object):
             other (ReplayMemory): Another replay buffer.
             latest (int): The number of elements to add.
         """
-        latest_trans = other.get_latest(latest)
-        for transition in latest_trans:
-            self.add(*transition)
+        if other.size == 0:
+            return
+        self._add_columns(other._columns(other._latest_indices(latest)))
 
     def shuffle(self):
         """Shuffles the transitions in the replay memory."""
-        random.shuffle(self.memory)
+        if self.size == 0:
+            return
+        order = list(range(self.size))
+        random.shuffle(order)
+        for field in Transition._fields:
+            self.memory[field][:self.size] = self.memory[field][order]
 
     def sample(self, batch_size):
         """
@@ -124,15 +225,8 @@ class ReplayMemory(object):
             tuple: A tuple containing the sampled tensors\
                   (state, action, next_state, reward, done).
         """
-        transitions = random.sample(self.memory, batch_size)
-        batch = Transition(*zip(*transitions))
-
-        state = torch.FloatTensor(np.concatenate(batch.state)).to(self.device)
-        action = torch.FloatTensor(np.concatenate(batch.action)).to(self.device)
-        next_state = torch.FloatTensor(np.concatenate(batch.next_state)).to(self.device)
-        reward = torch.FloatTensor(np.concatenate(batch.reward)).to(self.device)
-        done = torch.FloatTensor(np.concatenate(batch.done)).to(self.device)
-        return state, action, next_state, reward, done
+        indices = np.array(random.sample(range(self.size), batch_size))
+        return self._to_tensors(indices)
 
     def sample_from_latest(self, batch_size, latest):
         """
@@ -147,20 +241,152 @@ class ReplayMemory(object):
             tuple: A tuple containing the sampled tensors\
                   (state, action, next_state, reward, done).
         """
-        latest_trans = self.get_latest(latest)
-        transitions = random.sample(latest_trans, batch_size)
-        batch = Transition(*zip(*transitions))
-
-        state = torch.FloatTensor(np.concatenate(batch.state)).to(self.device)
-        action = torch.FloatTensor(np.concatenate(batch.action)).to(self.device)
-        next_state = torch.FloatTensor(np.concatenate(batch.next_state)).to(self.device)
-        reward = torch.FloatTensor(np.concatenate(batch.reward)).to(self.device)
-        done = torch.FloatTensor(np.concatenate(batch.done)).to(self.device)
-        return state, action, next_state, reward, done
+        latest_indices = self._latest_indices(latest)
+        indices = latest_indices[random.sample(range(len(latest_indices)), batch_size)]
+        return self._to_tensors(indices)
 
     def __len__(self):
-        return len(self.memory)
+        return self.size
 
     def reset(self):
-        self.memory = []
+        self.memory = None
         self.position = 0
+        self.size = 0
+
+class MemmapReplayMemory(ReplayMemory):
+    """
+    A ReplayMemory whose field arrays are numpy.memmap files in `directory`.
+
+    The operating system pages the buffer in and out, so it can be larger\
+          than RAM. save() writes the ring buffer state to meta.json and\
+          flushes the arrays; load() reopens a saved buffer read-only, e.g.\
+          to resume a run or to warm start a new one.
+
+    Writes to the arrays go to a shared file mapping, so they reach the\
+          files even if the process is killed before the next flush; the\
+          flush only guards against losing them in an operating system\
+          crash. save() therefore always writes meta.json, but flushes the\
+          arrays only once flush_every transitions were added since the last\
+          flush (or when flush=True).
+
+    Args:
+        capacity (int): The maximum capacity of the replay memory.
+        device (str): The device to store the tensors (e.g., 'cpu', 'cuda').
+        directory (str): Directory holding the memory mapped files.
+        flush_every (int): Transitions added between two flushes in save().
+        read_only (bool): Open the files read-only, see load().
+    """
+
+    meta_file = "meta.json"
+
+    def __init__(self, capacity, device, directory, flush_every=100_000, read_only=False):
+        super().__init__(capacity, device)
+        self.directory = directory
+        self.flush_every = flush_every
+        self.read_only = read_only
+        self.unflushed = 0
+        if os.path.isdir(self.directory) is False:
+            os.makedirs(self.directory)
+
+    def _filename(self, field, capacity):
+        # The capacity is part of the name so that resize() can copy into
+        # new files before the old ones are removed.
+        return os.path.join(self.directory, f"{field}_{capacity}.dat")
+
+    def _check_writable(self):
+        if self.read_only is True:
+            raise ValueError(f"The replay memory in {self.directory} was opened read-only; copy it into another buffer with add_content_of.")
+
+    def _new_field(self, field, capacity, size):
+        self._check_writable()
+        return np.memmap(self._filename(field, capacity),
+                         dtype=np.float32,
+                         mode="w+",
+                         shape=(capacity, size))
+
+    def add(self, *args):
+        self._check_writable()
+        super().add(*args)
+        self.unflushed += 1
+
+    def _add_columns(self, columns):
+        self._check_writable()
+        super()._add_columns(columns)
+        self.unflushed += len(columns[0])
+
+    def resize(self, capacity):
+        self._check_writable()
+        old_capacity = self.capacity
+        super().resize(capacity)
+        if self.memory is not None and self.capacity != old_capacity:
+            for field in Transition._fields:
+                os.remove(self._filename(field, old_capacity))
+            self.save(flush=True)
+
+    def save(self, flush=None):
+        """
+        Writes the buffer state and flushes the memory mapped files.
+
+        Args:
+            flush (bool, optional): True always flushes, False never does;\
+                  None flushes once flush_every transitions were added since\
+                  the last flush.
+        """
+        if self.memory is None:
+            return
+        self._check_writable()
+        if flush is None:
+            flush = self.unflushed >= self.flush_every
+        if flush is True:
+            for field in Transition._fields:
+                self.memory[field].flush()
+            self.unflushed = 0
+        meta = {"capacity": self.capacity,
+                "position": self.position,
+                "size": self.size,
+                "sizes": [int(self.memory[field].shape[1])
+                          for field in Transition._fields]}
+        # write then rename, so that a crash never leaves a partial file
+        tmp = os.path.join(self.directory, self.meta_file + ".tmp")
+        with open(tmp, "w") as f:
+            json.dump(meta, f)
+        os.replace(tmp, os.path.join(self.directory, self.meta_file))
+
+    @classmethod
+    def load(cls, directory, device):
+        """
+        Reopens a replay memory written by save(), read-only: the saved\
+              files are never modified or removed. Copy the content into\
+              another buffer with add_content_of to continue filling it.
+
+        Args:
+            directory (str): Directory holding the memory mapped files.
+            device (str): The device to store the tensors.
+
+        Returns:
+            MemmapReplayMemory: The restored replay memory.
+        """
+        with open(os.path.join(directory, cls.meta_file), "r") as f:
+            meta = json.load(f)
+
+        buffer = cls(meta["capacity"], device, directory, read_only=True)
+        buffer.memory = {}
+        for field, size in zip(Transition._fields, meta["sizes"]):
+            buffer.memory[field] = np.memmap(buffer._filename(field, meta["capacity"]),
+                                             dtype=np.float32,
+                                             mode="r",
+                                             shape=(meta["capacity"], size))
+        buffer.position = meta["position"]
+        buffer.size = meta["size"]
+        return buffer
+
+    def reset(self):
+        self._check_writable()
+        if self.memory is not None:
+            for field in Transition._fields:
+                del self.memory[field]
+                os.remove(self._filename(field, self.capacity))
+        meta = os.path.join(self.directory, self.meta_file)
+        if os.path.isfile(meta):
+            os.remove(meta)
+        super().reset()